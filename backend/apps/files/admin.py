@@ -1,7 +1,11 @@
 # apps/files/admin.py
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
-from .models import File
+from .blobs import hard_delete_file, purge_files
+from .models import File, Folder, StorageUsage
+from .services import get_storage_service
+from .sharing import forget_shared_links
 
 @admin.register(File)
 class FileAdmin(admin.ModelAdmin):
@@ -9,7 +13,9 @@ class FileAdmin(admin.ModelAdmin):
     list_filter = ('mime_type', 'created_at', 'deleted_at')
     search_fields = ('original_name', 'user__email', 'id')
     readonly_fields = ('id', 'created_at', 'updated_at', 'storage_key')
-    
+    # user_email reads the user of every row on the page
+    list_select_related = ('user',)
+
     def user_email(self, obj):
         return obj.user.email
     user_email.short_description = 'User'
@@ -21,6 +27,32 @@ class FileAdmin(admin.ModelAdmin):
         if obj.deleted_at:
             return format_html('<span style="color: red;">Deleted</span>')
         return format_html('<span style="color: green;">Active</span>')
-    
-    def get_queryset(self, request):
-        return super().get_queryset(request)
+
+    # Deleting a row must also release its blob reference and the owner's usage,
+    # and drop its cached share links (looked up before they cascade away)
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            forget_shared_links([obj.pk])
+            hard_delete_file(get_storage_service(), obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            forget_shared_links(queryset.values('pk'))
+            purge_files(get_storage_service(), queryset)
+
+@admin.register(StorageUsage)
+class StorageUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'used_bytes', 'file_count', 'trash_bytes', 'quota_bytes', 'updated_at')
+    search_fields = ('user__email',)
+    # Totals are maintained by the app (and reconcile_usage); only the quota is edited here
+    readonly_fields = ('user', 'used_bytes', 'file_count', 'trash_bytes', 'trash_count', 'updated_at')
+    list_select_related = ('user',)
+
+@admin.register(Folder)
+class FolderAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'parent', 'created_at', 'deleted_at')
+    list_filter = ('deleted_at',)
+    search_fields = ('name', 'user__email', 'id')
+    # Moves must rewrite the whole subtree's paths, so they go through the API
+    readonly_fields = ('id', 'user', 'parent', 'path', 'created_at', 'updated_at')
+    list_select_related = ('user', 'parent')
@@ -0,0 +1,90 @@
+# apps/files/archives.py
+"""Streaming ZIP archives of stored files.
+
+zipfile writes to a sink without seek(), so it falls back to data
+descriptors and never has to rewind. Each storage object is copied in
+chunks and whatever zipfile has written so far is yielded straight away,
+so memory stays at a few chunks however large the archive gets.
+"""
+import logging
+import os
+import zipfile
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Already-compressed formats are stored as-is; deflating them only burns CPU
+DEFLATE_MIME_PREFIXES = ('text/', 'application/json', 'application/xml')
+
+class ZipSink:
+    """Write-only file object that buffers zipfile's output until drained."""
+
+    def __init__(self):
+        self.buffer = []
+        self.offset = 0
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+def unique_name(name, used):
+    """`report.pdf`, `report (1).pdf`, ... so duplicate names don't clash in the archive."""
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 0
+    while candidate in used:
+        n += 1
+        candidate = f"{base} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+def zip_stream(service, files):
+    """Yield a ZIP archive of `files` (File rows) chunk by chunk.
+
+    Objects missing from storage are skipped and logged; by then the
+    response has started, so there is no way left to report an error.
+    """
+    sink = ZipSink()
+    used = set()
+    with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+        for file in files:
+            try:
+                stream = service.open_stream(file.storage_key, content_encoding=file.content_encoding)
+            except FileNotFoundError:
+                logger.warning(f"Skipping {file.storage_key} in archive: not in storage")
+                continue
+
+            info = zipfile.ZipInfo(
+                unique_name(file.original_name, used),
+                date_time=timezone.localtime(file.created_at).timetuple()[:6]
+            )
+            info.file_size = file.size_bytes  # lets zipfile decide on ZIP64 up front
+            info.compress_type = (
+                zipfile.ZIP_DEFLATED if file.mime_type.startswith(DEFLATE_MIME_PREFIXES)
+                else zipfile.ZIP_STORED
+            )
+            try:
+                with archive.open(info, mode='w') as entry:
+                    while chunk := stream.read(CHUNK_SIZE):
+                        entry.write(chunk)
+                        if sink.buffer:
+                            yield sink.drain()
+            finally:
+                stream.close()
+            if sink.buffer:
+                yield sink.drain()
+    # Central directory, written on close
+    yield sink.drain()
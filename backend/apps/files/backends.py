@@ -0,0 +1,491 @@
+# apps/files/backends.py
+"""Object storage backends behind StorageService.
+
+A backend only moves bytes: put, open, size, delete and multipart uploads
+keyed by '/'-separated object names. Thumbnails, renditions, key layout and
+hashing policy live in StorageService, so adding a backend means
+implementing the methods of StorageBackend and nothing else.
+
+The backend is chosen by the STORAGE_BACKEND setting, either one of the
+aliases in BACKENDS or a dotted path to a StorageBackend subclass.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+
+import certifi
+import urllib3
+from django.conf import settings
+from django.utils.module_loading import import_string
+from minio import Minio
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = {
+    'local': 'apps.files.backends.LocalBackend',
+    'minio': 'apps.files.backends.MinioBackend',
+    'memory': 'apps.files.backends.MemoryBackend',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+def get_backend(name=None):
+    """Instantiate the backend named by `name` or settings.STORAGE_BACKEND."""
+    name = name or getattr(settings, 'STORAGE_BACKEND', None) or (
+        'minio' if getattr(settings, 'USE_MINIO', False) else 'local'
+    )
+    return import_string(BACKENDS.get(name, name))()
+
+def iter_chunks(file_obj):
+    """Yield a readable object's content in CHUNK_SIZE pieces."""
+    if hasattr(file_obj, 'chunks'):
+        yield from file_obj.chunks()
+        return
+    for chunk in iter(lambda: file_obj.read(CHUNK_SIZE), b''):
+        yield chunk
+
+class LimitedReader:
+    """Read at most `length` bytes from an open file, closing it with the reader."""
+
+    def __init__(self, file_obj, length):
+        self.file_obj = file_obj
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file_obj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file_obj.close()
+
+class StorageBackend:
+    """Interface implemented by every storage backend.
+
+    `open` returns an object with read() and close() and raises
+    FileNotFoundError for missing keys. `delete` takes any number of keys
+    and ignores missing ones.
+    """
+    name = None
+    supports_presigned_urls = False
+
+    def put(self, key, file_obj, content_type=None, content_encoding=None) -> str:
+        """Store a readable object under `key`. Returns the SHA-256 hex digest of its bytes.
+
+        `content_encoding` only matters to backends that serve objects
+        themselves (presigned URLs); reads always return the stored bytes.
+        """
+        raise NotImplementedError
+
+    def open(self, key, offset=0, length=None):
+        raise NotImplementedError
+
+    def size(self, key):
+        """Stored size in bytes, or None if the key does not exist."""
+        raise NotImplementedError
+
+    def exists(self, key) -> bool:
+        return self.size(key) is not None
+
+    def local_path(self, key):
+        """Filesystem path of a stored object, for zero-copy serving. None if not on disk."""
+        return None
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+    def list(self, prefix):
+        """Yield (key, last_modified) for every object under `prefix`, in no particular order."""
+        raise NotImplementedError
+
+    def create_multipart_upload(self, key, content_type) -> str:
+        """Start a chunked upload and return its upload id."""
+        raise NotImplementedError
+
+    def upload_part(self, key, upload_id, part_number, chunks) -> str:
+        """Store one part from an iterable of bytes and return its ETag."""
+        raise NotImplementedError
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        """Assemble `parts`, an ordered list of (part_number, etag)."""
+        raise NotImplementedError
+
+    def abort_multipart_upload(self, key, upload_id):
+        raise NotImplementedError
+
+    def presigned_put_url(self, key, expires):
+        raise NotImplementedError(f"{self.name} storage does not support presigned URLs")
+
+    def presigned_get_url(self, key, expires, response_headers=None):
+        raise NotImplementedError(f"{self.name} storage does not support presigned URLs")
+
+    def warm_up(self, connections=None):
+        """Prepare connections ahead of the first request. A no-op unless networked."""
+
+    def pool_stats(self) -> dict:
+        return {'backend': self.name, 'pools': []}
+
+class LocalBackend(StorageBackend):
+    """Files under MEDIA_ROOT. Point MEDIA_ROOT at a tmpfs to take the disk out of benchmarks."""
+    name = 'local'
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.MEDIA_ROOT)
+        self.uploads_dir = self.root / 'uploads'
+        (self.root / 'files').mkdir(parents=True, exist_ok=True)
+        (self.root / 'thumbnails').mkdir(parents=True, exist_ok=True)
+
+    def path(self, key) -> Path:
+        return self.root / key
+
+    def local_path(self, key):
+        return self.path(key)
+
+    def put(self, key, file_obj, content_type=None, content_encoding=None) -> str:
+        full_path = self.path(key)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        with open(full_path, 'wb') as f:
+            for chunk in iter_chunks(file_obj):
+                digest.update(chunk)
+                f.write(chunk)
+        return digest.hexdigest()
+
+    def open(self, key, offset=0, length=None):
+        f = open(self.path(key), 'rb')
+        if offset:
+            f.seek(offset)
+        return f if length is None else LimitedReader(f, length)
+
+    def size(self, key):
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def list(self, prefix):
+        for dirpath, _, filenames in os.walk(self.path(prefix)):
+            for filename in filenames:
+                full_path = Path(dirpath) / filename
+                modified = datetime.fromtimestamp(full_path.stat().st_mtime, tz=timezone.utc)
+                yield full_path.relative_to(self.root).as_posix(), modified
+
+    def create_multipart_upload(self, key, content_type) -> str:
+        upload_id = uuid.uuid4().hex
+        (self.uploads_dir / upload_id).mkdir(parents=True, exist_ok=True)
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_number, chunks) -> str:
+        part_path = self.uploads_dir / upload_id / f"{part_number:05d}.part"
+        digest = hashlib.md5()
+        with open(part_path, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        return digest.hexdigest()
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        part_dir = self.uploads_dir / upload_id
+        full_path = self.path(key)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        # Assembled next to the target and renamed into place, so a failed or
+        # repeated call never leaves a truncated object behind
+        fd, tmp_path = tempfile.mkstemp(dir=full_path.parent, prefix=f'.{full_path.name}.', suffix='.tmp')
+        try:
+            # mkstemp creates 0600; match what put() leaves for nginx to serve
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'wb') as f:
+                for part_number, _ in parts:
+                    with open(part_dir / f"{part_number:05d}.part", 'rb') as part:
+                        shutil.copyfileobj(part, f)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    def abort_multipart_upload(self, key, upload_id):
+        shutil.rmtree(self.uploads_dir / upload_id, ignore_errors=True)
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as the storage client reads them."""
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.file_obj.read(size)
+        self.digest.update(data)
+        return data
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+class MinioResponse:
+    """get_object response whose close() also hands the connection back to the pool."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def read(self, size=-1):
+        # Stored bytes as they are, even for objects saved with a Content-Encoding
+        return self.response.read(None if size is None or size < 0 else size, decode_content=False)
+
+    def close(self):
+        self.response.close()
+        self.response.release_conn()
+
+class MinioBackend(StorageBackend):
+    """MinIO or any S3-compatible service, configured from the AWS_* settings."""
+    name = 'minio'
+    supports_presigned_urls = True
+
+    def __init__(self):
+        endpoint, secure = self._parse_endpoint(settings.AWS_S3_ENDPOINT_URL)
+        self.http_client = self._build_http_client()
+        self.client = Minio(
+            endpoint,
+            access_key=settings.AWS_ACCESS_KEY_ID,
+            secret_key=settings.AWS_SECRET_ACCESS_KEY,
+            secure=secure,
+            http_client=self.http_client
+        )
+        self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+
+    @staticmethod
+    def _build_http_client():
+        """Connection pool shared by every request in this process.
+
+        Same defaults as the MinIO client's own pool, with tunable size and timeouts.
+        """
+        return urllib3.PoolManager(
+            timeout=urllib3.Timeout(
+                connect=settings.MINIO_CONNECT_TIMEOUT,
+                read=settings.MINIO_READ_TIMEOUT
+            ),
+            maxsize=settings.MINIO_POOL_MAXSIZE,
+            cert_reqs='CERT_REQUIRED',
+            ca_certs=os.environ.get('SSL_CERT_FILE') or certifi.where(),
+            retries=urllib3.Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+
+    @staticmethod
+    def _parse_endpoint(endpoint_url: str):
+        """MinIO client expects 'localhost:9000', not 'http://localhost:9000'"""
+        if endpoint_url.startswith('http://'):
+            return endpoint_url.replace('http://', ''), False
+        elif endpoint_url.startswith('https://'):
+            return endpoint_url.replace('https://', ''), True
+        return endpoint_url, False
+
+    @property
+    def presign_client(self):
+        """Client bound to the browser-facing endpoint.
+
+        The host is part of the signature, so URLs must be signed for the
+        address the browser will actually call. Passing the region avoids a
+        GetBucketLocation round-trip, signing then happens fully offline.
+        """
+        if not hasattr(self, '_presign_client'):
+            endpoint, secure = self._parse_endpoint(settings.MINIO_PUBLIC_ENDPOINT)
+            self._presign_client = Minio(
+                endpoint,
+                access_key=settings.AWS_ACCESS_KEY_ID,
+                secret_key=settings.AWS_SECRET_ACCESS_KEY,
+                secure=secure,
+                region=settings.AWS_S3_REGION_NAME
+            )
+        return self._presign_client
+
+    def warm_up(self, connections=None):
+        """Issue concurrent bucket checks so the pool holds that many live connections.
+
+        Failures are logged, never raised.
+        """
+        connections = connections or settings.MINIO_POOL_PREWARM
+        try:
+            with ThreadPoolExecutor(max_workers=connections) as pool:
+                list(pool.map(lambda _: self.client.bucket_exists(self.bucket_name), range(connections)))
+        except Exception as e:
+            logger.warning(f"Storage warm-up failed: {e}")
+
+    def pool_stats(self) -> dict:
+        pools = []
+        for key in list(self.http_client.pools.keys()):
+            pool = self.http_client.pools.get(key)
+            if pool is None:
+                continue
+            # The queue is padded with None placeholders up to maxsize
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            pools.append({
+                'host': f"{pool.host}:{pool.port}",
+                'maxsize': pool.pool.maxsize if pool.pool else 0,
+                'connections_created': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': idle,
+            })
+        return {'backend': self.name, 'pools': pools}
+
+    def put(self, key, file_obj, content_type=None, content_encoding=None) -> str:
+        # Ensure we are at start and get size safely
+        file_obj.seek(0, 2)
+        size = file_obj.tell()
+        file_obj.seek(0)
+
+        reader = HashingReader(file_obj)
+        self.client.put_object(
+            self.bucket_name, key, reader, size, content_type=content_type,
+            # Sent back on presigned GETs, so browsers decode the body themselves
+            metadata={'Content-Encoding': content_encoding} if content_encoding else None
+        )
+        return reader.hexdigest()
+
+    def open(self, key, offset=0, length=None):
+        try:
+            response = self.client.get_object(self.bucket_name, key, offset=offset, length=length or 0)
+        except S3Error as e:
+            if e.code == 'NoSuchKey':
+                raise FileNotFoundError(key) from e
+            raise
+        return MinioResponse(response)
+
+    def size(self, key):
+        try:
+            return self.client.stat_object(self.bucket_name, key).size
+        except S3Error:
+            return None
+
+    def delete(self, keys):
+        # Multi-object DELETE, 1000 keys per request; missing keys are not errors
+        errors = self.client.remove_objects(self.bucket_name, (DeleteObject(key) for key in keys))
+        for error in errors:
+            logger.error(f"Failed to delete {error.name}: {error.code} {error.message}")
+
+    def list(self, prefix):
+        for obj in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True):
+            yield obj.object_name, obj.last_modified
+
+    # minio-py has no public multipart API, so these use its internal helpers.
+    # minio is pinned in requirements.txt; MinioMultipartUploadTests covers them.
+    def create_multipart_upload(self, key, content_type) -> str:
+        return self.client._create_multipart_upload(self.bucket_name, key, {'Content-Type': content_type})
+
+    def upload_part(self, key, upload_id, part_number, chunks) -> str:
+        # UploadPart needs the whole body; parts are bounded by CHUNKED_UPLOAD_PART_SIZE
+        data = b''.join(chunks)
+        return self.client._upload_part(self.bucket_name, key, data, None, upload_id, part_number)
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        self.client._complete_multipart_upload(
+            self.bucket_name,
+            key,
+            upload_id,
+            [Part(part_number, etag) for part_number, etag in parts]
+        )
+
+    def abort_multipart_upload(self, key, upload_id):
+        try:
+            self.client._abort_multipart_upload(self.bucket_name, key, upload_id)
+        except S3Error:
+            pass
+
+    def presigned_put_url(self, key, expires):
+        return self.presign_client.presigned_put_object(self.bucket_name, key, expires=expires)
+
+    def presigned_get_url(self, key, expires, response_headers=None):
+        return self.presign_client.presigned_get_object(
+            self.bucket_name, key, expires=expires, response_headers=response_headers
+        )
+
+class MemoryBackend(StorageBackend):
+    """Process-local dict of objects, for benchmarks and tests.
+
+    Nothing is shared between processes, so run the thumbnail worker with
+    THUMBNAIL_ASYNC off (inline rendering) when serving from it.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self.objects = {}
+        self.modified = {}
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    def put(self, key, file_obj, content_type=None, content_encoding=None) -> str:
+        data = b''.join(iter_chunks(file_obj))
+        with self.lock:
+            self.objects[key] = data
+            self.modified[key] = datetime.now(timezone.utc)
+        return hashlib.sha256(data).hexdigest()
+
+    def open(self, key, offset=0, length=None):
+        try:
+            data = self.objects[key]
+        except KeyError:
+            raise FileNotFoundError(key) from None
+        end = len(data) if length is None else offset + length
+        return BytesIO(data[offset:end])
+
+    def size(self, key):
+        data = self.objects.get(key)
+        return None if data is None else len(data)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.objects.pop(key, None)
+                self.modified.pop(key, None)
+
+    def list(self, prefix):
+        with self.lock:
+            listing = [(key, self.modified[key]) for key in self.objects if key.startswith(prefix)]
+        yield from listing
+
+    def create_multipart_upload(self, key, content_type) -> str:
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_number, chunks) -> str:
+        data = b''.join(chunks)
+        with self.lock:
+            self.uploads[upload_id][part_number] = data
+        return hashlib.md5(data).hexdigest()
+
+    def complete_multipart_upload(self, key, upload_id, parts):
+        with self.lock:
+            stored = self.uploads.pop(upload_id)
+            self.objects[key] = b''.join(stored[part_number] for part_number, _ in parts)
+            self.modified[key] = datetime.now(timezone.utc)
+
+    def abort_multipart_upload(self, key, upload_id):
+        with self.lock:
+            self.uploads.pop(upload_id, None)
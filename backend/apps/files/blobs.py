@@ -0,0 +1,143 @@
+# apps/files/blobs.py
+"""Content-addressed storage with reference counting.
+
+Uploads are hashed before they are stored; identical bytes are kept once in a
+ContentBlob and every File pointing at it holds one reference. The object (and
+its thumbnail and renditions) is removed only when the last reference goes.
+Chunked and presigned uploads land at a key of their own and have no blob.
+"""
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ContentBlob, File, StorageUsage
+
+def acquire_blob(service, file_obj, content_type, thumbnail=False):
+    """Take a reference on the blob holding `file_obj`'s bytes.
+
+    The PUT is skipped entirely when the hash is already known. The reference
+    is committed right away: if the File can't be created, hand it back with
+    release_blob, which removes the bytes when nothing else uses them.
+    Compressible types are stored compressed when that pays off; the blob
+    records the encoding. With `thumbnail`, a PUT also renders and stores
+    the thumbnail at the same time.
+
+    Returns (blob, uploaded, metadata); metadata is the image metadata of a
+    thumbnail stored here, else None.
+    """
+    # Uploads received by InspectingUploadHandler were hashed on the way in
+    content_hash = getattr(file_obj, 'sha256', None) or service.hash_file(file_obj)
+    key = service.generate_blob_key(content_hash)
+
+    def put():
+        if thumbnail:
+            return service.upload_with_thumbnail(file_obj, key, content_type)
+        return (*service.upload_compressible(file_obj, key, content_type), None)
+
+    uploaded = False
+    encoding, stored_size, metadata = '', None, None
+    if not ContentBlob.objects.filter(sha256=content_hash).exists():
+        # The key is deterministic, so a racing upload of the same bytes just rewrites them
+        encoding, stored_size, metadata = put()
+        uploaded = True
+
+    blob, created = ContentBlob.objects.get_or_create(
+        sha256=content_hash,
+        defaults={
+            'storage_key': key, 'size_bytes': file_obj.size,
+            'content_encoding': encoding, 'stored_size': stored_size
+        }
+    )
+    if created and not uploaded:
+        # The last reference was released between our check and the insert
+        encoding, stored_size, metadata = put()
+        uploaded = True
+    if uploaded and (blob.content_encoding, blob.stored_size) != (encoding, stored_size):
+        # Our PUT was the last to write the key, so the row must describe our bytes
+        ContentBlob.objects.filter(sha256=content_hash).update(
+            content_encoding=encoding, stored_size=stored_size
+        )
+        blob.content_encoding, blob.stored_size = encoding, stored_size
+
+    if not ContentBlob.objects.filter(sha256=content_hash).update(ref_count=F('ref_count') + 1):
+        # Released and deleted while we waited on its row lock
+        if not uploaded:
+            encoding, stored_size, metadata = put()
+            uploaded = True
+        blob = ContentBlob.objects.create(
+            sha256=content_hash, storage_key=key, size_bytes=file_obj.size, ref_count=1,
+            content_encoding=encoding, stored_size=stored_size
+        )
+    return blob, uploaded, metadata
+
+def release_blob(service, blob_id):
+    """Drop one reference; delete the bytes when none are left. Returns True if deleted."""
+    with transaction.atomic():
+        blob = ContentBlob.objects.select_for_update().filter(sha256=blob_id).first()
+        if blob is None:
+            return False
+
+        if blob.ref_count > 1:
+            ContentBlob.objects.filter(sha256=blob_id).update(ref_count=F('ref_count') - 1)
+            return False
+
+        # Deleted while holding the row lock, so acquire_blob can't hand out a reference to it
+        service.delete(blob.storage_key)
+        blob.delete()
+        return True
+
+def hard_delete_file(service, file):
+    """Remove a File row for good and release the storage behind it."""
+    with transaction.atomic():
+        file.delete()
+        StorageUsage.objects.release(file.user_id, file.size_bytes, trashed=file.is_deleted)
+        if file.blob_id is not None:
+            release_blob(service, file.blob_id)
+        else:
+            # No blob: uploaded before deduplication, or through a chunked or
+            # presigned upload. Each of those owns its own key, and their
+            # complete/confirm steps create only one File per key
+            storage_key = file.storage_key
+            transaction.on_commit(lambda: service.delete(storage_key))
+
+def purge_files(service, files):
+    """Hard-delete a batch of File rows, releasing their storage in bulk.
+
+    Batch form of hard_delete_file: one DELETE for the rows, one UPDATE per
+    distinct decrement and a single backend call for every object that lost
+    its last reference. Returns the number of originals removed from storage.
+    """
+    files = list(files)
+    refs = Counter(file.blob_id for file in files if file.blob_id is not None)
+    owned_keys = [file.storage_key for file in files if file.blob_id is None]
+    # (user, was it in the trash) -> [bytes, files] to take off StorageUsage
+    usage = defaultdict(lambda: [0, 0])
+    for file in files:
+        usage[file.user_id, file.is_deleted][0] += file.size_bytes
+        usage[file.user_id, file.is_deleted][1] += 1
+
+    with transaction.atomic():
+        # Fixed lock order, so overlapping purges can't deadlock
+        blobs = list(
+            ContentBlob.objects.select_for_update().filter(sha256__in=refs).order_by('sha256')
+        )
+        File.objects.filter(id__in=[file.id for file in files]).delete()
+        for (user_id, trashed), (size, count) in usage.items():
+            StorageUsage.objects.release(user_id, size, count, trashed=trashed)
+
+        released = [blob for blob in blobs if blob.ref_count <= refs[blob.sha256]]
+        kept = sorted((refs[blob.sha256], blob.sha256) for blob in blobs if blob.ref_count > refs[blob.sha256])
+        for count, group in groupby(kept, key=lambda item: item[0]):
+            ContentBlob.objects.filter(sha256__in=[sha256 for _, sha256 in group]).update(
+                ref_count=F('ref_count') - count
+            )
+
+        # As in release_blob, remove the bytes while the rows are still locked
+        service.delete_many([blob.storage_key for blob in released])
+        ContentBlob.objects.filter(sha256__in=[blob.sha256 for blob in released]).delete()
+        if owned_keys:
+            transaction.on_commit(lambda: service.delete_many(owned_keys))
+
+    return len(released) + len(owned_keys)
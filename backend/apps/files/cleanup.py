@@ -0,0 +1,99 @@
+# apps/files/cleanup.py
+"""Reclaiming storage: the trash purge and the orphan scanner.
+
+Soft-deleted files keep their bytes until `manage.py purge_trash` removes
+them after TRASH_RETENTION_DAYS; the same run aborts chunked uploads
+whose session expired, discarding their parts. `manage.py scan_orphans` catches anything
+that slipped through, e.g. objects left behind by a crash between the PUT
+and the File row being committed.
+"""
+import logging
+import os
+
+from django.utils import timezone
+
+from .blobs import purge_files
+from .models import ContentBlob, File, Folder, UploadSession
+
+logger = logging.getLogger(__name__)
+
+def trashed_files(older_than):
+    """Files soft-deleted more than `older_than` (a timedelta) ago, oldest first."""
+    cutoff = timezone.now() - older_than
+    return File.objects.filter(deleted_at__lt=cutoff).order_by('deleted_at')
+
+def purge_trash(service, older_than, batch_size=500):
+    """Hard-delete expired trash `batch_size` files at a time. Yields (files, objects) per batch."""
+    queryset = trashed_files(older_than).only('id', 'user_id', 'storage_key', 'blob_id', 'size_bytes', 'deleted_at')
+    while True:
+        # Purged rows are gone, so every batch starts again from the top
+        batch = list(queryset[:batch_size])
+        if not batch:
+            return
+        yield len(batch), purge_files(service, batch)
+
+def trashed_folders(older_than):
+    cutoff = timezone.now() - older_than
+    return Folder.objects.filter(deleted_at__lt=cutoff)
+
+def purge_folders(older_than):
+    """Delete expired trashed folders. Returns how many.
+
+    Run after purge_trash(): a folder goes to the trash together with its
+    files, so by now they have been purged too.
+    """
+    _, deleted = trashed_folders(older_than).delete()
+    return deleted.get(Folder._meta.label, 0)
+
+def expired_upload_sessions():
+    return UploadSession.objects.filter(status=UploadSession.STATUS_ACTIVE, expires_at__lt=timezone.now())
+
+def expire_upload_sessions(service):
+    """Abort the multipart uploads of expired sessions and mark them aborted. Returns how many.
+
+    A session whose abort fails stays active and is retried on the next run.
+    """
+    aborted = 0
+    for session in expired_upload_sessions().only('id', 'storage_key', 'upload_id').iterator():
+        try:
+            service.abort_multipart_upload(session.storage_key, session.upload_id)
+        except Exception as e:
+            logger.warning(f"Could not abort upload session {session.id}: {e}")
+            continue
+        aborted += UploadSession.objects.filter(
+            pk=session.pk, status=UploadSession.STATUS_ACTIVE
+        ).update(status=UploadSession.STATUS_ABORTED)
+    return aborted
+
+def key_stem(key):
+    """What an original and its derived objects have in common.
+
+    files/1/uuid.png, thumbnails/1/uuid.png and renditions/md/1/uuid.webp
+    all map to '1/uuid'; blob keys have no extension to strip.
+    """
+    top, _, rest = key.partition('/')
+    if top == 'renditions':
+        rest = rest.partition('/')[2]
+    return os.path.splitext(rest)[0]
+
+def find_orphans(service, grace):
+    """Yield (key, last_modified) for stored objects no row refers to.
+
+    Objects newer than `grace` are skipped: their File or ContentBlob row
+    may simply not be committed yet.
+    """
+    known = set()
+    for queryset in (
+        File.objects.values_list('storage_key', flat=True),
+        ContentBlob.objects.values_list('storage_key', flat=True),
+        # Completed sessions are covered by their File; expired ones will never complete
+        UploadSession.objects.filter(
+            status=UploadSession.STATUS_ACTIVE, expires_at__gte=timezone.now()
+        ).values_list('storage_key', flat=True),
+    ):
+        known.update(key_stem(key) for key in queryset.iterator())
+
+    cutoff = timezone.now() - grace
+    for key, last_modified in service.list_objects():
+        if last_modified < cutoff and key_stem(key) not in known:
+            yield key, last_modified
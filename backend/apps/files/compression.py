@@ -0,0 +1,138 @@
+# apps/files/compression.py
+"""At-rest compression of compressible uploads.
+
+STORAGE_COMPRESSION maps MIME types to a codec, e.g.
+'text/plain:zstd,application/pdf:gzip'. Such a file is compressed before
+its PUT and stored compressed only when that saves at least
+STORAGE_COMPRESSION_MIN_SAVING of its size; the codec name is recorded as
+its content_encoding. Downloads send the stored bytes as they are, with
+Content-Encoding, to clients that accept the codec and decompress while
+streaming for everyone else.
+"""
+import re
+import tempfile
+import zlib
+from functools import lru_cache
+
+import zstandard
+from django.conf import settings
+
+CHUNK_SIZE = 64 * 1024
+
+class GzipCodec:
+    name = 'gzip'
+
+    def compressor(self):
+        # wbits=31: gzip framing, so the stored bytes are a valid `Content-Encoding: gzip` body
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def decompressor(self):
+        return zlib.decompressobj(31)
+
+class ZstdCodec:
+    name = 'zstd'
+
+    def compressor(self):
+        return zstandard.ZstdCompressor(level=3).compressobj()
+
+    def decompressor(self):
+        return zstandard.ZstdDecompressor().decompressobj()
+
+CODECS = {codec.name: codec for codec in (GzipCodec(), ZstdCodec())}
+
+@lru_cache(maxsize=None)
+def parse_rules(rules):
+    """'text/plain:zstd,application/pdf:gzip' -> {'text/plain': 'zstd', ...}"""
+    parsed = {}
+    for rule in filter(None, (rule.strip() for rule in rules.split(','))):
+        mime_type, _, codec = rule.rpartition(':')
+        mime_type = mime_type.strip()
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r} in STORAGE_COMPRESSION")
+        if mime_type.startswith('image/'):
+            # Thumbnails and renditions decode originals straight from storage
+            raise ValueError(f"Images can't be stored compressed ({mime_type!r} in STORAGE_COMPRESSION)")
+        parsed[mime_type] = codec
+    return parsed
+
+def codec_for(mime_type):
+    """The codec configured for `mime_type`, or None to store it as-is."""
+    name = parse_rules(settings.STORAGE_COMPRESSION).get(mime_type)
+    return CODECS[name] if name else None
+
+def compress(file_obj, codec):
+    """Compress a readable object into a rewound temp file. Returns (temp file, compressed size)."""
+    compressor = codec.compressor()
+    tmp = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    file_obj.seek(0)
+    for chunk in file_obj.chunks() if hasattr(file_obj, 'chunks') else iter(lambda: file_obj.read(CHUNK_SIZE), b''):
+        tmp.write(compressor.compress(chunk))
+    tmp.write(compressor.flush())
+    size = tmp.tell()
+    tmp.seek(0)
+    file_obj.seek(0)
+    return tmp, size
+
+def worth_it(size, compressed_size):
+    return compressed_size <= size * (1 - settings.STORAGE_COMPRESSION_MIN_SAVING)
+
+class DecompressingReader:
+    """read()/close() over a compressed stream, yielding decompressed bytes.
+
+    `offset` and `length` select a range of the decompressed content; the
+    bytes before it are decompressed and dropped, since compressed streams
+    can't be entered in the middle.
+    """
+
+    def __init__(self, stream, codec, offset=0, length=None):
+        self.stream = stream
+        self.decompressor = codec.decompressor()
+        self.skip = offset
+        self.remaining = length
+        self.buffer = b''
+        self.eof = False
+
+    def fill(self, size):
+        while len(self.buffer) < size and not self.eof:
+            chunk = self.stream.read(CHUNK_SIZE)
+            if chunk:
+                data = self.decompressor.decompress(chunk)
+            else:
+                data = self.decompressor.flush()
+                self.eof = True
+            if self.skip:
+                dropped = min(self.skip, len(data))
+                data = data[dropped:]
+                self.skip -= dropped
+            self.buffer += data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = float('inf')
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        if size <= 0:
+            return b''
+        self.fill(size)
+        size = min(size, len(self.buffer))
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
+
+def accepts_encoding(request, encoding):
+    """Whether the request's Accept-Encoding allows `encoding` (q=0 refuses it)."""
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '') if request is not None else ''
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() not in (encoding, '*'):
+            continue
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        try:
+            return not match or float(match.group(1)) > 0
+        except ValueError:
+            return False
+    return False
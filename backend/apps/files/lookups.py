@@ -0,0 +1,19 @@
+# apps/files/lookups.py
+from django.db import NotSupportedError
+from django.db.models import Lookup
+
+class FullTextMatch(Lookup):
+    """`field__match='+word*'`: MySQL boolean-mode MATCH ... AGAINST.
+
+    Needs a FULLTEXT index on the column (see migration 0009). Other
+    databases have no equivalent, so callers check the vendor first.
+    """
+    lookup_name = 'match'
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)", lhs_params + rhs_params
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError("Full-text match is only supported on MySQL")
@@ -0,0 +1,85 @@
+# apps/files/management/commands/process_thumbnails.py
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.files.tasks import (
+    claim_thumbnail_tasks,
+    complete_thumbnail_task,
+    enqueue_missing_metadata,
+    render_thumbnail,
+)
+
+class Command(BaseCommand):
+    help = "Generate queued thumbnails in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Number of thumbnail processes (default: CPU count).")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Tasks claimed per poll (default: 2x workers).")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue once and exit.")
+        parser.add_argument('--backfill-metadata', action='store_true',
+                            help="First queue images that have no image metadata yet.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size'] or workers * 2
+
+        if options['backfill_metadata']:
+            self.stdout.write(f"Queued {enqueue_missing_metadata()} image(s) for metadata backfill")
+
+        pool = self.make_pool(workers)
+        self.stdout.write(f"Thumbnail worker started with {workers} processes")
+        try:
+            while True:
+                tasks = claim_thumbnail_tasks(batch_size)
+                if not tasks:
+                    if options['once']:
+                        break
+                    # Don't hold an idle connection open between polls
+                    connections.close_all()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                futures = [
+                    (task, pool.submit(
+                        render_thumbnail, task.file.storage_key, task.file.mime_type, task.file.content_encoding
+                    ))
+                    for task in tasks
+                ]
+                broken = False
+                for task, future in futures:
+                    try:
+                        error, metadata = future.result()
+                    except BrokenProcessPool:
+                        # A pool process died (e.g. OOM on a huge image); the task is retried
+                        error, metadata = 'Worker process died', None
+                        broken = True
+                    complete_thumbnail_task(task, error, metadata)
+
+                if broken:
+                    pool.shutdown(wait=False)
+                    pool = self.make_pool(workers)
+
+                self.stdout.write(f"Processed {len(tasks)} thumbnail task(s)")
+        finally:
+            pool.shutdown()
+
+    def make_pool(self, workers):
+        # 'spawn' keeps pool processes from inheriting this process's DB connections.
+        # Spawned processes must set up Django before unpickling any task that imports models.
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        )
@@ -0,0 +1,51 @@
+# apps/files/management/commands/purge_trash.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from apps.files.cleanup import (
+    expire_upload_sessions, expired_upload_sessions, purge_folders, purge_trash, trashed_files, trashed_folders,
+)
+from apps.files.services import get_storage_service
+
+class Command(BaseCommand):
+    help = (
+        "Permanently delete files and folders that have been in the trash longer than the retention period, "
+        "and abort expired chunked uploads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TRASH_RETENTION_DAYS,
+                            help="Retention in days (default: TRASH_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Files deleted per transaction.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['days'])
+
+        if options['dry_run']:
+            totals = trashed_files(older_than).aggregate(files=Count('id'), size=Sum('size_bytes'))
+            self.stdout.write(
+                f"{totals['files']} file(s), {totals['size'] or 0} bytes, and "
+                f"{trashed_folders(older_than).count()} folder(s) "
+                f"in the trash for more than {options['days']} day(s); "
+                f"{expired_upload_sessions().count()} expired upload session(s)"
+            )
+            return
+
+        service = get_storage_service()
+        files = objects = 0
+        for batch_files, batch_objects in purge_trash(service, older_than, max(1, options['batch_size'])):
+            files += batch_files
+            objects += batch_objects
+            self.stdout.write(f"Purged {batch_files} file(s), {batch_objects} stored object(s)")
+        folders = purge_folders(older_than)
+        sessions = expire_upload_sessions(service)
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {files} file(s), {objects} stored object(s) and {folders} folder(s) in total; "
+            f"aborted {sessions} expired upload session(s)"
+        ))
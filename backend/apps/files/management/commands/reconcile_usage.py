@@ -0,0 +1,48 @@
+# apps/files/management/commands/reconcile_usage.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from apps.files.models import File, StorageUsage
+
+FIELDS = ('used_bytes', 'file_count', 'trash_bytes', 'trash_count')
+
+class Command(BaseCommand):
+    help = "Recompute each user's storage usage from the files table and correct any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report drift without fixing it.")
+
+    def handle(self, *args, **options):
+        user_ids = set(File.objects.order_by().values_list('user_id', flat=True).distinct())
+        user_ids.update(StorageUsage.objects.values_list('user_id', flat=True))
+
+        drifted = 0
+        for user_id in sorted(user_ids):
+            # Locking the row holds off uploads and deletes for this user while we count
+            with transaction.atomic():
+                StorageUsage.objects.for_user(user_id)
+                usage = StorageUsage.objects.select_for_update().get(user_id=user_id)
+                actual = File.objects.filter(user_id=user_id).aggregate(
+                    used_bytes=Sum('size_bytes', filter=Q(deleted_at__isnull=True), default=0),
+                    file_count=Count('id', filter=Q(deleted_at__isnull=True)),
+                    trash_bytes=Sum('size_bytes', filter=Q(deleted_at__isnull=False), default=0),
+                    trash_count=Count('id', filter=Q(deleted_at__isnull=False)),
+                )
+                changes = {
+                    field: (getattr(usage, field), actual[field])
+                    for field in FIELDS if getattr(usage, field) != actual[field]
+                }
+                if not changes:
+                    continue
+
+                drifted += 1
+                self.stdout.write(f"User {user_id}: " + ", ".join(
+                    f"{field} {old} -> {new}" for field, (old, new) in changes.items()
+                ))
+                if not options['dry_run']:
+                    StorageUsage.objects.filter(user_id=user_id).update(**actual)
+
+        verb = "Found" if options['dry_run'] else "Corrected"
+        self.stdout.write(self.style.SUCCESS(f"{verb} drift for {drifted} of {len(user_ids)} user(s)"))
@@ -0,0 +1,39 @@
+# apps/files/management/commands/scan_orphans.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.files.cleanup import find_orphans
+from apps.files.services import get_storage_service
+
+# Multi-object DELETE takes at most 1000 keys
+DELETE_BATCH_SIZE = 1000
+
+class Command(BaseCommand):
+    help = "List (and optionally delete) stored objects that no file refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help="Ignore objects modified more recently than this.")
+        parser.add_argument('--delete', action='store_true',
+                            help="Delete the orphans instead of only listing them.")
+
+    def handle(self, *args, **options):
+        service = get_storage_service()
+        grace = timedelta(hours=options['grace_hours'])
+
+        found = 0
+        batch = []
+        for key, last_modified in find_orphans(service, grace):
+            found += 1
+            self.stdout.write(f"{key}\t{last_modified.isoformat()}")
+            if options['delete']:
+                batch.append(key)
+                if len(batch) >= DELETE_BATCH_SIZE:
+                    service.delete_objects(batch)
+                    batch = []
+        if batch:
+            service.delete_objects(batch)
+
+        verb = "Deleted" if options['delete'] else "Found"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {found} orphaned object(s)"))
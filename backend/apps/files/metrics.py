@@ -0,0 +1,107 @@
+# apps/files/metrics.py
+"""Prometheus metrics of the upload and download pipeline, served on /metrics.
+
+Under gunicorn every worker keeps its own samples. gunicorn.conf.py sets
+PROMETHEUS_MULTIPROC_DIR before the workers start, so prometheus_client
+writes them to files there and a scrape of any one worker aggregates all
+of them. Without that variable (runserver, management commands) the
+process's own registry is served.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+# Seconds, from a cache hit to a slow PUT of a large file
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bytes, 1 KB to 4 GB in powers of four
+SIZE_BUCKETS = tuple(1024 * 4 ** n for n in range(12))
+
+STAGE_SECONDS = Histogram(
+    'file_pipeline_stage_seconds',
+    'Time spent in each stage of handling a file',
+    ['stage'],
+    buckets=DURATION_BUCKETS
+)
+DOWNLOAD_TTFB_SECONDS = Histogram(
+    'file_download_ttfb_seconds',
+    'Time from starting a streamed response to its first chunk being ready',
+    ['kind'],
+    buckets=DURATION_BUCKETS
+)
+DOWNLOAD_BYTES = Histogram(
+    'file_download_bytes',
+    'Bytes sent per streamed response, including transfers cut short',
+    ['kind'],
+    buckets=SIZE_BUCKETS
+)
+ERRORS = Counter(
+    'file_pipeline_errors_total',
+    'Failed file operations',
+    ['operation']
+)
+CACHE_LOOKUPS = Counter(
+    'file_cache_lookups_total',
+    'Cache lookups by cache and result',
+    ['cache', 'result']
+)
+
+def time_stage(stage):
+    """Context manager (or decorator) recording how long `stage` took."""
+    return STAGE_SECONDS.labels(stage).time()
+
+def count_error(operation):
+    ERRORS.labels(operation).inc()
+
+def count_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def measured(chunks, kind, started):
+    """Pass a response body through, recording time to first chunk and bytes sent.
+
+    `started` is the time.perf_counter() reading taken before the storage
+    object was opened, so TTFB includes the round trip to storage.
+    """
+    sent = 0
+    first = True
+    try:
+        for chunk in chunks:
+            if first:
+                DOWNLOAD_TTFB_SECONDS.labels(kind).observe(time.perf_counter() - started)
+                first = False
+            sent += len(chunk)
+            yield chunk
+    finally:
+        DOWNLOAD_BYTES.labels(kind).observe(sent)
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+async def ameasured(chunks, kind, started):
+    """measured() for an async body."""
+    sent = 0
+    first = True
+    try:
+        async for chunk in chunks:
+            if first:
+                DOWNLOAD_TTFB_SECONDS.labels(kind).observe(time.perf_counter() - started)
+                first = False
+            sent += len(chunk)
+            yield chunk
+    finally:
+        DOWNLOAD_BYTES.labels(kind).observe(sent)
+        await chunks.aclose()
+
+def is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+def render():
+    """Current samples in the text exposition format. Returns (body, content_type)."""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:47
+
+import apps.files.models
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_sharedlink'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('original_name', models.CharField(max_length=255)),
+                ('mime_type', models.CharField(max_length=100)),
+                ('size_bytes', models.BigIntegerField()),
+                ('part_size', models.PositiveIntegerField()),
+                ('storage_key', models.CharField(max_length=500, unique=True)),
+                ('upload_id', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('completed', 'Completed'), ('aborted', 'Aborted')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(default=apps.files.models.default_upload_expiry)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'upload_sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('part_number', models.PositiveIntegerField()),
+                ('etag', models.CharField(max_length=255)),
+                ('size_bytes', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='parts', to='files.uploadsession')),
+            ],
+            options={
+                'db_table': 'upload_parts',
+                'ordering': ['part_number'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['user', 'status'], name='upload_sess_user_id_73c91f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadpart',
+            unique_together={('session', 'part_number')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_content_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'deleted_at', 'created_at'], name='files_user_id_d50216_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='file',
+            name='files_user_id_5b354c_idx',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_fulltext_index(apps, schema_editor):
+    # FULLTEXT is MySQL-specific; other databases fall back to LIKE scans
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE files ADD FULLTEXT INDEX files_original_name_ft (original_name)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE files DROP INDEX files_original_name_ft')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_file_listing_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'deleted_at', 'original_name'], name='files_user_id_df1f99_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'deleted_at', 'size_bytes'], name='files_user_id_f1166d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['user', 'deleted_at', 'mime_type'], name='files_user_id_70972a_idx'),
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_file_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['deleted_at'], name='files_deleted_65053c_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_usage(apps, schema_editor):
+    # GROUP BY over the existing files; from here on the rows are kept up to date
+    File = apps.get_model('files', 'File')
+    StorageUsage = apps.get_model('files', 'StorageUsage')
+    usage = {}
+    for trashed, size_field, count_field in ((False, 'used_bytes', 'file_count'), (True, 'trash_bytes', 'trash_count')):
+        totals = (
+            File.objects.filter(deleted_at__isnull=not trashed).order_by()
+            .values('user_id').annotate(size=Sum('size_bytes'), count=Count('id'))
+        )
+        for row in totals:
+            entry = usage.setdefault(row['user_id'], StorageUsage(user_id=row['user_id']))
+            setattr(entry, size_field, row['size'])
+            setattr(entry, count_field, row['count'])
+    StorageUsage.objects.bulk_create(usage.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_file_deleted_at_index'),
+        ('users', '0002_alter_user_managers_remove_user_username_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('used_bytes', models.BigIntegerField(default=0)),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('trash_bytes', models.BigIntegerField(default=0)),
+                ('trash_count', models.PositiveIntegerField(default=0)),
+                ('quota_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'storage_usage',
+            },
+        ),
+        migrations.RunPython(backfill_usage, migrations.RunPython.noop),
+    ]
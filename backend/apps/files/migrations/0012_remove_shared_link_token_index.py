@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0011_storage_usage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sharedlink',
+            name='shared_link_token_e53f5d_idx',
+        ),
+    ]
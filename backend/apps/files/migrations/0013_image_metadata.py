@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0012_remove_shared_link_token_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageMetadata',
+            fields=[
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='image_metadata', serialize=False, to='files.file')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=20)),
+                ('orientation', models.PositiveSmallIntegerField(default=1)),
+                ('taken_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'image_metadata',
+                'indexes': [models.Index(fields=['width', 'height'], name='image_metad_width_bb5f23_idx'), models.Index(fields=['taken_at'], name='image_metad_taken_a_3728f2_idx')],
+            },
+        ),
+    ]
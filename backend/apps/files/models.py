@@ -1,19 +1,206 @@
 # apps/files/models.py
 import uuid
+import hashlib
 import secrets
 from datetime import timedelta
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value, Case, When, Count, Max, Sum
+from django.db.models.functions import Concat, Greatest, Length, Substr
 from django.conf import settings
 from django.utils import timezone
 
+from .lookups import FullTextMatch
+
+class ContentBlob(models.Model):
+    """Stored bytes shared by every File with the same SHA-256."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    storage_key = models.CharField(max_length=500, unique=True)
+    size_bytes = models.BigIntegerField()
+    # Codec the object was compressed with ('' when stored as-is) and its size in storage
+    content_encoding = models.CharField(max_length=10, blank=True, default='')
+    stored_size = models.BigIntegerField(null=True, blank=True)
+    # Number of File rows (deleted or not) pointing here; the object goes at zero
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'content_blobs'
+
+    def __str__(self):
+        return f"{self.sha256} (refs: {self.ref_count})"
+
+class FolderQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def subtree(self, folder):
+        """`folder` and everything below it: one range scan of the path index.
+
+        A plain range, not `path__startswith`: on MySQL that becomes
+        LIKE BINARY, which doesn't compare in the index's collation. Paths
+        are lowercase hex and '/', all sorting below 'g' in binary and
+        in MySQL's Unicode collations alike (where '~' would sort first).
+        """
+        return self.filter(path__gte=folder.path, path__lt=folder.path + 'g')
+
+class Folder(models.Model):
+    """A user's folder. `path` is the materialized path of ids from the root down.
+
+    Each level adds one fixed-size segment (the id in hex plus '/'), so a
+    subtree is a range of `path` starting at '<path>', depth is len(path) // SEGMENT and a
+    move rewrites the prefix of every path in the subtree in one UPDATE.
+    """
+    SEGMENT = 33
+    MAX_DEPTH = 20
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='folders')
+    name = models.CharField(max_length=255)
+    # None for top-level folders
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    path = models.CharField(max_length=SEGMENT * MAX_DEPTH, db_index=True, editable=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set on the whole subtree (and its files) at once; purged with the trash
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = FolderQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'folders'
+        ordering = ['name']
+        indexes = [
+            # Listing a folder's children (and the top level, where parent is NULL)
+            models.Index(fields=['user', 'parent', 'deleted_at', 'name']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    class MoveError(Exception):
+        """The folder can't go there: into its own subtree, or deeper than MAX_DEPTH."""
+
+    def save(self, *args, **kwargs):
+        if not self.path:
+            self.path = (self.parent.path if self.parent else '') + self.id.hex + '/'
+        super().save(*args, **kwargs)
+
+    @property
+    def depth(self):
+        """1 for a top-level folder."""
+        return len(self.path) // self.SEGMENT
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the top level down to the parent, read off the path."""
+        return [uuid.UUID(segment) for segment in self.path.split('/')[:-2]]
+
+    def subtree_files(self):
+        """Every file in this folder or below, as a single `folder_id IN (subquery)`."""
+        return File.objects.filter(folder__in=Folder.objects.subtree(self).values('pk'))
+
+    def move_to(self, parent):
+        """Re-parent the folder and rewrite every path below it with one UPDATE.
+
+        Raises Folder.MoveError when `parent` is inside the subtree or the
+        deepest folder would end up below MAX_DEPTH.
+        """
+        with transaction.atomic():
+            # Lock both ends so two crossing moves can't build a cycle
+            locked = {
+                folder.pk: folder
+                for folder in Folder.objects.select_for_update().filter(
+                    pk__in=[self.pk] + ([parent.pk] if parent else [])
+                ).order_by('pk')
+            }
+            folder = locked[self.pk]
+            parent = locked.get(parent.pk) if parent else None
+            if parent is not None and parent.path.startswith(folder.path):
+                raise Folder.MoveError("A folder can't be moved into itself or its subfolders.")
+
+            old_prefix = folder.path[:-self.SEGMENT]
+            new_prefix = parent.path if parent else ''
+            deepest = Folder.objects.subtree(folder).aggregate(longest=Max(Length('path')))['longest']
+            if (deepest - len(old_prefix) + len(new_prefix)) // self.SEGMENT > self.MAX_DEPTH:
+                raise Folder.MoveError(f"Folders can't be nested more than {self.MAX_DEPTH} levels deep.")
+
+            Folder.objects.subtree(folder).update(
+                path=Concat(Value(new_prefix), Substr('path', len(old_prefix) + 1)),
+                parent=Case(
+                    When(pk=folder.pk, then=Value(parent.pk if parent else None)),
+                    default=F('parent'),
+                    output_field=models.UUIDField()
+                ),
+                updated_at=timezone.now()
+            )
+        self.parent = parent
+        self.path = new_prefix + folder.path[len(old_prefix):]
+
+    def trash(self):
+        """Soft-delete the subtree and the live files in it. Returns the number of files."""
+        now = timezone.now()
+        with transaction.atomic():
+            subtree = Folder.objects.subtree(self).filter(user_id=self.user_id)
+            count = self.subtree_files().filter(deleted_at__isnull=True).update(deleted_at=now)
+            if count:
+                # Summed after the UPDATE, over the rows it flipped (and still holds locked)
+                size = self.subtree_files().filter(deleted_at=now).aggregate(size=Sum('size_bytes'))['size']
+                StorageUsage.objects.trash(self.user_id, size, count)
+            subtree.alive().update(deleted_at=now)
+        self.deleted_at = now
+        return count
+
+    def restore(self):
+        """Undo trash(): the folders and files it deleted come back together.
+
+        Raises StorageUsage.QuotaExceeded if the files no longer fit. Returns
+        the number of files restored.
+        """
+        deleted_at = self.deleted_at
+        with transaction.atomic():
+            subtree = Folder.objects.subtree(self).filter(user_id=self.user_id)
+            # Subfolders trashed earlier, on their own, stay in the trash
+            subtree.filter(deleted_at=deleted_at).update(deleted_at=None)
+            restored = self.subtree_files().filter(deleted_at=deleted_at)
+            totals = restored.aggregate(size=Sum('size_bytes'), count=Count('pk'))
+            if totals['count']:
+                restored.update(deleted_at=None)
+                StorageUsage.objects.restore(self.user_id, totals['size'], totals['count'])
+        self.deleted_at = None
+        return totals['count']
+
+    def __str__(self):
+        return f"{self.name} ({self.id})"
+
 class File(models.Model):
+    THUMBNAIL_NONE = 'none'
+    THUMBNAIL_PENDING = 'pending'
+    THUMBNAIL_READY = 'ready'
+    THUMBNAIL_FAILED = 'failed'
+    THUMBNAIL_STATUS_CHOICES = [
+        (THUMBNAIL_NONE, 'None'),
+        (THUMBNAIL_PENDING, 'Pending'),
+        (THUMBNAIL_READY, 'Ready'),
+        (THUMBNAIL_FAILED, 'Failed'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='files')
     original_name = models.CharField(max_length=255)
-    # The path where the file is physically stored (e.g., files/1/uuid_name.png)
-    storage_key = models.CharField(max_length=500, unique=True)
+    # The path where the file is physically stored (e.g., files/1/uuid_name.png).
+    # Deduplicated files share their blob's key, so it is not unique.
+    storage_key = models.CharField(max_length=500, db_index=True)
+    blob = models.ForeignKey(ContentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='files')
+    # None for files at the top level
+    folder = models.ForeignKey(Folder, on_delete=models.SET_NULL, null=True, blank=True, related_name='files')
     mime_type = models.CharField(max_length=100)
     size_bytes = models.BigIntegerField()
+    # Copied from the blob so downloads need no join; see apps/files/compression.py
+    content_encoding = models.CharField(max_length=10, blank=True, default='')
+    stored_size = models.BigIntegerField(null=True, blank=True)
+    # SHA-256 of the stored bytes, computed while uploading (blank for older rows)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    # 'none' for non-images and files uploaded before background thumbnails
+    thumbnail_status = models.CharField(max_length=20, choices=THUMBNAIL_STATUS_CHOICES, default=THUMBNAIL_NONE)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -23,26 +210,191 @@ class File(models.Model):
         db_table = 'files'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', 'deleted_at']),
+            # Listing and keyset pagination; InnoDB appends the id to every secondary index
+            models.Index(fields=['user', 'deleted_at', 'created_at']),
+            # Name prefix search and sorting by name / size, type filters
+            models.Index(fields=['user', 'deleted_at', 'original_name']),
+            models.Index(fields=['user', 'deleted_at', 'size_bytes']),
+            models.Index(fields=['user', 'deleted_at', 'mime_type']),
+            # Listing one folder (or the top level, where folder is NULL)
+            models.Index(fields=['user', 'folder', 'deleted_at', 'created_at']),
+            # Trash purge, which looks across all users
+            models.Index(fields=['deleted_at']),
+            # Plus a MySQL FULLTEXT index on original_name, created in migration 0009
         ]
 
+    # List filter categories and the MIME type prefixes they cover
+    CATEGORIES = {
+        'image': ['image/'],
+        'pdf': ['application/pdf'],
+        'text': ['text/'],
+        'video': ['video/'],
+        'audio': ['audio/'],
+    }
+
     @property
     def is_deleted(self):
         return self.deleted_at is not None
 
+    @property
+    def etag(self):
+        """Strong validator. Stored objects are immutable, so rows without a
+        content hash fall back to a digest of their unique storage key."""
+        return self.content_hash or hashlib.sha256(self.storage_key.encode()).hexdigest()
+
     def soft_delete(self):
         """Mark file as deleted without removing from DB."""
-        self.deleted_at = timezone.now()
-        self.save(update_fields=['deleted_at'])
+        now = timezone.now()
+        with transaction.atomic():
+            # Only the call that actually flips the row moves the bytes to the trash
+            if File.objects.filter(pk=self.pk, deleted_at__isnull=True).update(deleted_at=now):
+                StorageUsage.objects.trash(self.user_id, self.size_bytes)
+        self.deleted_at = now
 
     def restore(self):
-        """Recover a soft-deleted file."""
+        """Recover a soft-deleted file. Raises StorageUsage.QuotaExceeded if it no longer fits."""
+        with transaction.atomic():
+            if File.objects.filter(pk=self.pk, deleted_at__isnull=False).update(deleted_at=None):
+                StorageUsage.objects.restore(self.user_id, self.size_bytes)
+                File.leave_trashed_folders([self.pk])
         self.deleted_at = None
-        self.save(update_fields=['deleted_at'])
+
+    @staticmethod
+    def leave_trashed_folders(ids):
+        """Move restored files whose folder is still in the trash to the top level."""
+        File.objects.filter(
+            pk__in=ids, folder__in=Folder.objects.filter(deleted_at__isnull=False).values('pk')
+        ).update(folder=None)
 
     def __str__(self):
         return f"{self.original_name} ({self.id})"
 
+# original_name__match, backed by the FULLTEXT index
+File._meta.get_field('original_name').register_lookup(FullTextMatch)
+
+class StorageUsageManager(models.Manager):
+    """Running per-user totals, changed in the same transaction as the File rows.
+
+    Every method is a single UPDATE on the user's row, so quota checks never
+    need a SUM over `files`. Sizes are logical: a deduplicated file still
+    counts in full for each owner.
+    """
+
+    def for_user(self, user_id):
+        return self.get_or_create(user_id=user_id)[0]
+
+    def lock(self, user_id):
+        """Lock the user's row until the transaction ends, serialising that user's writes."""
+        self.for_user(user_id)
+        return self.select_for_update().get(user_id=user_id)
+
+    def _apply(self, user_id, condition=None, **changes):
+        """UPDATE the user's row by `changes` (F expressions) where `condition` holds.
+
+        The row is created on first use, so a miss is retried once.
+        Returns False only when the row exists and `condition` fails.
+        """
+        changes['updated_at'] = timezone.now()
+        queryset = self.filter(user_id=user_id)
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        if queryset.update(**changes):
+            return True
+        self.for_user(user_id)
+        return bool(queryset.update(**changes))
+
+    @staticmethod
+    def fits(size):
+        """Rows whose active bytes plus `size` stay within their quota."""
+        inherited = Q(quota_bytes__isnull=True)
+        if settings.STORAGE_QUOTA_BYTES:
+            inherited &= Q(used_bytes__lte=settings.STORAGE_QUOTA_BYTES - size)
+        return Q(quota_bytes=0) | Q(quota_bytes__gte=F('used_bytes') + size) | inherited
+
+    def charge(self, user_id, size, count=1):
+        """Account for new files. Raises QuotaExceeded, leaving the row untouched."""
+        if not self._apply(
+            user_id, self.fits(size),
+            used_bytes=F('used_bytes') + size, file_count=F('file_count') + count
+        ):
+            raise StorageUsage.QuotaExceeded(size)
+
+    @staticmethod
+    def decrement(field, amount):
+        """`field - amount`, floored at 0 so drifted totals can't break the unsigned counters.
+
+        Raising the column to `amount` first keeps the subtraction itself
+        non-negative, which MySQL requires for UNSIGNED columns.
+        """
+        return Greatest(F(field), amount) - amount
+
+    def trash(self, user_id, size, count=1):
+        """Soft delete: the bytes stop counting against the quota."""
+        self._apply(
+            user_id,
+            used_bytes=self.decrement('used_bytes', size), file_count=self.decrement('file_count', count),
+            trash_bytes=F('trash_bytes') + size, trash_count=F('trash_count') + count
+        )
+
+    def restore(self, user_id, size, count=1):
+        """Undo a soft delete. Raises QuotaExceeded if the files no longer fit."""
+        if not self._apply(
+            user_id, self.fits(size),
+            used_bytes=F('used_bytes') + size, file_count=F('file_count') + count,
+            trash_bytes=self.decrement('trash_bytes', size), trash_count=self.decrement('trash_count', count)
+        ):
+            raise StorageUsage.QuotaExceeded(size)
+
+    def release(self, user_id, size, count=1, trashed=True):
+        """Hard delete of files that were in the trash (or, with trashed=False, active)."""
+        if trashed:
+            self._apply(
+                user_id, trash_bytes=self.decrement('trash_bytes', size), trash_count=self.decrement('trash_count', count)
+            )
+        else:
+            self._apply(
+                user_id, used_bytes=self.decrement('used_bytes', size), file_count=self.decrement('file_count', count)
+            )
+
+    def remaining(self, user_id):
+        """Bytes the user may still upload, or None when unlimited. One primary key read."""
+        usage = self.filter(user_id=user_id).first() or self.model(user_id=user_id)
+        quota = usage.effective_quota
+        return None if quota is None else quota - usage.used_bytes
+
+class StorageUsage(models.Model):
+    """How much each user stores; `manage.py reconcile_usage` rebuilds it from `files`."""
+
+    class QuotaExceeded(Exception):
+        pass
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='storage_usage'
+    )
+    # Active files, which count against the quota
+    used_bytes = models.BigIntegerField(default=0)
+    file_count = models.PositiveIntegerField(default=0)
+    # Soft-deleted files still holding storage until purge_trash
+    trash_bytes = models.BigIntegerField(default=0)
+    trash_count = models.PositiveIntegerField(default=0)
+    # Per-user override of STORAGE_QUOTA_BYTES; 0 means unlimited
+    quota_bytes = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StorageUsageManager()
+
+    class Meta:
+        db_table = 'storage_usage'
+
+    @property
+    def effective_quota(self):
+        """Quota in bytes, or None when unlimited."""
+        quota = settings.STORAGE_QUOTA_BYTES if self.quota_bytes is None else self.quota_bytes
+        return quota or None
+
+    def __str__(self):
+        return f"{self.user_id}: {self.used_bytes} bytes"
+
 def generate_share_token():
     return secrets.token_urlsafe(24)
 
@@ -56,9 +408,6 @@ class SharedLink(models.Model):
 
     class Meta:
         db_table = 'shared_links'
-        indexes = [
-            models.Index(fields=['token']),
-        ]
 
     @property
     def is_expired(self):
@@ -67,3 +416,150 @@ class SharedLink(models.Model):
     def increment_download_count(self):
         self.download_count = models.F('download_count') + 1
         self.save(update_fields=['download_count'])
+
+def default_upload_expiry():
+    return timezone.now() + timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+
+class UploadSession(models.Model):
+    """Server-side state of a resumable chunked upload."""
+    STATUS_ACTIVE = 'active'
+    STATUS_COMPLETED = 'completed'
+    STATUS_ABORTED = 'aborted'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_ABORTED, 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    original_name = models.CharField(max_length=255)
+    mime_type = models.CharField(max_length=100)
+    size_bytes = models.BigIntegerField()
+    part_size = models.PositiveIntegerField()
+    # Final location of the assembled file, reserved when the session starts
+    storage_key = models.CharField(max_length=500, unique=True)
+    folder = models.ForeignKey(Folder, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # S3 multipart upload id on MinIO, part directory name on the local backend
+    upload_id = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_upload_expiry)
+
+    class Meta:
+        db_table = 'upload_sessions'
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+
+    @property
+    def total_parts(self):
+        return max(1, -(-self.size_bytes // self.part_size))
+
+    @property
+    def is_expired(self):
+        return timezone.now() > self.expires_at
+
+    def expected_part_size(self, part_number):
+        """Every part is `part_size` bytes except the last one."""
+        if part_number < self.total_parts:
+            return self.part_size
+        return self.size_bytes - self.part_size * (self.total_parts - 1)
+
+    def __str__(self):
+        return f"{self.original_name} ({self.status})"
+
+class UploadPart(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='parts')
+    part_number = models.PositiveIntegerField()
+    etag = models.CharField(max_length=255)
+    size_bytes = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'upload_parts'
+        ordering = ['part_number']
+        unique_together = [('session', 'part_number')]
+
+class ThumbnailTask(models.Model):
+    """Queued thumbnail job, consumed by `manage.py process_thumbnails`."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    MAX_ATTEMPTS = 3
+
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='thumbnail_tasks')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'thumbnail_tasks'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Thumbnail for {self.file_id} ({self.status})"
+
+class Rendition(models.Model):
+    """A resized WebP copy of an image, generated on first request."""
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=20)
+    # Shared between files deduplicated onto the same blob
+    storage_key = models.CharField(max_length=500, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size_bytes = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'renditions'
+        unique_together = [('file', 'name')]
+
+    def __str__(self):
+        return f"{self.name} of {self.file_id}"
+
+class ImageMetadata(models.Model):
+    """Header attributes of an image, read during the thumbnail pass."""
+    FIELDS = ('width', 'height', 'format', 'orientation', 'taken_at')
+
+    file = models.OneToOneField(File, on_delete=models.CASCADE, primary_key=True, related_name='image_metadata')
+    # As displayed, i.e. already swapped for EXIF orientations 5-8
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # Pillow's format name: PNG, JPEG, GIF, WEBP
+    format = models.CharField(max_length=20)
+    # EXIF Orientation tag, 1 (upright) to 8
+    orientation = models.PositiveSmallIntegerField(default=1)
+    # EXIF DateTimeOriginal, falling back to DateTime
+    taken_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'image_metadata'
+        indexes = [
+            models.Index(fields=['width', 'height']),
+            models.Index(fields=['taken_at']),
+        ]
+
+    @classmethod
+    def record(cls, file_id, metadata):
+        """Store (or replace) what read_image_metadata() returned for a file."""
+        if metadata:
+            cls.objects.update_or_create(file_id=file_id, defaults=metadata)
+
+    def __str__(self):
+        return f"{self.width}x{self.height} {self.format} ({self.file_id})"
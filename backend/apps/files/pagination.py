@@ -0,0 +1,134 @@
+# apps/files/pagination.py
+"""Keyset pagination for the file listing.
+
+Page-number pagination runs a COUNT(*) and an OFFSET scan per page, both of
+which grow with the size of the account. Here each page continues from the
+(sort field, id) of the last row it returned, so every page is one index
+range read on (user, deleted_at, <sort field>) whatever its depth.
+"""
+import base64
+import binascii
+import uuid
+from urllib.parse import parse_qsl, urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class FileCursorPagination(BasePagination):
+    """Pages addressed by an opaque `cursor`, in the view's `ordering` (newest first by default).
+
+    Requests that still send `page` get the old page-number behaviour
+    (with `count`) so existing clients keep working.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view)
+        self.legacy = None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        # '-created_at' unless the view sorts otherwise; pages are keyed on (field, id)
+        ordering = getattr(view, 'ordering', None) or '-created_at'
+        self.field = ordering.lstrip('-')
+        descending = ordering.startswith('-')
+        cursor = self.decode_cursor(request, queryset.model)
+
+        if cursor is None:
+            reverse = False
+        else:
+            value, pk, reverse = cursor
+            lookup = 'lt' if descending != reverse else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value}) | Q(**{self.field: value, f'id__{lookup}': pk})
+            )
+        # Walking back towards the start reads the opposite way, then flips the rows
+        direction = '-' if descending != reverse else ''
+        queryset = queryset.order_by(direction + self.field, direction + 'id')
+
+        # One extra row tells whether another page follows
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.legacy:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(last, False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        first = self.page[0]
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(first, True))
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        query = {'v': value.isoformat() if hasattr(value, 'isoformat') else str(value), 'i': str(obj.id)}
+        if reverse:
+            query['r'] = '1'
+        return base64.urlsafe_b64encode(urlencode(query).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            query = dict(parse_qsl(base64.urlsafe_b64decode(padded).decode(), strict_parsing=True))
+            value = model._meta.get_field(self.field).to_python(query['v'])
+            pk = uuid.UUID(query['i'])
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, query.get('r') == '1'
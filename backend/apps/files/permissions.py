@@ -5,5 +5,5 @@ class IsFileOwner(permissions.BasePermission):
     """Ensure user can only access their own files."""
     
     def has_object_permission(self, request, view, obj):
-        # Instance must have an attribute named 'user'.
-        return obj.user == request.user
+        # Instance must have a 'user' foreign key; compare ids so the user isn't fetched
+        return obj.user_id == request.user.id
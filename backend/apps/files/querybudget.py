@@ -0,0 +1,94 @@
+# apps/files/querybudget.py
+"""Per-request SQL query count and time, checked against a budget.
+
+QueryBudgetMiddleware records every query a request makes through
+connection.execute_wrapper. A request over QUERY_BUDGET queries (or a
+view's own `query_budget` attribute) or QUERY_BUDGET_DB_MS milliseconds
+of database time is logged with its statement count and total. With
+DEBUG on, each response also carries the numbers, as `Server-Timing: db`
+(shown by browser dev tools) and `X-DB-Queries`.
+
+Queries made while a streaming body is read, after the view returned,
+are not counted.
+
+In tests, query_budget() fails with the statements themselves:
+
+    with query_budget(3):
+        client.get(f'/api/files/{file.id}/')
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class QueryRecorder:
+    """execute_wrapper that counts queries and their time, optionally keeping the SQL."""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+            if self.statements is not None:
+                self.statements.append(sql)
+
+@contextmanager
+def query_budget(max_queries, max_ms=None):
+    """Raise QueryBudgetExceeded if the block runs more than `max_queries` queries (or `max_ms` of SQL)."""
+    recorder = QueryRecorder(keep_sql=True)
+    with connection.execute_wrapper(recorder):
+        yield recorder
+
+    over_time = max_ms is not None and recorder.seconds * 1000 > max_ms
+    if recorder.count > max_queries or over_time:
+        statements = '\n'.join(f"  {n}. {sql}" for n, sql in enumerate(recorder.statements, 1))
+        raise QueryBudgetExceeded(
+            f"{recorder.count} queries in {recorder.seconds * 1000:.1f} ms, "
+            f"budget {max_queries}" + (f" / {max_ms} ms" if max_ms is not None else '') + f":\n{statements}"
+        )
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        budget = getattr(request, 'query_budget', settings.QUERY_BUDGET)
+        db_ms = recorder.seconds * 1000
+        over_count = budget and recorder.count > budget
+        over_time = settings.QUERY_BUDGET_DB_MS and db_ms > settings.QUERY_BUDGET_DB_MS
+        if over_count or over_time:
+            logger.warning(
+                f"Query budget exceeded: {request.method} {request.path} made "
+                f"{recorder.count} queries (budget {budget}) in {db_ms:.1f} ms"
+            )
+
+        if settings.DEBUG:
+            response['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{recorder.count} queries"'
+            response['X-DB-Queries'] = recorder.count
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF views keep their class on the function; plain views may set the attribute directly
+        view = getattr(view_func, 'cls', view_func)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None:
+            request.query_budget = budget
+        return None
@@ -0,0 +1,233 @@
+# apps/files/responses.py
+"""Streaming file responses with HTTP Range and conditional request support.
+
+Objects the storage backend keeps on local disk are handed off instead of
+streamed through Python, depending on settings.LOCAL_FILE_SERVING:
+'sendfile' returns a FileResponse (zero-copy via wsgi.file_wrapper) and
+'accel' returns an X-Accel-Redirect for nginx to serve. Callers run their
+permission checks before calling file_response, so both stay behind them.
+
+Under ASGI the body is an async iterator instead: each blocking storage
+read runs on a small bounded thread pool, so a slow client holds a socket
+and a buffer, not a worker or a thread, for the length of the transfer.
+"""
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .compression import accepts_encoding
+from .metrics import ameasured, measured
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+def get_io_executor():
+    """Per-process pool for blocking storage reads made by async responses."""
+    global _io_executor
+    if _io_executor is None:
+        with _io_executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=settings.STORAGE_IO_THREADS,
+                    thread_name_prefix='storage-io'
+                )
+    return _io_executor
+
+def is_async_request(request):
+    """True when served by the ASGI handler (DRF's Request proxies `scope`)."""
+    return hasattr(request, 'scope')
+
+async def aiter_stream(stream, chunk_size=CHUNK_SIZE):
+    """Read an open storage object in the I/O pool, yielding chunks to the event loop."""
+    loop = asyncio.get_running_loop()
+    executor = get_io_executor()
+    try:
+        while chunk := await loop.run_in_executor(executor, stream.read, chunk_size):
+            yield chunk
+    finally:
+        stream.close()
+
+async def aiter_sync(iterator):
+    """Drive a blocking iterator from the I/O pool, one item at a time."""
+    loop = asyncio.get_running_loop()
+    executor = get_io_executor()
+    sentinel = object()
+    try:
+        while (item := await loop.run_in_executor(executor, next, iterator, sentinel)) is not sentinel:
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            close()
+
+def body_for(request, iterator, kind='archive'):
+    """Use a generated body as-is under WSGI, or bridged to async under ASGI.
+
+    Django would read a sync iterator to the end (in memory) before serving it over ASGI.
+    """
+    started = time.perf_counter()
+    if is_async_request(request):
+        return ameasured(aiter_sync(iterator), kind, started)
+    return measured(iterator, kind, started)
+
+def stream_body(request, service, storage_key, offset=0, length=None, content_encoding=''):
+    """Response body for an object. Opens it now, so a missing key raises FileNotFoundError here.
+
+    A `content_encoding` has the stored bytes decompressed on the way out.
+    """
+    started = time.perf_counter()
+    if is_async_request(request):
+        stream = service.open_stream(storage_key, offset, length, content_encoding)
+        return ameasured(aiter_stream(stream), 'file', started)
+    chunks = service.download_stream(storage_key, offset=offset, length=length, content_encoding=content_encoding)
+    return measured(chunks, 'file', started)
+
+def parse_range(header, size):
+    """Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when the header is absent or not a single byte range (the
+    full body is served then), and 'unsatisfiable' when it can't be served.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return 'unsatisfiable'
+    return start, end
+
+def if_range_passes(request, etag, last_modified):
+    """If-Range: honour Range only when the client's copy is still current."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == quote_etag(etag)
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified is not None and last_modified <= since
+
+def file_response(request, service, storage_key, *, content_type, size=None,
+                  etag=None, last_modified=None, disposition=None, cache_control=None,
+                  content_encoding='', stored_size=None):
+    """Stream an object from storage, answering 304/206/416 where appropriate.
+
+    `last_modified` is a Unix timestamp. Without a known `size` only the
+    conditional headers are handled and the full object is streamed.
+
+    An object stored compressed (`content_encoding`, `stored_size`) is sent
+    as stored, with Content-Encoding, when the client accepts that codec;
+    ranges and the ETag then refer to the compressed bytes. Other clients
+    get it decompressed while it streams.
+    """
+    headers = {}
+    decode = ''
+    if content_encoding:
+        headers['Vary'] = 'Accept-Encoding'
+        if accepts_encoding(request, content_encoding):
+            headers['Content-Encoding'] = content_encoding
+            size = stored_size
+            etag = f'{etag}-{content_encoding}' if etag else None
+        else:
+            decode = content_encoding
+    if etag:
+        headers['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+
+    not_modified = get_conditional_response(request, etag=quote_etag(etag) if etag else None, last_modified=last_modified)
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    byte_range = None
+    if size is not None:
+        headers['Accept-Ranges'] = 'bytes'
+        if if_range_passes(request, etag, last_modified):
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    serving = getattr(settings, 'LOCAL_FILE_SERVING', 'stream')
+    if decode:
+        # The file on disk holds the compressed bytes
+        serving = 'stream'
+    elif content_encoding and serving == 'accel':
+        # Keep Content-Encoding in our hands rather than nginx's
+        serving = 'sendfile'
+    if serving == 'sendfile' and is_async_request(request):
+        # ASGI has no file_wrapper and would read a sync FileResponse into memory
+        serving = 'stream'
+    path = service.local_path(storage_key) if serving in ('sendfile', 'accel') else None
+
+    if path is not None and serving == 'accel':
+        if not path.exists():
+            raise FileNotFoundError(storage_key)
+        # nginx applies Range itself; status and Content-Range mirror what it
+        # will send so callers can still tell resumed transfers apart
+        response = HttpResponse(content_type=content_type, status=206 if byte_range else 200)
+        response['X-Accel-Redirect'] = settings.LOCAL_ACCEL_PREFIX + quote(storage_key)
+        if byte_range:
+            response['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+    elif path is not None and (not byte_range or byte_range[1] == size - 1):
+        # FileResponse sends to EOF, so only open-ended ranges can use it
+        f = open(path, 'rb')
+        if byte_range:
+            f.seek(byte_range[0])
+        response = FileResponse(f, content_type=content_type)
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            stream_body(request, service, storage_key, offset=start, length=end - start + 1, content_encoding=decode),
+            content_type=content_type,
+            status=206
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = StreamingHttpResponse(
+            stream_body(request, service, storage_key, content_encoding=decode),
+            content_type=content_type
+        )
+        if size is not None:
+            response['Content-Length'] = size
+
+    if disposition:
+        response['Content-Disposition'] = disposition
+    elif isinstance(response, FileResponse):
+        # FileResponse derives one from the storage file name
+        response.headers.pop('Content-Disposition', None)
+    for name, value in headers.items():
+        response[name] = value
+    return response
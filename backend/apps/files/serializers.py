@@ -1,18 +1,68 @@
 # apps/files/serializers.py
+import re
+import uuid
 import magic  # Requires 'python-magic' system package and pip package
 from rest_framework import serializers
-from .models import File
 from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.db.models import F, Q
 from django.utils import timezone
-from .models import File, SharedLink
+from .models import File, Folder, SharedLink, UploadSession, StorageUsage, ImageMetadata
 
-class FileSerializer(serializers.ModelSerializer):
+def validate_quota(context, size):
+    """Reject an upload early when it cannot fit the caller's quota.
+
+    A single-row read; the binding check is StorageUsage.objects.charge()
+    when the File is saved.
+    """
+    request = context.get('request')
+    if request is None:
+        return
+    remaining = StorageUsage.objects.remaining(request.user.id)
+    if remaining is not None and size > remaining:
+        raise serializers.ValidationError(
+            f"Storage quota exceeded. {max(remaining, 0)} bytes left.",
+            code='QUOTA_EXCEEDED'
+        )
+
+class OwnedFolderField(serializers.PrimaryKeyRelatedField):
+    """A folder of the requesting user that is not in the trash, by id."""
+
+    def get_queryset(self):
+        return Folder.objects.alive().filter(user=self.context['request'].user)
+
+class SparseFieldsMixin:
+    """Honour `?fields=a,b` by dropping every other field before serialization.
+
+    Computed fields that are not asked for are never evaluated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            wanted = {name.strip() for name in requested.split(',')}
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+class ImageMetadataSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImageMetadata
+        fields = ImageMetadata.FIELDS
+        read_only_fields = fields
+
+class FileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Output serializer for file lists."""
     human_readable_size = serializers.SerializerMethodField()
+    # null until the thumbnail pass has read the image
+    image = ImageMetadataSerializer(source='image_metadata', read_only=True)
 
     class Meta:
         model = File
-        fields = ('id', 'original_name', 'mime_type', 'size_bytes', 'human_readable_size', 'created_at')
+        fields = ('id', 'original_name', 'folder', 'mime_type', 'size_bytes', 'human_readable_size', 'thumbnail_status', 'created_at', 'image')
         read_only_fields = fields
 
     def get_human_readable_size(self, obj):
@@ -23,9 +73,112 @@ class FileSerializer(serializers.ModelSerializer):
             size /= 1024
         return f"{size:.1f} TB"
 
+class FileListQuerySerializer(serializers.Serializer):
+    """Query parameters for searching, filtering and sorting the file list."""
+    # ordering value -> model field; pagination keys pages on (field, id)
+    ORDERING_FIELDS = {
+        'created_at': 'created_at',
+        'name': 'original_name',
+        'size': 'size_bytes',
+    }
+    # InnoDB's default innodb_ft_min_token_size; shorter words are not indexed
+    FULLTEXT_MIN_WORD = 3
+    ORIENTATIONS = ('landscape', 'portrait', 'square')
+
+    # A folder id, or 'root' for the top level; all folders when omitted
+    folder = serializers.CharField(required=False)
+    search = serializers.CharField(required=False, max_length=255)
+    name_prefix = serializers.CharField(required=False, max_length=255)
+    mime_type = serializers.CharField(required=False, max_length=100)
+    category = serializers.ChoiceField(required=False, choices=sorted(File.CATEGORIES))
+    size_min = serializers.IntegerField(required=False, min_value=0)
+    size_max = serializers.IntegerField(required=False, min_value=0)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    # Images only, from ImageMetadata
+    min_width = serializers.IntegerField(required=False, min_value=1)
+    min_height = serializers.IntegerField(required=False, min_value=1)
+    orientation = serializers.ChoiceField(required=False, choices=ORIENTATIONS)
+    taken_after = serializers.DateTimeField(required=False)
+    taken_before = serializers.DateTimeField(required=False)
+    ordering = serializers.ChoiceField(
+        required=False,
+        default='-created_at',
+        choices=[prefix + name for name in ORDERING_FIELDS for prefix in ('', '-')]
+    )
+
+    def validate_folder(self, value):
+        if value == 'root':
+            return None
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise serializers.ValidationError("Must be a folder id or 'root'.", code='INVALID_FOLDER')
+
+    def validate(self, data):
+        if 'size_min' in data and 'size_max' in data and data['size_min'] > data['size_max']:
+            raise serializers.ValidationError("size_min cannot exceed size_max.", code='INVALID_RANGE')
+        return data
+
+    def get_ordering(self):
+        """The ordering as a model field name, '-' prefixed when descending."""
+        ordering = self.validated_data['ordering']
+        descending = ordering.startswith('-')
+        return ('-' if descending else '') + self.ORDERING_FIELDS[ordering.lstrip('-')]
+
+    def filter_queryset(self, queryset):
+        data = self.validated_data
+
+        if 'folder' in data:
+            queryset = queryset.filter(folder=data['folder'])
+        if data.get('search'):
+            words = re.findall(r'\w+', data['search'])
+            indexed = [w for w in words if len(w) >= self.FULLTEXT_MIN_WORD]
+            if connection.vendor == 'mysql' and indexed:
+                # Every word must appear, as a word or word prefix
+                queryset = queryset.filter(original_name__match=' '.join(f'+{w}*' for w in indexed))
+                words = [w for w in words if w not in indexed]
+            for word in words:
+                queryset = queryset.filter(original_name__icontains=word)
+
+        if data.get('name_prefix'):
+            queryset = queryset.filter(original_name__istartswith=data['name_prefix'])
+        if data.get('mime_type'):
+            queryset = queryset.filter(mime_type__in=data['mime_type'].split(','))
+        if data.get('category'):
+            match = Q()
+            for prefix in File.CATEGORIES[data['category']]:
+                match |= Q(mime_type__startswith=prefix)
+            queryset = queryset.filter(match)
+        if 'size_min' in data:
+            queryset = queryset.filter(size_bytes__gte=data['size_min'])
+        if 'size_max' in data:
+            queryset = queryset.filter(size_bytes__lte=data['size_max'])
+        if 'created_after' in data:
+            queryset = queryset.filter(created_at__gte=data['created_after'])
+        if 'created_before' in data:
+            queryset = queryset.filter(created_at__lt=data['created_before'])
+
+        if 'min_width' in data:
+            queryset = queryset.filter(image_metadata__width__gte=data['min_width'])
+        if 'min_height' in data:
+            queryset = queryset.filter(image_metadata__height__gte=data['min_height'])
+        if data.get('orientation') == 'landscape':
+            queryset = queryset.filter(image_metadata__width__gt=F('image_metadata__height'))
+        elif data.get('orientation') == 'portrait':
+            queryset = queryset.filter(image_metadata__width__lt=F('image_metadata__height'))
+        elif data.get('orientation') == 'square':
+            queryset = queryset.filter(image_metadata__width=F('image_metadata__height'))
+        if 'taken_after' in data:
+            queryset = queryset.filter(image_metadata__taken_at__gte=data['taken_after'])
+        if 'taken_before' in data:
+            queryset = queryset.filter(image_metadata__taken_at__lt=data['taken_before'])
+        return queryset
+
 class FileUploadSerializer(serializers.Serializer):
     """Input serializer for validating file uploads."""
     file = serializers.FileField()
+    folder = OwnedFolderField(required=False, allow_null=True, default=None)
 
     ALLOWED_MIME_TYPES = [
         'image/png', 'image/jpeg', 'image/gif', 'image/webp',
@@ -40,6 +193,7 @@ class FileUploadSerializer(serializers.Serializer):
                 f"File too large. Max size is {self.MAX_SIZE/1024/1024}MB.",
                 code='FILE_TOO_LARGE'
             )
+        validate_quota(self.context, value.size)
 
         # 2. Type Check (Header)
         if value.content_type not in self.ALLOWED_MIME_TYPES:
@@ -50,10 +204,13 @@ class FileUploadSerializer(serializers.Serializer):
 
         # 3. Deep Content Check
         # Note: In some container setups, libmagic C libs might be missing. 
-        initial_pos = value.tell()
-        value.seek(0)
-        mime = magic.from_buffer(value.read(2048), mime=True)
-        value.seek(initial_pos) # Reset pointer
+        mime = getattr(value, 'sniffed_mime', None)
+        if mime is None:
+            # Not received through InspectingUploadHandler; read the head back
+            initial_pos = value.tell()
+            value.seek(0)
+            mime = magic.from_buffer(value.read(2048), mime=True)
+            value.seek(initial_pos) # Reset pointer
 
         if mime not in self.ALLOWED_MIME_TYPES:
              raise serializers.ValidationError(
@@ -63,6 +220,87 @@ class FileUploadSerializer(serializers.Serializer):
 
         return value
 
+class UploadSessionCreateSerializer(serializers.Serializer):
+    """Input serializer for starting a chunked upload."""
+    filename = serializers.CharField(max_length=255)
+    mime_type = serializers.CharField(max_length=100)
+    size_bytes = serializers.IntegerField(min_value=1)
+    folder = OwnedFolderField(required=False, allow_null=True, default=None)
+
+    def validate_size_bytes(self, value):
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"File too large. Max size is {settings.CHUNKED_UPLOAD_MAX_SIZE/1024/1024}MB.",
+                code='FILE_TOO_LARGE'
+            )
+        validate_quota(self.context, value)
+        return value
+
+    def validate_filename(self, value):
+        # Same cleanup Django's multipart parser gives form uploads: no path, no control characters
+        value = value.rsplit('/')[-1].rsplit('\\')[-1]
+        value = ''.join(char for char in value if char.isprintable())
+        if value in {'', '.', '..'}:
+            raise serializers.ValidationError("Invalid file name.", code='INVALID_FILENAME')
+        return value
+
+    def validate_mime_type(self, value):
+        if value not in FileUploadSerializer.ALLOWED_MIME_TYPES:
+            raise serializers.ValidationError(
+                f"Unsupported file type: {value}",
+                code='INVALID_FILE_TYPE'
+            )
+        return value
+
+class PresignedUploadSerializer(UploadSessionCreateSerializer):
+    """Input serializer for requesting a direct-to-storage upload URL."""
+
+class ConfirmUploadSerializer(serializers.Serializer):
+    """Input serializer for registering a file uploaded through a presigned URL."""
+    SIGNING_SALT = 'files.presigned-upload'
+
+    upload_token = serializers.CharField()
+
+    @classmethod
+    def make_token(cls, user_id, storage_key, filename, mime_type, size_bytes, folder=None):
+        return signing.dumps(
+            {
+                'user': user_id, 'key': storage_key, 'name': filename, 'mime': mime_type, 'size': size_bytes,
+                'folder': folder.id.hex if folder else None,
+            },
+            salt=cls.SIGNING_SALT
+        )
+
+    def validate_upload_token(self, value):
+        try:
+            payload = signing.loads(
+                value,
+                salt=self.SIGNING_SALT,
+                max_age=timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid or expired upload token.", code='INVALID_UPLOAD_TOKEN')
+
+        if payload['user'] != self.context['request'].user.id:
+            raise serializers.ValidationError("Invalid or expired upload token.", code='INVALID_UPLOAD_TOKEN')
+        return payload
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Output for a chunked upload, including the parts received so far."""
+    total_parts = serializers.IntegerField(read_only=True)
+    received_parts = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = (
+            'id', 'original_name', 'mime_type', 'size_bytes', 'part_size',
+            'total_parts', 'received_parts', 'status', 'created_at', 'expires_at'
+        )
+        read_only_fields = fields
+
+    def get_received_parts(self, obj):
+        return [part.part_number for part in obj.parts.all()]
+
 class CreateSharedLinkSerializer(serializers.Serializer):
     """Input for creating a new share link."""
     expires_in = serializers.ChoiceField(
@@ -84,6 +322,66 @@ class CreateSharedLinkSerializer(serializers.Serializer):
             return now + timedelta(days=7)
         return now + timedelta(hours=24) # Default
 
+class BulkFileSerializer(serializers.Serializer):
+    """Input for batch operations: the ids of the files to act on."""
+    ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_FILES
+    )
+
+    def validate_ids(self, value):
+        # Keep the caller's order (it is the archive order) without repeats
+        return list(dict.fromkeys(value))
+
+class BulkShareSerializer(BulkFileSerializer, CreateSharedLinkSerializer):
+    """Input for sharing several files with the same expiry."""
+
+class BulkMoveSerializer(BulkFileSerializer):
+    """Input for moving files into a folder (null for the top level)."""
+    folder = OwnedFolderField(allow_null=True)
+
+class FolderSerializer(serializers.ModelSerializer):
+    """A folder; `parent` (null for the top level) is also how folders are moved."""
+    parent = OwnedFolderField(required=False, allow_null=True, default=None)
+
+    class Meta:
+        model = Folder
+        fields = ('id', 'name', 'parent', 'created_at')
+        read_only_fields = ('id', 'created_at')
+
+    def validate_name(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("Folder name can't be blank.", code='blank')
+        return value
+
+    def validate(self, data):
+        name = data.get('name', self.instance.name if self.instance else None)
+        parent = data['parent'] if 'parent' in data else (self.instance.parent if self.instance else None)
+        siblings = Folder.objects.alive().filter(
+            user=self.context['request'].user, parent=parent, name=name
+        )
+        if self.instance is not None:
+            siblings = siblings.exclude(pk=self.instance.pk)
+        if siblings.exists():
+            raise serializers.ValidationError(
+                {'name': f'A folder named "{name}" already exists here.'}, code='DUPLICATE_NAME'
+            )
+        return data
+
+class FolderDetailSerializer(FolderSerializer):
+    """A folder with its breadcrumb trail, fetched in one query from the path."""
+    ancestors = serializers.SerializerMethodField()
+
+    class Meta(FolderSerializer.Meta):
+        fields = FolderSerializer.Meta.fields + ('ancestors',)
+
+    def get_ancestors(self, obj):
+        ids = obj.ancestor_ids
+        names = dict(Folder.objects.filter(pk__in=ids).values_list('id', 'name')) if ids else {}
+        return [{'id': pk, 'name': names.get(pk)} for pk in ids]
+
 class SharedLinkSerializer(serializers.ModelSerializer):
     """Output for the share link (including the full URL)."""
     url = serializers.SerializerMethodField()
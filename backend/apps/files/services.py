@@ -1,169 +1,482 @@
 # apps/files/services.py
 import os
+import uuid
+import shutil
+import hmac
+import hashlib
 import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from io import BytesIO
-from pathlib import Path
+from datetime import datetime, timedelta
 from PIL import Image
 
 from django.conf import settings
-from minio import Minio
-from minio.error import S3Error
+from django.utils import timezone
+
+from .backends import get_backend
+from .compression import CODECS, DecompressingReader, codec_for, compress, worth_it
+from .metrics import count_error, time_stage
+from .uploads import independent_reader
 
 logger = logging.getLogger(__name__)
 
+_default_service = None
+_default_service_lock = threading.Lock()
+_upload_executor = None
+_upload_executor_lock = threading.Lock()
+
+def get_storage_service():
+    """Process-wide StorageService.
+
+    Building one per request used to create (and on garbage collection tear
+    down) a MinIO client and its connection pool every time. Each gunicorn
+    worker or thumbnail process now gets its own lazily created instance.
+    """
+    global _default_service
+    if _default_service is None:
+        with _default_service_lock:
+            if _default_service is None:
+                _default_service = StorageService()
+    return _default_service
+
+def get_upload_executor():
+    """Per-process pool that renders and stores thumbnails while uploads PUT their originals."""
+    global _upload_executor
+    if _upload_executor is None:
+        with _upload_executor_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(
+                    max_workers=settings.UPLOAD_THUMBNAIL_THREADS,
+                    thread_name_prefix='upload-thumbnail'
+                )
+    return _upload_executor
+
 class StorageService:
     THUMBNAIL_SIZE = (200, 200)
+    # Longest side in pixels of each named rendition
+    RENDITION_SIZES = {'xs': 64, 'sm': 200, 'md': 800, 'lg': 1600}
+    # Refuse to decode anything larger (checked from the header, before decoding)
+    MAX_DECODE_PIXELS = 100_000_000
+    # Decode to at least this multiple of the target so the final LANCZOS pass keeps detail
+    REDUCING_GAP = 2
     IMAGE_MIME_TYPES = ['image/png', 'image/jpeg', 'image/gif', 'image/webp']
+    # EXIF tags: Orientation, DateTime, the Exif IFD pointer and DateTimeOriginal
+    EXIF_ORIENTATION = 0x0112
+    EXIF_DATETIME = 0x0132
+    EXIF_IFD = 0x8769
+    EXIF_DATETIME_ORIGINAL = 0x9003
+    # Top-level key prefixes this service writes to
+    KEY_PREFIXES = ('files/', 'thumbnails/', 'renditions/')
 
-    def __init__(self):
-        # Check if we should use MinIO (based on your settings.py logic)
-        self.use_minio = getattr(settings, 'USE_MINIO', False)
-        
-        if self.use_minio:
-            # --- MAP AWS SETTINGS TO MINIO CLIENT ---
-            endpoint_url = settings.AWS_S3_ENDPOINT_URL
-            
-            # MinIO client expects 'localhost:9000', not 'http://localhost:9000'
-            if endpoint_url.startswith('http://'):
-                endpoint = endpoint_url.replace('http://', '')
-                secure = False
-            elif endpoint_url.startswith('https://'):
-                endpoint = endpoint_url.replace('https://', '')
-                secure = True
-            else:
-                endpoint = endpoint_url
-                secure = False
-
-            self.client = Minio(
-                endpoint,
-                access_key=settings.AWS_ACCESS_KEY_ID,
-                secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                secure=secure
-            )
-            self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-        else:
-            # Local filesystem setup
-            self.media_root = Path(settings.MEDIA_ROOT)
-            self.files_dir = self.media_root / 'files'
-            self.thumbs_dir = self.media_root / 'thumbnails'
-            self.files_dir.mkdir(parents=True, exist_ok=True)
-            self.thumbs_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, backend=None):
+        # Byte storage (see apps.files.backends), chosen by STORAGE_BACKEND
+        self.backend = backend or get_backend()
+
+    def warm_up(self, connections=None):
+        """Open pooled connections ahead of the first request."""
+        self.backend.warm_up(connections)
+
+    def pool_stats(self) -> dict:
+        """Connection pool counters for this process."""
+        return self.backend.pool_stats()
+
+    @property
+    def supports_presigned_urls(self) -> bool:
+        return self.backend.supports_presigned_urls
 
     def generate_storage_key(self, user_id, filename):
-        import uuid
         ext = os.path.splitext(filename)[1].lower()
         # storage_key format: files/user_id/uuid.ext
         return f"files/{user_id}/{uuid.uuid4()}{ext}"
 
+    def generate_blob_key(self, content_hash: str) -> str:
+        """Deterministic key for deduplicated content.
+
+        Keyed with SECRET_KEY so knowing a file's hash is not enough to guess
+        where its bytes live.
+        """
+        name = hmac.new(settings.SECRET_KEY.encode(), content_hash.encode(), hashlib.sha256).hexdigest()
+        return f"files/blobs/{name[:2]}/{name}"
+
+    def hash_file(self, file_obj) -> str:
+        """SHA-256 of an uploaded file, leaving it rewound for the upload."""
+        digest = hashlib.sha256()
+        file_obj.seek(0)
+        for chunk in file_obj.chunks() if hasattr(file_obj, 'chunks') else iter(lambda: file_obj.read(64 * 1024), b''):
+            digest.update(chunk)
+        file_obj.seek(0)
+        return digest.hexdigest()
+
     def get_thumbnail_key(self, storage_key: str) -> str:
         """Convert storage key (files/...) to thumbnail key (thumbnails/...)"""
         return storage_key.replace('files/', 'thumbnails/', 1)
 
+    def get_rendition_key(self, storage_key: str, name: str) -> str:
+        """files/1/uuid.png -> renditions/md/1/uuid.webp"""
+        base = os.path.splitext(storage_key)[0]
+        return base.replace('files/', f'renditions/{name}/', 1) + '.webp'
+
     def is_image(self, mime_type: str) -> bool:
         return mime_type in self.IMAGE_MIME_TYPES
 
+    def open_scaled_image(self, file_obj, size):
+        """Open an image decoded only as large as needed to produce `size`.
+
+        JPEGs are decoded with DCT scaling (1/2, 1/4 or 1/8) via draft mode and
+        everything is then shrunk with reduce(), a cheap integer box filter,
+        before any mode conversion touches the full-resolution pixels.
+        """
+        return self.scale_image(Image.open(file_obj), size)
+
+    def scale_image(self, image, size):
+        """open_scaled_image() for an image that is already open but not yet decoded."""
+        if image.width * image.height > self.MAX_DECODE_PIXELS:
+            raise ValueError(f"Image too large to decode ({image.width}x{image.height})")
+
+        # Target box of the final thumbnail, with the image's own aspect ratio
+        ratio = min(size[0] / image.width, size[1] / image.height, 1)
+        target = (
+            max(1, round(image.width * ratio * self.REDUCING_GAP)),
+            max(1, round(image.height * ratio * self.REDUCING_GAP)),
+        )
+        image.draft(None, target)
+
+        # Palette and bilevel images can't be reduced or resampled directly
+        if image.mode in ('P', '1'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        factor = min(image.width // target[0], image.height // target[1])
+        if factor > 1 and image.mode in ('L', 'LA', 'RGB', 'RGBA', 'CMYK'):
+            image = image.reduce(factor)
+        return image
+
+    def read_image_metadata(self, image) -> dict:
+        """Dimensions, format, EXIF orientation and capture time, from the header only.
+
+        Width and height are as displayed, i.e. swapped for EXIF orientations
+        5-8. EXIF times carry no zone and are taken to be in TIME_ZONE.
+        """
+        exif = image.getexif()
+        orientation = exif.get(self.EXIF_ORIENTATION, 1)
+        if orientation not in range(1, 9):
+            orientation = 1
+        width, height = image.size
+        if orientation >= 5:
+            width, height = height, width
+
+        taken_at = None
+        raw = exif.get_ifd(self.EXIF_IFD).get(self.EXIF_DATETIME_ORIGINAL) or exif.get(self.EXIF_DATETIME)
+        if raw:
+            try:
+                taken_at = timezone.make_aware(datetime.strptime(str(raw).strip('\x00 '), '%Y:%m:%d %H:%M:%S'))
+            except ValueError:
+                # Cameras write all sorts of placeholders, e.g. '0000:00:00 00:00:00'
+                pass
+
+        return {
+            'width': width,
+            'height': height,
+            'format': image.format or '',
+            'orientation': orientation,
+            'taken_at': taken_at,
+        }
+
     def generate_thumbnail(self, file_obj, mime_type: str) -> BytesIO | None:
         """Generate thumbnail for image files in memory."""
+        return self.generate_thumbnail_and_metadata(file_obj, mime_type)[0]
+
+    def generate_thumbnail_and_metadata(self, file_obj, mime_type: str):
+        """Thumbnail plus read_image_metadata(), from a single open of the image.
+
+        Returns (thumbnail, metadata), both None when the image can't be decoded.
+        """
         if not self.is_image(mime_type):
-            return None
+            return None, None
 
         try:
-            image = Image.open(file_obj)
-            
-            # Convert RGBA to RGB for JPEGs
-            if image.mode == 'RGBA' and mime_type == 'image/jpeg':
-                image = image.convert('RGB')
-            
-            # Resize
-            image.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            
-            thumb_io = BytesIO()
-            format_map = {
-                'image/png': 'PNG', 'image/jpeg': 'JPEG',
-                'image/gif': 'GIF', 'image/webp': 'WEBP',
-            }
-            # Save to buffer
-            image.save(thumb_io, format=format_map.get(mime_type, 'PNG'), quality=85)
-            thumb_io.seek(0)
-            
-            # Reset original file pointer
-            file_obj.seek(0)
-            return thumb_io
+            with time_stage('thumbnail'):
+                return self._generate_thumbnail_and_metadata(file_obj, mime_type)
         except Exception as e:
+            count_error('thumbnail')
             logger.error(f"Thumbnail generation failed: {e}")
             file_obj.seek(0)
-            return None
-
-    def upload(self, file_obj, storage_key, content_type=None):
-        """Standard upload."""
-        if self.use_minio:
-            # Ensure we are at start and get size safely
-            file_obj.seek(0, 2)
-            size = file_obj.tell()
-            file_obj.seek(0)
-            
-            self.client.put_object(
-                self.bucket_name,
-                storage_key,
-                file_obj,
-                size,
-                content_type=content_type
-            )
-        else:
-            full_path = self.media_root / storage_key
-            full_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(full_path, 'wb') as f:
-                for chunk in file_obj.chunks() if hasattr(file_obj, 'chunks') else file_obj:
-                    if isinstance(chunk, bytes): f.write(chunk)
-                    else: f.write(file_obj.read())
+            return None, None
 
-    def upload_with_thumbnail(self, file_obj, storage_key: str, content_type: str):
-        """Uploads original file AND generates/uploads a thumbnail if it's an image."""
-        file_obj.seek(0)
+    def _generate_thumbnail_and_metadata(self, file_obj, mime_type):
+        image = Image.open(file_obj)
+        metadata = self.read_image_metadata(image)
+        image = self.scale_image(image, self.THUMBNAIL_SIZE)
         
-        # 1. Upload Original
-        self.upload(file_obj, storage_key, content_type)
+        # Convert RGBA to RGB for JPEGs
+        if image.mode == 'RGBA' and mime_type == 'image/jpeg':
+            image = image.convert('RGB')
+        
+        # Resize (open_scaled_image already did the coarse reduction)
+        image.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS, reducing_gap=None)
         
-        # 2. Generate Thumbnail
-        thumbnail_io = self.generate_thumbnail(file_obj, content_type)
+        thumb_io = BytesIO()
+        format_map = {
+            'image/png': 'PNG', 'image/jpeg': 'JPEG',
+            'image/gif': 'GIF', 'image/webp': 'WEBP',
+        }
+        # Save to buffer
+        image.save(thumb_io, format=format_map.get(mime_type, 'PNG'), quality=85)
+        thumb_io.seek(0)
         
-        if thumbnail_io:
-            thumb_key = self.get_thumbnail_key(storage_key)
-            self.upload(thumbnail_io, thumb_key, content_type)
-
-    def download_stream(self, storage_key):
-        if self.use_minio:
-            return self.client.get_object(self.bucket_name, storage_key)
-        else:
-            path = self.media_root / storage_key
-            if not path.exists():
-                raise FileNotFoundError
-            return open(path, 'rb')
-            
+        # Reset original file pointer
+        file_obj.seek(0)
+        return thumb_io, metadata
+
+    def upload(self, file_obj, storage_key, content_type=None, content_encoding=None) -> str:
+        """Standard upload. Returns the SHA-256 hex digest of the stored bytes."""
+        try:
+            with time_stage('storage_put'):
+                return self.backend.put(storage_key, file_obj, content_type, content_encoding)
+        except Exception:
+            count_error('storage_put')
+            raise
+
+    def upload_compressible(self, file_obj, storage_key, content_type):
+        """Upload, compressed when STORAGE_COMPRESSION has a codec for the type and it pays off.
+
+        Returns (content_encoding, stored_size): ('', None) when stored as-is.
+        """
+        codec = codec_for(content_type)
+        if codec is not None:
+            with time_stage('compress'):
+                compressed, compressed_size = compress(file_obj, codec)
+            with compressed:
+                if worth_it(file_obj.size, compressed_size):
+                    self.upload(compressed, storage_key, content_type, codec.name)
+                    return codec.name, compressed_size
+        self.upload(file_obj, storage_key, content_type)
+        return '', None
+
+    def upload_with_thumbnail(self, file_obj, storage_key: str, content_type: str):
+        """Upload an original while its thumbnail is rendered and stored alongside.
+
+        The thumbnail is made on the shared upload pool from a second handle on
+        `file_obj`, so the upload takes as long as the slower of the two rather
+        than their sum. A failed thumbnail only means there is none; a failed
+        original takes its thumbnail with it.
+
+        Returns (content_encoding, stored_size, image metadata or None).
+        """
+        file_obj.seek(0)
+        thumbnail = None
+        if self.is_image(content_type):
+            thumbnail = get_upload_executor().submit(
+                self._store_thumbnail_from, independent_reader(file_obj), storage_key, content_type
+            )
+
+        try:
+            content_encoding, stored_size = self.upload_compressible(file_obj, storage_key, content_type)
+        except Exception:
+            if thumbnail is not None:
+                wait([thumbnail])
+                if thumbnail.exception() is None and thumbnail.result() is not None:
+                    try:
+                        self.delete_objects([self.get_thumbnail_key(storage_key)])
+                    except Exception as e:
+                        logger.warning(f"Could not remove thumbnail of failed upload {storage_key}: {e}")
+            raise
+
+        metadata = None
+        if thumbnail is not None:
+            try:
+                metadata = thumbnail.result()
+            except Exception as e:
+                count_error('thumbnail')
+                logger.error(f"Thumbnail upload failed for {storage_key}: {e}")
+        return content_encoding, stored_size, metadata
+
+    def _store_thumbnail_from(self, reader, storage_key, content_type):
+        with reader:
+            return self.store_thumbnail(reader, storage_key, content_type)
+
+    def store_thumbnail(self, file_obj, storage_key: str, content_type: str) -> dict | None:
+        """Generate a thumbnail from a local file object and upload it.
+
+        Returns the image metadata when a thumbnail was stored, else None.
+        """
+        thumbnail_io, metadata = self.generate_thumbnail_and_metadata(file_obj, content_type)
+        if thumbnail_io is None:
+            return None
+        self.upload(thumbnail_io, self.get_thumbnail_key(storage_key), content_type)
+        return metadata
+
+    def download_to_tempfile(self, storage_key: str, content_encoding=''):
+        """Copy a stored object, decompressed, into a seekable temp file (Pillow needs to seek)."""
+        tmp = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        stream = self.open_stream(storage_key, content_encoding=content_encoding)
+        try:
+            shutil.copyfileobj(stream, tmp)
+        except Exception:
+            tmp.close()
+            raise
+        finally:
+            stream.close()
+        tmp.seek(0)
+        return tmp
+
+    def create_thumbnail(self, storage_key: str, content_type: str, content_encoding='') -> dict | None:
+        """Generate the thumbnail for an object that is already in storage.
+
+        `content_encoding` is the blob's: a deduplicated blob may have been
+        stored compressed under another declared type. Returns the image
+        metadata when a thumbnail was stored, else None. Storage errors propagate.
+        """
+        if not self.is_image(content_type):
+            return None
+
+        with self.download_to_tempfile(storage_key, content_encoding) as tmp:
+            return self.store_thumbnail(tmp, storage_key, content_type)
+
+    def generate_rendition(self, file_obj, max_side: int):
+        """Resize an image to fit max_side and encode it as WebP.
+
+        Returns (BytesIO, width, height). Smaller images are re-encoded, never upscaled.
+        """
+        image = self.open_scaled_image(file_obj, (max_side, max_side))
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=None)
+
+        rendition_io = BytesIO()
+        image.save(rendition_io, format='WEBP', quality=80)
+        rendition_io.seek(0)
+        return rendition_io, image.width, image.height
+
+    def create_rendition(self, storage_key: str, name: str, content_encoding=''):
+        """Render and store a named rendition. Returns (key, width, height, size_bytes)."""
+        with self.download_to_tempfile(storage_key, content_encoding) as tmp:
+            with time_stage('rendition'):
+                rendition_io, width, height = self.generate_rendition(tmp, self.RENDITION_SIZES[name])
+
+        key = self.get_rendition_key(storage_key, name)
+        size = rendition_io.getbuffer().nbytes
+        self.upload(rendition_io, key, 'image/webp')
+        return key, width, height, size
+
+    def create_multipart_upload(self, storage_key: str, content_type: str) -> str:
+        """Start a chunked upload and return its upload id."""
+        return self.backend.create_multipart_upload(storage_key, content_type)
+
+    def upload_part(self, storage_key: str, upload_id: str, part_number: int, chunks) -> str:
+        """Store one part of a chunked upload and return its ETag.
+
+        `chunks` is an iterable of bytes. Re-uploading a part number replaces it.
+        """
+        try:
+            with time_stage('storage_put_part'):
+                return self.backend.upload_part(storage_key, upload_id, part_number, chunks)
+        except Exception:
+            count_error('storage_put_part')
+            raise
+
+    def complete_multipart_upload(self, storage_key: str, upload_id: str, parts):
+        """Assemble the uploaded parts. `parts` is an ordered list of (part_number, etag)."""
+        self.backend.complete_multipart_upload(storage_key, upload_id, parts)
+
+    def abort_multipart_upload(self, storage_key: str, upload_id: str):
+        """Discard every part uploaded so far."""
+        self.backend.abort_multipart_upload(storage_key, upload_id)
+
+    def presigned_upload_url(self, storage_key: str) -> str:
+        """Short-lived URL the browser can PUT the object to directly."""
+        return self.backend.presigned_put_url(
+            storage_key, timedelta(seconds=settings.PRESIGNED_URL_EXPIRY_SECONDS)
+        )
+
+    def presigned_download_url(self, storage_key: str, content_type: str, disposition: str) -> str:
+        """Short-lived GET URL; S3 applies the response headers on our behalf."""
+        return self.backend.presigned_get_url(
+            storage_key,
+            timedelta(seconds=settings.PRESIGNED_URL_EXPIRY_SECONDS),
+            response_headers={
+                'response-content-type': content_type,
+                'response-content-disposition': disposition,
+            }
+        )
+
+    def stat(self, storage_key: str):
+        """Return the stored object size in bytes, or None if it does not exist."""
+        return self.backend.size(storage_key)
+
+    def read_head(self, storage_key: str, length: int = 2048) -> bytes:
+        """Read the first bytes of a stored object (for content sniffing)."""
+        stream = self.backend.open(storage_key, length=length)
+        try:
+            return stream.read(length)
+        finally:
+            stream.close()
+
+    def local_path(self, storage_key):
+        """Path on this machine's disk, or None when the backend is not file based."""
+        return self.backend.local_path(storage_key)
+
+    def open_stream(self, storage_key, offset=0, length=None, content_encoding=''):
+        """Open an object as a readable stream; the caller must close() it.
+
+        Objects stored with a `content_encoding` are decompressed on the fly,
+        and `offset`/`length` then count decompressed bytes.
+        """
+        if content_encoding:
+            return DecompressingReader(self.backend.open(storage_key), CODECS[content_encoding], offset, length)
+        return self.backend.open(storage_key, offset, length)
+
+    def download_stream(self, storage_key, offset=0, length=None, content_encoding=''):
+        """Open an object for streaming, optionally only `length` bytes from `offset`.
+
+        Opening happens here, so a missing object raises FileNotFoundError
+        before any response is started.
+        """
+        return self._iter_stream(self.open_stream(storage_key, offset, length, content_encoding))
+
+    @staticmethod
+    def _iter_stream(stream, chunk_size=64 * 1024):
+        """Yield an open object's bytes in chunks, closing it afterwards."""
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                yield chunk
+        finally:
+            stream.close()
+
+    def derived_keys(self, storage_key):
+        """The thumbnail and rendition keys that belong to an original."""
+        if 'files/' not in storage_key:
+            return []
+        return [self.get_thumbnail_key(storage_key)] + [
+            self.get_rendition_key(storage_key, name) for name in self.RENDITION_SIZES
+        ]
+
     def delete(self, storage_key):
-        keys_to_delete = [storage_key]
-        if 'files/' in storage_key:
-            keys_to_delete.append(self.get_thumbnail_key(storage_key))
-
-        if self.use_minio:
-            for key in keys_to_delete:
-                try:
-                    self.client.remove_object(self.bucket_name, key)
-                except S3Error:
-                    pass
-        else:
-            for key in keys_to_delete:
-                path = self.media_root / key
-                if path.exists():
-                    os.remove(path)
+        self.delete_many([storage_key])
+
+    def delete_many(self, storage_keys):
+        """Delete originals with their thumbnails and renditions in one backend call."""
+        keys_to_delete = []
+        for storage_key in storage_keys:
+            keys_to_delete.append(storage_key)
+            keys_to_delete.extend(self.derived_keys(storage_key))
+        if keys_to_delete:
+            self.backend.delete(keys_to_delete)
+
+    def delete_objects(self, keys):
+        """Delete exactly these objects, without their derived keys."""
+        self.backend.delete(keys)
+
+    def list_objects(self):
+        """Yield (key, last_modified) for every original, thumbnail and rendition in storage."""
+        for prefix in self.KEY_PREFIXES:
+            yield from self.backend.list(prefix)
 
     def thumbnail_exists(self, storage_key: str) -> bool:
-        thumb_key = self.get_thumbnail_key(storage_key)
         try:
-            if self.use_minio:
-                self.client.stat_object(self.bucket_name, thumb_key)
-                return True
-            else:
-                return (self.media_root / thumb_key).exists()
-        except:
+            return self.backend.exists(self.get_thumbnail_key(storage_key))
+        except Exception:
             return False
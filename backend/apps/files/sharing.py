@@ -0,0 +1,155 @@
+# apps/files/sharing.py
+"""Hot path of public share links.
+
+A viral link used to cost a SELECT and an UPDATE of the same row on every
+download. Token lookups are now served from the Django cache, and download
+counts are added up in memory and written in batches: by a timer thread
+at most SHARE_COUNT_FLUSH_SECONDS after the first pending hit, and when
+the worker exits.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from itertools import groupby
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+
+from .metrics import count_cache_lookup
+from .models import SharedLink
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'shared-link:'
+# Cached for unknown tokens, so guessing doesn't hit the database either
+MISSING = 'missing'
+
+def cache_key(token):
+    return CACHE_PREFIX + token
+
+def snapshot(link):
+    """What a download needs from the link and its file, as plain cacheable values."""
+    file = link.file
+    return {
+        'id': link.id,
+        'expires_at': link.expires_at.timestamp(),
+        'file_deleted': file.deleted_at is not None,
+        'storage_key': file.storage_key,
+        'original_name': file.original_name,
+        'mime_type': file.mime_type,
+        'size_bytes': file.size_bytes,
+        'content_encoding': file.content_encoding,
+        'stored_size': file.stored_size,
+        'etag': file.etag,
+        'created_at': int(file.created_at.timestamp()),
+    }
+
+def resolve_shared_link(token):
+    """Snapshot of the link for `token`, or None if there is no such link."""
+    cached = cache.get(cache_key(token))
+    count_cache_lookup('shared_link', cached is not None)
+    if cached == MISSING:
+        return None
+    if cached is not None:
+        return cached
+
+    link = SharedLink.objects.select_related('file').filter(token=token).first()
+    if link is None:
+        cache.set(cache_key(token), MISSING, settings.SHARED_LINK_CACHE_SECONDS)
+        return None
+
+    link = snapshot(link)
+    # Never outlive the link, so expiry is exact even from the cache
+    ttl = min(settings.SHARED_LINK_CACHE_SECONDS, max(1, int(link['expires_at'] - time.time())))
+    cache.set(cache_key(token), link, ttl)
+    return link
+
+def is_expired(link):
+    return time.time() > link['expires_at']
+
+def forget_shared_links(file_ids):
+    """Drop cached links of files that were deleted or restored.
+
+    Runs after commit, so a concurrent download can't cache the old state again.
+    """
+    tokens = list(SharedLink.objects.filter(file_id__in=file_ids).values_list('token', flat=True))
+    if tokens:
+        transaction.on_commit(lambda: cache.delete_many([cache_key(token) for token in tokens]))
+
+class DownloadCounter:
+    """Per-process download counts, written to the database in batches."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.timer = None
+
+    def add(self, link_id):
+        with self.lock:
+            self.pending[link_id] += 1
+            due = time.monotonic() - self.last_flush >= self.interval
+            if not due:
+                self.schedule()
+        if due:
+            self.flush()
+
+    def schedule(self):
+        """Make sure a flush follows within the interval. Call with the lock held.
+
+        Counts must not wait for the next download, which may never come.
+        """
+        if self.timer is None:
+            self.timer = threading.Timer(self.interval, self.flush_from_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread's own database connection
+            connections.close_all()
+
+    def clear(self):
+        """Drop pending counts without writing them and restart the interval (tests)."""
+        with self.lock:
+            self.pending = Counter()
+            self.last_flush = time.monotonic()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def flush(self):
+        """Write pending counts: one UPDATE per distinct increment, not per link."""
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+            if self.timer is not None:
+                # A no-op when called from the timer itself
+                self.timer.cancel()
+                self.timer = None
+        if not pending:
+            return
+
+        by_count = sorted((count, link_id) for link_id, count in pending.items())
+        try:
+            with transaction.atomic():
+                for count, group in groupby(by_count, key=lambda item: item[0]):
+                    SharedLink.objects.filter(id__in=[link_id for _, link_id in group]).update(
+                        download_count=F('download_count') + count
+                    )
+        except Exception as e:
+            # Put them back for the next flush rather than lose them
+            with self.lock:
+                self.pending.update(pending)
+                self.schedule()
+            logger.error(f"Failed to flush share download counts: {e}")
+
+download_counter = DownloadCounter(settings.SHARE_COUNT_FLUSH_SECONDS)
+atexit.register(download_counter.flush)
@@ -0,0 +1,119 @@
+# apps/files/tasks.py
+"""DB-backed thumbnail queue.
+
+Uploads enqueue a ThumbnailTask in the same transaction as the File row;
+`manage.py process_thumbnails` claims tasks in batches and renders them in a
+process pool, so no external broker is needed.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import File, ImageMetadata, ThumbnailTask
+from .services import StorageService, get_storage_service
+
+logger = logging.getLogger(__name__)
+
+# A task left 'running' longer than this is assumed to belong to a dead worker
+STALE_TASK_TIMEOUT = timedelta(minutes=10)
+
+def enqueue_thumbnail(file):
+    """Queue thumbnail generation for an image. Call inside the File's transaction."""
+    if file.mime_type not in StorageService.IMAGE_MIME_TYPES:
+        return None
+
+    if file.thumbnail_status != File.THUMBNAIL_PENDING:
+        file.thumbnail_status = File.THUMBNAIL_PENDING
+        file.save(update_fields=['thumbnail_status'])
+    return ThumbnailTask.objects.create(file=file)
+
+def enqueue_missing_metadata(batch_size=1000):
+    """Queue a thumbnail pass for images stored before metadata was extracted.
+
+    Their thumbnail_status is left alone, so previews keep working meanwhile.
+    Returns the number of tasks queued.
+    """
+    pending = ThumbnailTask.objects.filter(
+        status__in=[ThumbnailTask.STATUS_QUEUED, ThumbnailTask.STATUS_RUNNING]
+    ).values('file_id')
+    file_ids = (
+        File.objects.filter(
+            mime_type__in=StorageService.IMAGE_MIME_TYPES,
+            deleted_at__isnull=True,
+            image_metadata__isnull=True
+        )
+        .exclude(id__in=pending)
+        .values_list('id', flat=True)
+    )
+    tasks = ThumbnailTask.objects.bulk_create(
+        (ThumbnailTask(file_id=file_id) for file_id in file_ids.iterator()), batch_size=batch_size
+    )
+    return len(tasks)
+
+def claim_thumbnail_tasks(limit):
+    """Atomically move up to `limit` queued tasks to 'running' and return them."""
+    now = timezone.now()
+
+    # Requeue work abandoned by crashed workers
+    ThumbnailTask.objects.filter(
+        status=ThumbnailTask.STATUS_RUNNING,
+        locked_at__lt=now - STALE_TASK_TIMEOUT
+    ).update(status=ThumbnailTask.STATUS_QUEUED)
+
+    with transaction.atomic():
+        tasks = list(
+            ThumbnailTask.objects.select_for_update(skip_locked=True)
+            .select_related('file')
+            .filter(status=ThumbnailTask.STATUS_QUEUED)[:limit]
+        )
+        ThumbnailTask.objects.filter(id__in=[task.id for task in tasks]).update(
+            status=ThumbnailTask.STATUS_RUNNING,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        )
+
+    for task in tasks:
+        task.attempts += 1
+    return tasks
+
+def complete_thumbnail_task(task, error=None, metadata=None):
+    """Record the outcome of a claimed task, the File's status and its image metadata."""
+    now = timezone.now()
+
+    with transaction.atomic():
+        if error is None:
+            task.status = ThumbnailTask.STATUS_DONE
+            file_status = File.THUMBNAIL_READY
+        elif task.attempts < ThumbnailTask.MAX_ATTEMPTS:
+            # Leave the file pending, another worker pass will retry it
+            task.status = ThumbnailTask.STATUS_QUEUED
+            file_status = None
+        else:
+            task.status = ThumbnailTask.STATUS_FAILED
+            file_status = File.THUMBNAIL_FAILED
+
+        task.last_error = error or ''
+        task.finished_at = now
+        task.save(update_fields=['status', 'last_error', 'finished_at'])
+
+        if file_status:
+            File.objects.filter(id=task.file_id).update(thumbnail_status=file_status)
+        ImageMetadata.record(task.file_id, metadata)
+
+def render_thumbnail(storage_key, mime_type, content_encoding=''):
+    """Run inside a pool process. Touches storage only, never the database.
+
+    Returns (error, metadata): (None, image metadata) on success, or an
+    error message and None.
+    """
+    try:
+        metadata = get_storage_service().create_thumbnail(storage_key, mime_type, content_encoding)
+        if metadata:
+            return None, metadata
+        return 'Image could not be decoded', None
+    except Exception as e:
+        logger.error(f"Thumbnail task failed for {storage_key}: {e}")
+        return str(e) or e.__class__.__name__, None
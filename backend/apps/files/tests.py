@@ -1,3 +1,802 @@
-from django.test import TestCase
+# apps/files/tests.py
+import gzip
+import io
+import threading
+import zipfile
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from uuid import uuid4
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from urllib3 import HTTPResponse, PoolManager
+
+from . import services
+from .backends import MemoryBackend, MinioBackend
+from .blobs import acquire_blob, release_blob
+from .cleanup import expire_upload_sessions
+from .compression import CODECS, DecompressingReader, accepts_encoding, compress, parse_rules
+from .models import ContentBlob, File, Folder, ImageMetadata, StorageUsage, UploadSession
+from .querybudget import query_budget
+from .responses import if_range_passes, parse_range
+from .serializers import ConfirmUploadSerializer
+from .sharing import DownloadCounter, cache_key, download_counter, resolve_shared_link
+from .services import StorageService
+
+S3_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+class FakeS3(PoolManager):
+    """Stands in for the MinIO client's urllib3 pool, answering the multipart API calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self.uploads = {}
+        self.objects = {}
+
+    def urlopen(self, method, url, body=None, headers=None, preload_content=True, **kwargs):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query, keep_blank_values=True)
+        key = parts.path.partition('/bucket/')[2]
+        body = body.read() if hasattr(body, 'read') else (body or b'')
+        self.requests.append((method, key, sorted(query)))
+
+        if 'location' in query:
+            return self.respond(f'<LocationConstraint xmlns="{S3_NS}"></LocationConstraint>')
+        if method == 'POST' and 'uploads' in query:
+            upload_id = f'upload-{len(self.uploads) + 1}'
+            self.uploads[upload_id] = {'content_type': headers.get('Content-Type'), 'parts': {}}
+            return self.respond(
+                f'<InitiateMultipartUploadResult xmlns="{S3_NS}"><Bucket>bucket</Bucket>'
+                f'<Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            )
+        upload = self.uploads.get(query.get('uploadId', [''])[0])
+        if upload is None:
+            return self.respond(
+                '<Error><Code>NoSuchUpload</Code><Message>No such upload</Message></Error>', status=404
+            )
+        if method == 'PUT':
+            number = int(query['partNumber'][0])
+            upload['parts'][number] = body
+            return self.respond('', headers={'ETag': f'"etag-{number}"'})
+        if method == 'POST':
+            root = ElementTree.fromstring(body)
+            numbers = [int(el.text) for el in root.iter() if el.tag.endswith('PartNumber')]
+            etags = [el.text.strip('"') for el in root.iter() if el.tag.endswith('ETag')]
+            assert etags == [f'etag-{number}' for number in numbers], etags
+            self.objects[key] = b''.join(upload['parts'][number] for number in numbers)
+            del self.uploads[query['uploadId'][0]]
+            return self.respond(
+                f'<CompleteMultipartUploadResult xmlns="{S3_NS}"><Bucket>bucket</Bucket><Key>{key}</Key>'
+                f'<ETag>"final"</ETag></CompleteMultipartUploadResult>'
+            )
+        if method == 'DELETE':
+            del self.uploads[query['uploadId'][0]]
+            return self.respond('', status=204)
+        raise AssertionError(f"Unexpected request {method} {url}")
+
+    @staticmethod
+    def respond(body, status=200, headers=None):
+        data = body.encode()
+        return HTTPResponse(
+            body=data, status=status, preload_content=True,
+            headers={'Content-Length': str(len(data)), 'Content-Type': 'application/xml', **(headers or {})},
+        )
+
+@override_settings(
+    AWS_S3_ENDPOINT_URL='http://minio.test:9000',
+    AWS_ACCESS_KEY_ID='test',
+    AWS_SECRET_ACCESS_KEY='test-secret',
+    AWS_STORAGE_BUCKET_NAME='bucket',
+)
+class MinioMultipartUploadTests(SimpleTestCase):
+    """MinioBackend's multipart methods rely on minio-py internals; upgrades must keep this passing."""
+
+    def setUp(self):
+        self.s3 = FakeS3()
+        with mock.patch.object(MinioBackend, '_build_http_client', return_value=self.s3):
+            self.backend = MinioBackend()
+
+    def test_upload_parts_and_complete(self):
+        upload_id = self.backend.create_multipart_upload('files/1/a.bin', 'application/pdf')
+        self.assertEqual(self.s3.uploads[upload_id]['content_type'], 'application/pdf')
+
+        etags = [
+            self.backend.upload_part('files/1/a.bin', upload_id, number, [chunk, chunk])
+            for number, chunk in ((1, b'ab'), (2, b'cd'))
+        ]
+        self.assertEqual(etags, ['etag-1', 'etag-2'])
+
+        self.backend.complete_multipart_upload('files/1/a.bin', upload_id, list(enumerate(etags, 1)))
+        self.assertEqual(self.s3.objects['files/1/a.bin'], b'ababcdcd')
+        self.assertEqual(self.s3.uploads, {})
+
+    def test_abort(self):
+        upload_id = self.backend.create_multipart_upload('files/1/b.bin', 'text/plain')
+        self.backend.upload_part('files/1/b.bin', upload_id, 1, [b'x'])
+
+        self.backend.abort_multipart_upload('files/1/b.bin', upload_id)
+        self.assertEqual(self.s3.uploads, {})
+        self.assertEqual(self.s3.requests[-1][:2], ('DELETE', 'files/1/b.bin'))
+
+    def test_abort_of_unknown_upload_is_ignored(self):
+        self.backend.abort_multipart_upload('files/1/c.bin', 'missing')
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_refused_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+
+class MemoryStorageMixin:
+    """Serve storage from a fresh MemoryBackend for the duration of each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.service = StorageService(MemoryBackend())
+        patcher = mock.patch.object(services, '_default_service', self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+class StorageUsageTests(MemoryStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email='usage@example.com', password='x')
+
+    def stored_file(self, content=b'hello'):
+        key = f'files/blobs/{len(content)}'
+        self.service.backend.put(key, io.BytesIO(content), 'text/plain')
+        blob, _ = ContentBlob.objects.get_or_create(
+            sha256=key, defaults={'storage_key': key, 'size_bytes': len(content)}
+        )
+        ContentBlob.objects.filter(pk=blob.pk).update(ref_count=blob.ref_count + 1)
+        return File.objects.create(
+            user=self.user, original_name='a.txt', storage_key=key, blob=blob,
+            mime_type='text/plain', size_bytes=len(content)
+        )
+
+    def test_release_floors_drifted_counters_at_zero(self):
+        StorageUsage.objects.create(user=self.user, trash_bytes=3, trash_count=0)
+
+        StorageUsage.objects.release(self.user.id, 10, count=2)
+
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual((usage.trash_bytes, usage.trash_count), (0, 0))
+
+    def test_admin_delete_releases_usage_and_storage(self):
+        StorageUsage.objects.charge(self.user.id, 10, count=2)
+        first, second = self.stored_file(), self.stored_file()
+        request = RequestFactory().post('/')
+        admin = site._registry[File]
+
+        admin.delete_model(request, first)
+        self.assertEqual(ContentBlob.objects.get().ref_count, 1)
+
+        admin.delete_queryset(request, File.objects.filter(pk=second.pk))
+        self.assertFalse(ContentBlob.objects.exists())
+        self.assertIsNone(self.service.backend.size(second.storage_key))
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual((usage.used_bytes, usage.file_count), (0, 0))
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class ApiTestCase(MemoryStorageMixin, TestCase):
+    """A user with an authenticated API client, over in-memory storage."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='x')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        # Shared downloads count into the process-wide counter: start each test with an
+        # empty one that won't flush mid-request, and keep it from outliving the test database
+        download_counter.clear()
+        self.addCleanup(download_counter.clear)
+
+    def upload(self, name='photo.png', color=(255, 0, 0)):
+        image = io.BytesIO()
+        Image.new('RGB', (64, 48), color).save(image, 'PNG')
+        image.seek(0)
+        image.name = name
+        response = self.client.post('/api/files/upload/', {'file': image})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+class ConfirmUploadTests(ApiTestCase):
+    def test_a_token_is_confirmed_once(self):
+        key = self.service.generate_storage_key(self.user.id, 'notes.txt')
+        self.service.backend.put(key, io.BytesIO(b'plain text notes'), 'text/plain')
+        token = ConfirmUploadSerializer.make_token(self.user.id, key, 'notes.txt', 'text/plain', 16)
+
+        first = self.client.post('/api/files/confirm-upload/', {'upload_token': token}, format='json')
+        second = self.client.post('/api/files/confirm-upload/', {'upload_token': token}, format='json')
+
+        self.assertEqual(first.status_code, 201, first.content)
+        self.assertEqual(second.json()['code'], 'ALREADY_CONFIRMED')
+        self.assertEqual(File.objects.filter(storage_key=key).count(), 1)
+        self.assertEqual(StorageUsage.objects.get(user=self.user).used_bytes, 16)
+
+class QueryBudgetTests(ApiTestCase):
+    """Query counts of the hot endpoints; a new query per row or per request shows up here."""
+
+    def test_upload(self):
+        self.upload('first.png', (0, 0, 255))
+        # Session user, blob, usage charge, file and metadata inserts, plus the test's savepoints
+        with query_budget(13):
+            self.upload()
+
+    def test_list(self):
+        for n in range(5):
+            self.upload(f'{n}.png', (n, 0, 0))
+        # Session user and one page of files with their metadata, however many rows
+        with query_budget(2):
+            response = self.client.get('/api/files/')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_shared_download(self):
+        file = self.upload()
+        token = self.client.post(f"/api/files/{file['id']}/share/", {'expires_in': '1h'}).json()['token']
+        cache.clear()
+        anonymous = APIClient()
+        # Cold cache: the link with its file; download counts are flushed in batches
+        with query_budget(1):
+            response = anonymous.get(f'/api/shared/{token}/')
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+    def test_zip(self):
+        ids = [self.upload(f'{n}.png', (n, 0, 0))['id'] for n in range(3)]
+        # Session user and the files, whatever their number
+        with query_budget(2):
+            response = self.client.post('/api/files/download-zip/', {'ids': ids}, format='json')
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+
+class RangeTests(SimpleTestCase):
+    def test_parse_range(self):
+        cases = [
+            (None, 100, None),
+            ('bytes=0-9', 100, (0, 9)),
+            ('bytes=90-', 100, (90, 99)),
+            ('bytes=90-500', 100, (90, 99)),
+            ('bytes=-10', 100, (90, 99)),
+            ('bytes=-500', 100, (0, 99)),
+            ('bytes=100-', 100, 'unsatisfiable'),
+            ('bytes=9-3', 100, 'unsatisfiable'),
+            ('bytes=-0', 100, 'unsatisfiable'),
+            ('bytes=-5', 0, 'unsatisfiable'),
+            ('bytes=0-', 0, 'unsatisfiable'),
+            ('bytes=0-1,4-5', 100, None),
+            ('items=0-9', 100, None),
+        ]
+        for header, size, expected in cases:
+            with self.subTest(header=header, size=size):
+                self.assertEqual(parse_range(header, size), expected)
+
+    def test_if_range_passes(self):
+        factory = RequestFactory()
+        self.assertTrue(if_range_passes(factory.get('/'), 'abc', 1000))
+        self.assertTrue(if_range_passes(factory.get('/', headers={'If-Range': '"abc"'}), 'abc', 1000))
+        self.assertFalse(if_range_passes(factory.get('/', headers={'If-Range': '"old"'}), 'abc', 1000))
+        self.assertFalse(if_range_passes(factory.get('/', headers={'If-Range': 'W/"abc"'}), 'abc', 1000))
+        # HTTP dates: a copy from before the last modification must not be patched with a range
+        self.assertTrue(if_range_passes(
+            factory.get('/', headers={'If-Range': 'Thu, 01 Jan 1970 00:16:40 GMT'}), 'abc', 1000
+        ))
+        self.assertFalse(if_range_passes(
+            factory.get('/', headers={'If-Range': 'Thu, 01 Jan 1970 00:16:39 GMT'}), 'abc', 1000
+        ))
+
+class DownloadRangeTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file = self.upload()
+        self.url = f"/api/files/{self.file['id']}/download/"
+        self.content = b''.join(self.client.get(self.url).streaming_content)
+
+    def test_range(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=4-11'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 4-11/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[4:12])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.content)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=4-11', 'If-Range': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+class BlobTests(MemoryStorageMixin, TestCase):
+    CONTENT = b'%PDF-1.4 deduplicated bytes'
+
+    def acquire(self):
+        return acquire_blob(self.service, SimpleUploadedFile('a.pdf', self.CONTENT), 'application/pdf')
+
+    def test_identical_bytes_are_stored_once(self):
+        first, uploaded_first, _ = self.acquire()
+        with mock.patch.object(self.service.backend, 'put', wraps=self.service.backend.put) as put:
+            second, uploaded_second, _ = self.acquire()
+
+        self.assertEqual((uploaded_first, uploaded_second), (True, False))
+        put.assert_not_called()
+        self.assertEqual(first.storage_key, second.storage_key)
+        self.assertEqual(ContentBlob.objects.get().ref_count, 2)
+
+    def test_bytes_go_with_the_last_reference(self):
+        blob, _, _ = self.acquire()
+        self.acquire()
+
+        self.assertFalse(release_blob(self.service, blob.sha256))
+        self.assertEqual(self.service.backend.size(blob.storage_key), len(self.CONTENT))
+        self.assertTrue(release_blob(self.service, blob.sha256))
+        self.assertIsNone(self.service.backend.size(blob.storage_key))
+        self.assertFalse(ContentBlob.objects.exists())
+        self.assertFalse(release_blob(self.service, blob.sha256))
+
+    def test_blob_released_between_check_and_insert_is_stored_again(self):
+        # The existence check still saw the row, which is gone by the time of the insert
+        with mock.patch.object(QuerySet, 'exists', return_value=True):
+            blob, uploaded, _ = self.acquire()
+
+        self.assertTrue(uploaded)
+        self.assertEqual(ContentBlob.objects.get().ref_count, 1)
+        self.assertEqual(self.service.backend.size(blob.storage_key), len(self.CONTENT))
+
+    def test_blob_released_before_the_reference_is_taken_is_recreated(self):
+        original, _, _ = self.acquire()
+        release_blob(self.service, original.sha256)
+
+        # get_or_create returned the row just before the last reference went
+        with mock.patch.object(QuerySet, 'exists', return_value=True), \
+                mock.patch.object(ContentBlob.objects, 'get_or_create', return_value=(original, False)):
+            blob, uploaded, _ = self.acquire()
+
+        self.assertTrue(uploaded)
+        self.assertEqual(ContentBlob.objects.get(sha256=blob.sha256).ref_count, 1)
+        self.assertEqual(self.service.backend.size(blob.storage_key), len(self.CONTENT))
+
+class FolderTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='folders@example.com', password='x')
+        self.a = self.folder('a')
+        self.b = self.folder('b', self.a)
+        self.c = self.folder('c', self.b)
+        self.d = self.folder('d')
+
+    def folder(self, name, parent=None):
+        return Folder.objects.create(user=self.user, name=name, parent=parent)
+
+    def file(self, folder, size=10):
+        StorageUsage.objects.charge(self.user.id, size)
+        return File.objects.create(
+            user=self.user, folder=folder, original_name='a.txt', storage_key=f'files/{uuid4()}',
+            mime_type='text/plain', size_bytes=size
+        )
+
+    def names(self, queryset):
+        return sorted(queryset.values_list('name', flat=True))
+
+    def test_subtree(self):
+        self.assertEqual(self.names(Folder.objects.subtree(self.a)), ['a', 'b', 'c'])
+        self.assertEqual(self.names(Folder.objects.subtree(self.c)), ['c'])
+
+    def test_move_rewrites_the_subtree(self):
+        self.b.move_to(self.d)
+
+        self.assertEqual(self.names(Folder.objects.subtree(self.d)), ['b', 'c', 'd'])
+        self.assertEqual(self.names(Folder.objects.subtree(self.a)), ['a'])
+        c = Folder.objects.get(pk=self.c.pk)
+        self.assertEqual(c.ancestor_ids, [self.d.id, self.b.id])
+        self.assertEqual(c.parent_id, self.b.id)
+        self.assertEqual(Folder.objects.get(pk=self.b.pk).parent_id, self.d.id)
+
+        self.b.move_to(None)
+        self.assertEqual(Folder.objects.get(pk=self.c.pk).depth, 2)
+
+    def test_move_into_own_subtree_is_refused(self):
+        for target in (self.a, self.c):
+            with self.subTest(target=target.name), self.assertRaises(Folder.MoveError):
+                self.a.move_to(target)
+        self.assertEqual(self.names(Folder.objects.subtree(self.a)), ['a', 'b', 'c'])
+
+    def test_move_below_max_depth_is_refused(self):
+        deepest = self.d
+        for level in range(2, Folder.MAX_DEPTH):
+            deepest = self.folder(f'd{level}', deepest)
+        self.assertEqual(deepest.depth, Folder.MAX_DEPTH - 1)
+
+        # b and c would reach MAX_DEPTH + 1; c alone fits exactly
+        with self.assertRaises(Folder.MoveError):
+            self.b.move_to(deepest)
+        self.c.move_to(deepest)
+        self.assertEqual(Folder.objects.get(pk=self.c.pk).depth, Folder.MAX_DEPTH)
+
+    def test_trash_and_restore_are_symmetric(self):
+        top, nested = self.file(self.a), self.file(self.c, size=5)
+        self.file(self.d, size=7)
+        self.d.trash()
+
+        self.assertEqual(self.a.trash(), 2)
+        self.assertFalse(Folder.objects.alive().filter(pk__in=[self.a.pk, self.b.pk, self.c.pk]).exists())
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual((usage.used_bytes, usage.trash_bytes, usage.trash_count), (0, 22, 3))
+
+        self.assertEqual(self.a.restore(), 2)
+        self.assertEqual(self.names(Folder.objects.alive()), ['a', 'b', 'c'])
+        self.assertFalse(File.objects.filter(pk__in=[top.pk, nested.pk], deleted_at__isnull=False).exists())
+        usage = StorageUsage.objects.get(user=self.user)
+        self.assertEqual((usage.used_bytes, usage.file_count, usage.trash_bytes), (15, 2, 7))
+
+    def test_restore_leaves_subfolders_trashed_earlier(self):
+        self.file(self.c)
+        self.c.trash()
+        self.a.trash()
+
+        self.assertEqual(self.a.restore(), 0)
+        self.assertEqual(self.names(Folder.objects.alive()), ['a', 'b', 'd'])
+
+class SharedLinkTests(ApiTestCase):
+    def share(self):
+        file = self.upload()
+        response = self.client.post(f"/api/files/{file['id']}/share/", {'expires_in': '1h'})
+        return file, response.json()['token']
+
+    def test_pending_counts_are_flushed_without_further_downloads(self):
+        counter = DownloadCounter(0.01)
+        flushed = threading.Event()
+        with mock.patch.object(counter, 'flush', side_effect=flushed.set):
+            counter.add('link')
+            self.assertTrue(flushed.wait(5))
+
+    def test_admin_delete_forgets_cached_links(self):
+        file, token = self.share()
+        resolve_shared_link(token)
+        self.assertIsNotNone(cache.get(cache_key(token)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            site._registry[File].delete_model(RequestFactory().post('/'), File.objects.get(pk=file['id']))
+
+        self.assertIsNone(cache.get(cache_key(token)))
+        self.assertEqual(APIClient().get(f'/api/shared/{token}/').status_code, 404)
+
+class FileListingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # Three files share a timestamp, so pages must break ties on id
+        self.files = [
+            self.file(f'{name}.txt', size, now - timedelta(minutes=minutes))
+            for name, size, minutes in [
+                ('a', 30, 0), ('b', 10, 1), ('c', 20, 1), ('d', 10, 1), ('e', 50, 2), ('f', 40, 3), ('g', 10, 4),
+            ]
+        ]
+
+    def file(self, name, size, created_at):
+        file = File.objects.create(
+            user=self.user, original_name=name, storage_key=f'files/{uuid4()}',
+            mime_type='text/plain', size_bytes=size
+        )
+        File.objects.filter(pk=file.pk).update(created_at=created_at)
+        return file
+
+    def walk(self, url):
+        """Follow `next` links to the end; returns the pages of names and the last response."""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append([row['original_name'] for row in response.json()['results']])
+            url = response.json()['next']
+        return pages, response
+
+    def expected(self, key, reverse):
+        ordered = sorted(File.objects.all(), key=lambda file: (key(file), file.id), reverse=reverse)
+        return [file.original_name for file in ordered]
+
+    def test_cursor_pages_cover_every_file_once(self):
+        pages, _ = self.walk('/api/files/?page_size=3')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected(lambda file: file.created_at, reverse=True))
+
+    def test_previous_links_walk_back_to_the_first_page(self):
+        forward, response = self.walk('/api/files/?page_size=3&ordering=size')
+        self.assertEqual(sum(forward, []), self.expected(lambda file: file.size_bytes, reverse=False))
+
+        backward = []
+        url = response.json()['previous']
+        while url:
+            response = self.client.get(url)
+            backward.insert(0, [row['original_name'] for row in response.json()['results']])
+            url = response.json()['previous']
+        self.assertEqual(backward, forward[:-1])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'dj1vbmx5'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(f'/api/files/?cursor={cursor}').status_code, 404)
+
+    def test_page_parameter_keeps_page_number_pagination(self):
+        body = self.client.get('/api/files/?page=1').json()
+        self.assertEqual(body['count'], len(self.files))
+        self.assertEqual(len(body['results']), len(self.files))
+        self.assertEqual(self.client.get('/api/files/?page=2').status_code, 404)
+
+    def test_sparse_fields(self):
+        body = self.client.get('/api/files/?fields=id,original_name').json()
+        self.assertEqual(set(body['results'][0]), {'id', 'original_name'})
+
+class FileFilterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.folder = Folder.objects.create(user=self.user, name='photos')
+        self.file('Annual report 2024.pdf', 'application/pdf', 5000)
+        self.file('meeting notes.txt', 'text/plain', 300)
+        self.file('beach.jpg', 'image/jpeg', 9000, folder=self.folder, image=(4000, 3000, '2024-07-01T10:00:00Z'))
+        self.file('portrait.png', 'image/png', 7000, folder=self.folder, image=(600, 800, None))
+        self.file('icon.png', 'image/png', 100, image=(64, 64, '2020-01-01T00:00:00Z'))
+        other = get_user_model().objects.create_user(email='other@example.com', password='x')
+        File.objects.create(
+            user=other, original_name='beach.jpg', storage_key='files/other', mime_type='image/jpeg', size_bytes=1
+        )
+
+    def file(self, name, mime_type, size, folder=None, image=None):
+        file = File.objects.create(
+            user=self.user, original_name=name, storage_key=f'files/{uuid4()}',
+            mime_type=mime_type, size_bytes=size, folder=folder
+        )
+        if image:
+            width, height, taken_at = image
+            ImageMetadata.objects.create(file=file, width=width, height=height, format='PNG', taken_at=taken_at)
+        return file
+
+    def names(self, query):
+        response = self.client.get(f'/api/files/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['original_name'] for row in response.json()['results']]
+
+    def test_filters(self):
+        cases = {
+            'search=report': ['Annual report 2024.pdf'],
+            'search=notes meeting': ['meeting notes.txt'],
+            'name_prefix=ANN': ['Annual report 2024.pdf'],
+            'mime_type=image/png,text/plain': ['icon.png', 'meeting notes.txt', 'portrait.png'],
+            'category=image': ['beach.jpg', 'icon.png', 'portrait.png'],
+            'size_min=300&size_max=7000': ['Annual report 2024.pdf', 'meeting notes.txt', 'portrait.png'],
+            f'folder={self.folder.id}': ['beach.jpg', 'portrait.png'],
+            'folder=root': ['Annual report 2024.pdf', 'icon.png', 'meeting notes.txt'],
+            'min_width=500&min_height=700': ['beach.jpg', 'portrait.png'],
+            'min_width=700': ['beach.jpg'],
+            'orientation=landscape': ['beach.jpg'],
+            'orientation=square': ['icon.png'],
+            'taken_after=2024-01-01T00:00:00Z': ['beach.jpg'],
+            'taken_before=2024-01-01T00:00:00Z': ['icon.png'],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(sorted(self.names(query)), expected)
+
+    def test_ordering(self):
+        self.assertEqual(self.names('ordering=size')[:2], ['icon.png', 'meeting notes.txt'])
+        self.assertEqual(self.names('ordering=-name')[0], 'portrait.png')
+
+    def test_invalid_parameters(self):
+        for query in ('size_min=10&size_max=5', 'folder=nope', 'ordering=owner', 'category=spreadsheet'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/files/?{query}').status_code, 400)
+
+class CompressionTests(SimpleTestCase):
+    CONTENT = b''.join(b'line %d of a very compressible text file\n' % n for n in range(5000))
+
+    def test_round_trip(self):
+        for codec in CODECS.values():
+            for offset, length in ((0, None), (1000, 5000), (len(self.CONTENT) - 10, 100)):
+                with self.subTest(codec=codec.name, offset=offset, length=length):
+                    compressed, size = compress(io.BytesIO(self.CONTENT), codec)
+                    self.assertLess(size, len(self.CONTENT) // 5)
+                    reader = DecompressingReader(compressed, codec, offset, length)
+                    data = b''.join(iter(lambda: reader.read(4096), b''))
+                    end = None if length is None else offset + length
+                    self.assertEqual(data, self.CONTENT[offset:end])
+
+    def test_accepts_encoding(self):
+        factory = RequestFactory()
+        cases = [
+            ('', False),
+            ('gzip', True),
+            ('deflate, gzip;q=0.5', True),
+            ('GZIP', True),
+            ('gzip;q=0', False),
+            ('*', True),
+            ('br, zstd', False),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                request = factory.get('/', headers={'Accept-Encoding': header})
+                self.assertEqual(accepts_encoding(request, 'gzip'), expected)
+
+    def test_rules(self):
+        self.assertEqual(
+            parse_rules('text/plain:zstd, application/pdf:gzip'), {'text/plain': 'zstd', 'application/pdf': 'gzip'}
+        )
+        for rules in ('text/plain:brotli', 'image/png:gzip'):
+            with self.subTest(rules=rules), self.assertRaises(ValueError):
+                parse_rules(rules)
+
+@override_settings(STORAGE_COMPRESSION='text/plain:gzip', STORAGE_COMPRESSION_MIN_SAVING=0.1)
+class CompressedDownloadTests(ApiTestCase):
+    CONTENT = CompressionTests.CONTENT
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post(
+            '/api/files/upload/', {'file': SimpleUploadedFile('notes.txt', self.CONTENT, 'text/plain')}
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.file = File.objects.get(pk=response.json()['id'])
+        self.url = f'/api/files/{self.file.id}/download/'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_stored_compressed(self):
+        self.assertEqual(self.file.content_encoding, 'gzip')
+        self.assertLess(self.file.stored_size, len(self.CONTENT))
+        self.assertEqual(self.service.backend.size(self.file.storage_key), self.file.stored_size)
+
+    def test_decompressed_for_clients_without_gzip(self):
+        for accept in ('', 'gzip;q=0'):
+            with self.subTest(accept=accept):
+                response = self.client.get(self.url, headers={'Accept-Encoding': accept})
+                self.assertNotIn('Content-Encoding', response)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(self.body(response), self.CONTENT)
+
+    def test_sent_as_stored_to_clients_with_gzip(self):
+        response = self.client.get(self.url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = self.body(response)
+        self.assertEqual(len(body), self.file.stored_size)
+        self.assertEqual(gzip.decompress(body), self.CONTENT)
+
+    def test_range_of_decompressed_content(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=1000-1999'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.CONTENT)}')
+        self.assertEqual(self.body(response), self.CONTENT[1000:2000])
+
+    def test_zip_holds_the_original(self):
+        response = self.client.post('/api/files/download-zip/', {'ids': [str(self.file.id)]}, format='json')
+        with zipfile.ZipFile(io.BytesIO(self.body(response))) as archive:
+            self.assertEqual(archive.read(archive.namelist()[0]), self.CONTENT)
+
+    @override_settings(STORAGE_COMPRESSION_MIN_SAVING=0.99)
+    def test_stored_as_is_when_compression_does_not_pay_off(self):
+        response = self.client.post(
+            '/api/files/upload/', {'file': SimpleUploadedFile('other.txt', self.CONTENT + b'!', 'text/plain')}
+        )
+        file = File.objects.get(pk=response.json()['id'])
+        self.assertEqual((file.content_encoding, file.stored_size), ('', None))
+
+    def test_thumbnail_of_a_compressed_blob(self):
+        image = io.BytesIO()
+        Image.new('RGB', (300, 200), 'blue').save(image, 'PNG')
+        self.service.backend.put('files/1/shared.png', io.BytesIO(gzip.compress(image.getvalue())), 'text/plain')
+
+        metadata = self.service.create_thumbnail('files/1/shared.png', 'image/png', 'gzip')
+        self.assertEqual((metadata['width'], metadata['height']), (300, 200))
+
+@override_settings(CHUNKED_UPLOAD_PART_SIZE=1024)
+class ChunkedUploadTests(ApiTestCase):
+    CONTENT = b''.join(b'chunk %04d of a resumable upload\n' % n for n in range(110))
+
+    def start(self, filename='notes.txt'):
+        response = self.client.post('/api/files/uploads/', {
+            'filename': filename, 'mime_type': 'text/plain', 'size_bytes': len(self.CONTENT)
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return f"/api/files/uploads/{response.json()['id']}/"
+
+    def put_part(self, url, number, data=None):
+        if data is None:
+            data = self.CONTENT[(number - 1) * 1024:number * 1024]
+        return self.client.put(f'{url}parts/{number}/', data, content_type='application/octet-stream')
+
+    def test_resume_and_complete(self):
+        url = self.start()
+        self.assertEqual(self.client.get(url).json()['total_parts'], 4)
+        for number in (1, 3):
+            self.assertEqual(self.put_part(url, number).status_code, 200)
+
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing_parts'], [2, 4])
+
+        # Resuming: the session reports what it has, the client sends the rest
+        self.assertEqual(self.client.get(url).json()['received_parts'], [1, 3])
+        for number in (4, 2):
+            self.assertEqual(self.put_part(url, number).status_code, 200)
+        response = self.client.post(f'{url}complete/')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        file = File.objects.get(pk=response.json()['id'])
+        self.assertEqual(self.service.backend.open(file.storage_key).read(), self.CONTENT)
+        self.assertEqual(StorageUsage.objects.get(user=self.user).used_bytes, len(self.CONTENT))
+        # A completed session is gone; completing it again can't create a second File
+        self.assertEqual(self.client.post(f'{url}complete/').status_code, 404)
+        self.assertEqual(File.objects.count(), 1)
+
+    def test_retried_part_replaces_the_old_one(self):
+        url = self.start()
+        self.put_part(url, 1, b'x' * 1024)
+        for number in range(1, 5):
+            self.put_part(url, number)
+        file_id = self.client.post(f'{url}complete/').json()['id']
+        self.assertEqual(self.service.backend.open(File.objects.get(pk=file_id).storage_key).read(), self.CONTENT)
+
+    def test_part_checks(self):
+        url = self.start()
+        self.assertEqual(self.put_part(url, 5, b'x').json()['code'], 'INVALID_PART_NUMBER')
+        self.assertEqual(self.put_part(url, 2, b'short').json()['code'], 'INVALID_PART_SIZE')
+        self.assertEqual(self.put_part(url, 1, b'\x89PNG\r\n\x1a\n' + bytes(1016)).json()['code'], 'INVALID_FILE_TYPE')
+
+    def test_abort(self):
+        url = self.start()
+        self.put_part(url, 1)
+        session = UploadSession.objects.get()
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(UploadSession.objects.get().status, UploadSession.STATUS_ABORTED)
+        self.assertNotIn(session.upload_id, self.service.backend.uploads)
+        self.assertEqual(self.put_part(url, 2).status_code, 404)
+
+    def test_expired_session(self):
+        url = self.start()
+        UploadSession.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.put_part(url, 1).status_code, 410)
+        self.assertEqual(self.client.post(f'{url}complete/').json()['code'], 'UPLOAD_EXPIRED')
+
+    def test_expired_sessions_are_swept(self):
+        expired, active = self.start(), self.start('other.txt')
+        self.put_part(expired, 1)
+        UploadSession.objects.filter(original_name='notes.txt').update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+        self.assertEqual(expire_upload_sessions(self.service), 1)
+        statuses = dict(UploadSession.objects.values_list('original_name', 'status'))
+        self.assertEqual(statuses, {
+            'notes.txt': UploadSession.STATUS_ABORTED, 'other.txt': UploadSession.STATUS_ACTIVE
+        })
+        self.assertEqual(len(self.service.backend.uploads), 1)
+        self.assertEqual(self.put_part(active, 1).status_code, 200)
+
+    def test_filename_is_sanitised(self):
+        self.start('../../etc/pass\nwd.txt')
+        self.assertEqual(UploadSession.objects.get().original_name, 'passwd.txt')
+        response = self.client.post('/api/files/uploads/', {
+            'filename': '..', 'mime_type': 'text/plain', 'size_bytes': 10
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,146 @@
+# apps/files/uploads.py
+"""Single-pass handling of multipart uploads.
+
+Django's default handlers spool the body, then validation re-reads the
+head for libmagic and deduplication re-reads everything to hash it before
+the storage PUT reads it once more. InspectingUploadHandler does the
+sniffing, sizing and hashing on the chunks as they come off the socket,
+so the spooled copy is read exactly once afterwards: by the PUT, or not at
+all when the content is already stored.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+import magic
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+class InspectedUploadedFile(UploadedFile):
+    """An upload whose SHA-256 and sniffed MIME type were computed while it arrived.
+
+    `size` counts every byte received, including any that were discarded
+    because the upload was already known to be invalid.
+    """
+
+    def __init__(self, file, name, content_type, size, charset, content_type_extra, sha256, sniffed_mime):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+        self.sniffed_mime = sniffed_mime
+
+class InspectingUploadHandler(FileUploadHandler):
+    """Upload handler that spools a file while hashing and sniffing it.
+
+    Small files stay in memory (FILE_UPLOAD_MAX_MEMORY_SIZE), larger ones
+    roll over to a temporary file. Once the upload is over `max_size` or its
+    first bytes are not one of `allowed_types`, the rest is hashed and
+    counted but no longer stored, so validation can still report it.
+    """
+    SNIFF_BYTES = 2048
+
+    def __init__(self, request=None, max_size=None, allowed_types=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.allowed_types = allowed_types
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+            dir=settings.FILE_UPLOAD_TEMP_DIR
+        )
+        self.digest = hashlib.sha256()
+        self.head = b''
+        self.sniffed_mime = None
+        self.received = 0
+        self.discarding = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        self.received += len(raw_data)
+
+        if self.sniffed_mime is None:
+            self.head += raw_data[:self.SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= self.SNIFF_BYTES:
+                self.sniff()
+
+        if self.max_size is not None and self.received > self.max_size:
+            self.discarding = True
+        if not self.discarding:
+            self.file.write(raw_data)
+        # Consumed here; no later handler sees the chunk
+        return None
+
+    def sniff(self):
+        self.sniffed_mime = magic.from_buffer(self.head, mime=True)
+        if self.allowed_types is not None and self.sniffed_mime not in self.allowed_types:
+            self.discarding = True
+
+    def file_complete(self, file_size):
+        if self.sniffed_mime is None:
+            self.sniff()
+        self.file.seek(0)
+        return InspectedUploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=self.received,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+            sha256=self.digest.hexdigest(),
+            sniffed_mime=self.sniffed_mime
+        )
+
+class PositionalReader(io.RawIOBase):
+    """Read-only view of a file descriptor with a position of its own.
+
+    Reads go through os.pread, so the file's shared offset is never moved
+    and another thread can keep reading the same upload.
+    """
+
+    def __init__(self, fd, size):
+        self.fd = fd
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = os.pread(self.fd, len(buffer), self.position)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+def independent_reader(uploaded_file):
+    """A second read handle on an upload, for reading it alongside the storage PUT.
+
+    Spooled uploads still in memory (at most FILE_UPLOAD_MAX_MEMORY_SIZE)
+    are copied; ones on disk are read through PositionalReader. The caller closes it; the upload
+    must stay open until then.
+    """
+    path = getattr(uploaded_file, 'temporary_file_path', None)
+    if path is not None:
+        return open(path(), 'rb')
+    spooled = getattr(uploaded_file, 'file', uploaded_file)
+    # SpooledTemporaryFile keeps its BytesIO or TemporaryFile in _file
+    inner = getattr(spooled, '_file', spooled)
+    if isinstance(inner, io.BytesIO):
+        return io.BytesIO(inner.getvalue())
+    return io.BufferedReader(PositionalReader(inner.fileno(), uploaded_file.size))
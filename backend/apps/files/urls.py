@@ -1,9 +1,13 @@
 # apps/files/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FileViewSet
+from .views import FileViewSet, FolderViewSet, UploadSessionViewSet
 
 router = DefaultRouter()
+# Chunked uploads live at /api/files/uploads/, folders at /api/files/folders/.
+# Registered first so the FileViewSet detail route (/{id}/) does not swallow them.
+router.register('uploads', UploadSessionViewSet, basename='uploads')
+router.register('folders', FolderViewSet, basename='folders')
 # This registers the ViewSet at /api/files/
 # It automatically generates routes for:
 # list (/), retrieve (/{id}), destroy (/{id}), upload (/upload), download (/{id}/download)
@@ -1,55 +1,199 @@
 # backend/apps/files/views.py
-from django.http import StreamingHttpResponse
-from rest_framework import viewsets, status, parsers
+import hmac
+import uuid
+import logging
+from itertools import chain
+
+import magic
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.http import HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import mixins, viewsets, status, parsers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.views import APIView
 
-from .models import File, SharedLink
+from .models import File, Folder, SharedLink, UploadSession, UploadPart, Rendition, StorageUsage, ImageMetadata
 from .serializers import (
     FileSerializer, 
+    FileListQuerySerializer,
+    BulkFileSerializer,
+    BulkShareSerializer,
+    BulkMoveSerializer,
+    FolderSerializer,
+    FolderDetailSerializer,
     FileUploadSerializer, 
     CreateSharedLinkSerializer, 
-    SharedLinkSerializer
+    SharedLinkSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionSerializer,
+    PresignedUploadSerializer,
+    ConfirmUploadSerializer
 )
 from .permissions import IsFileOwner
-from .services import StorageService
+from .pagination import FileCursorPagination
+from .services import get_storage_service
+from .responses import file_response, body_for
+from .archives import zip_stream
+from .tasks import enqueue_thumbnail
+from .blobs import acquire_blob, release_blob
+from .uploads import InspectingUploadHandler
+from .sharing import resolve_shared_link, is_expired, forget_shared_links, download_counter
+from .metrics import count_cache_lookup, count_error, time_stage, render as render_metrics
+from .compression import accepts_encoding
+
+logger = logging.getLogger(__name__)
+
+def create_thumbnail_for(service, file_instance):
+    """Queue the thumbnail, or render it inline when THUMBNAIL_ASYNC is off."""
+    if settings.THUMBNAIL_ASYNC:
+        with transaction.atomic():
+            enqueue_thumbnail(file_instance)
+        return
+    try:
+        metadata = service.create_thumbnail(
+            file_instance.storage_key, file_instance.mime_type, file_instance.content_encoding
+        )
+        ImageMetadata.record(file_instance.id, metadata)
+    except Exception as e:
+        count_error('thumbnail')
+        logger.error(f"Thumbnail creation failed for {file_instance.storage_key}: {e}")
+
+def live_folder_id(user, folder_id):
+    """`folder_id` if that folder is still out of the trash, else None (the top level)."""
+    if folder_id is None:
+        return None
+    return Folder.objects.alive().filter(user=user, pk=folder_id).values_list('pk', flat=True).first()
+
+def quota_exceeded_response():
+    return Response(
+        {'error': 'Storage quota exceeded', 'code': 'QUOTA_EXCEEDED'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+def presigned_redirect(service, storage_key, content_type, disposition, request=None, content_encoding=''):
+    """Send the client straight to storage when direct downloads are enabled.
+
+    Storage sends a compressed object as stored, so it is only an option
+    for clients that accept its `content_encoding`.
+    """
+    if content_encoding and not accepts_encoding(request, content_encoding):
+        return None
+    if service.supports_presigned_urls and getattr(settings, 'PRESIGNED_DOWNLOAD_REDIRECTS', False):
+        return HttpResponseRedirect(
+            service.presigned_download_url(storage_key, content_type, disposition)
+        )
+    return None
 
 class FileViewSet(viewsets.ModelViewSet):
     serializer_class = FileSerializer
     permission_classes = [IsAuthenticated, IsFileOwner]
     parser_classes = (parsers.JSONParser, parsers.MultiPartParser, parsers.FormParser)
+    pagination_class = FileCursorPagination
 
     def get_queryset(self):
-        return File.objects.filter(user=self.request.user, deleted_at__isnull=True)
+        queryset = File.objects.filter(
+            user=self.request.user, deleted_at__isnull=True
+        ).select_related('image_metadata')
+        if self.action == 'list':
+            query = FileListQuerySerializer(data=self.request.query_params)
+            query.is_valid(raise_exception=True)
+            # Read by FileCursorPagination to key pages on the sort field
+            self.ordering = query.get_ordering()
+            queryset = query.filter_queryset(queryset).order_by(self.ordering, 'id')
+        return queryset
 
     @action(detail=False, methods=['POST'], url_path='upload')
     def upload_file(self, request):
-        serializer = FileUploadSerializer(data=request.data)
-        if serializer.is_valid():
+        # Sniff, size and hash the file while it is received, before request.data is parsed
+        request.upload_handlers = [InspectingUploadHandler(
+            request,
+            max_size=FileUploadSerializer.MAX_SIZE,
+            allowed_types=FileUploadSerializer.ALLOWED_MIME_TYPES
+        )]
+        with time_stage('receive'):
+            data = request.data
+        serializer = FileUploadSerializer(data=data, context={'request': request})
+        with time_stage('validate'):
+            valid = serializer.is_valid()
+        if valid:
             uploaded_file = serializer.validated_data['file']
             
-            service = StorageService()
-            key = service.generate_storage_key(request.user.id, uploaded_file.name)
-            
+            service = get_storage_service()
             try:
-                service.upload_with_thumbnail(uploaded_file, key, uploaded_file.content_type)
-                
-                file_instance = File.objects.create(
-                    user=request.user,
-                    original_name=uploaded_file.name,
-                    storage_key=key,
-                    mime_type=uploaded_file.content_type,
-                    size_bytes=uploaded_file.size
+                # Inline thumbnails are rendered while the original is stored
+                blob, uploaded, metadata = acquire_blob(
+                    service, uploaded_file, uploaded_file.content_type,
+                    thumbnail=not settings.THUMBNAIL_ASYNC
                 )
-                
+                try:
+                    # A duplicate reuses the thumbnail (and metadata) already made for its blob
+                    twin = None if uploaded else File.objects.filter(
+                        blob=blob, thumbnail_status=File.THUMBNAIL_READY
+                    ).select_related('image_metadata').first()
+                    thumbnail_status = File.THUMBNAIL_NONE
+                    if twin is not None:
+                        thumbnail_status = File.THUMBNAIL_READY
+                        twin_metadata = getattr(twin, 'image_metadata', None)
+                        if twin_metadata is not None:
+                            metadata = {field: getattr(twin_metadata, field) for field in ImageMetadata.FIELDS}
+                    elif settings.THUMBNAIL_ASYNC:
+                        if service.is_image(uploaded_file.content_type):
+                            thumbnail_status = File.THUMBNAIL_PENDING
+                    else:
+                        if not uploaded:
+                            metadata = service.store_thumbnail(
+                                uploaded_file, blob.storage_key, uploaded_file.content_type
+                            )
+                        if metadata:
+                            thumbnail_status = File.THUMBNAIL_READY
+                        elif service.is_image(uploaded_file.content_type):
+                            # Tells preview a broken image apart from a non-image
+                            thumbnail_status = File.THUMBNAIL_FAILED
+
+                    with transaction.atomic():
+                        StorageUsage.objects.charge(request.user.id, uploaded_file.size)
+                        with time_stage('db_insert'):
+                            file_instance = File.objects.create(
+                                user=request.user,
+                                original_name=uploaded_file.name,
+                                storage_key=blob.storage_key,
+                                blob=blob,
+                                folder=serializer.validated_data['folder'],
+                                mime_type=uploaded_file.content_type,
+                                size_bytes=uploaded_file.size,
+                                content_hash=blob.sha256,
+                                content_encoding=blob.content_encoding,
+                                stored_size=blob.stored_size,
+                                thumbnail_status=thumbnail_status
+                            )
+                            if thumbnail_status == File.THUMBNAIL_PENDING:
+                                enqueue_thumbnail(file_instance)
+                            # Cached on the instance either way, so the response needs no lookup
+                            if metadata:
+                                file_instance.image_metadata = ImageMetadata.objects.create(
+                                    file=file_instance, **metadata
+                                )
+                            else:
+                                File.image_metadata.related.set_cached_value(file_instance, None)
+                except Exception:
+                    # No File holds the reference; the bytes go if nothing else does either
+                    release_blob(service, blob.sha256)
+                    raise
+
                 return Response(
                     FileSerializer(file_instance).data, 
                     status=status.HTTP_201_CREATED
                 )
+            except StorageUsage.QuotaExceeded:
+                # Lost a race with another upload; the precheck passed
+                return quota_exceeded_response()
             except Exception as e:
+                count_error('upload')
                 return Response(
                     {"error": "Upload failed", "details": str(e)}, 
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -57,22 +201,139 @@ class FileViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['POST'], url_path='presign-upload')
+    def presign_upload(self, request):
+        """Issue a short-lived URL so the browser can PUT the file straight to storage."""
+        service = get_storage_service()
+        if not service.supports_presigned_urls:
+            return Response(
+                {'error': 'Direct uploads require the MinIO backend', 'code': 'PRESIGN_UNAVAILABLE'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = PresignedUploadSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        key = service.generate_storage_key(request.user.id, data['filename'])
+        return Response({
+            'upload_url': service.presigned_upload_url(key),
+            'upload_token': ConfirmUploadSerializer.make_token(
+                request.user.id, key, data['filename'], data['mime_type'], data['size_bytes'], data['folder']
+            ),
+            'expires_in': settings.PRESIGNED_URL_EXPIRY_SECONDS,
+        })
+
+    @action(detail=False, methods=['POST'], url_path='confirm-upload')
+    def confirm_upload(self, request):
+        """Create the File row once the presigned upload has landed in storage."""
+        serializer = ConfirmUploadSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['upload_token']
+
+        if File.objects.filter(storage_key=upload['key']).exists():
+            return Response(
+                {'error': 'Upload already confirmed', 'code': 'ALREADY_CONFIRMED'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        service = get_storage_service()
+        size = service.stat(upload['key'])
+        if size is None:
+            return Response(
+                {'error': 'Uploaded object not found in storage', 'code': 'UPLOAD_NOT_FOUND'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if size != upload['size']:
+            service.delete(upload['key'])
+            return Response(
+                {'error': f"Uploaded size {size} does not match declared size {upload['size']}", 'code': 'SIZE_MISMATCH'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        mime = magic.from_buffer(service.read_head(upload['key']), mime=True)
+        if mime not in FileUploadSerializer.ALLOWED_MIME_TYPES:
+            service.delete(upload['key'])
+            return Response(
+                {'error': f'File content does not match allowed types. Detected: {mime}', 'code': 'INVALID_FILE_TYPE'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with transaction.atomic():
+                # Presigned objects have no blob, so nothing else stops two confirms from both creating a File
+                StorageUsage.objects.lock(request.user.id)
+                if File.objects.filter(storage_key=upload['key']).exists():
+                    return Response(
+                        {'error': 'Upload already confirmed', 'code': 'ALREADY_CONFIRMED'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                StorageUsage.objects.charge(request.user.id, size)
+                with time_stage('db_insert'):
+                    file_instance = File.objects.create(
+                        user=request.user,
+                        original_name=upload['name'],
+                        storage_key=upload['key'],
+                        folder_id=live_folder_id(request.user, upload.get('folder')),
+                        mime_type=upload['mime'],
+                        size_bytes=size
+                    )
+        except StorageUsage.QuotaExceeded:
+            service.delete(upload['key'])
+            return quota_exceeded_response()
+        create_thumbnail_for(service, file_instance)
+
+        return Response(FileSerializer(file_instance).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['GET'], url_path='download-url')
+    def download_url(self, request, pk=None):
+        """Return a short-lived direct download URL instead of the bytes."""
+        file_obj = self.get_object()
+        service = get_storage_service()
+        if not service.supports_presigned_urls:
+            return Response(
+                {'error': 'Direct downloads require the MinIO backend', 'code': 'PRESIGN_UNAVAILABLE'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'url': service.presigned_download_url(
+                file_obj.storage_key,
+                file_obj.mime_type,
+                f'attachment; filename="{file_obj.original_name}"'
+            ),
+            'expires_in': settings.PRESIGNED_URL_EXPIRY_SECONDS,
+        })
+
     @action(detail=True, methods=['GET'])
     def download(self, request, pk=None):
         file_obj = self.get_object() # Handles permissions checks
 
-        service = StorageService()
+        service = get_storage_service()
+        redirect = presigned_redirect(
+            service, file_obj.storage_key, file_obj.mime_type,
+            f'attachment; filename="{file_obj.original_name}"',
+            request, file_obj.content_encoding
+        )
+        if redirect:
+            return redirect
+
         try:
-            response = StreamingHttpResponse(
-                service.download_stream(file_obj.storage_key),
-                content_type=file_obj.mime_type
+            return file_response(
+                request, service, file_obj.storage_key,
+                content_type=file_obj.mime_type,
+                size=file_obj.size_bytes,
+                etag=file_obj.etag,
+                last_modified=int(file_obj.created_at.timestamp()),
+                disposition=f'attachment; filename="{file_obj.original_name}"',
+                content_encoding=file_obj.content_encoding,
+                stored_size=file_obj.stored_size
             )
-            response['Content-Disposition'] = f'attachment; filename="{file_obj.original_name}"'
-            response['Content-Length'] = file_obj.size_bytes
-            return response
         except FileNotFoundError:
             raise NotFound(detail="File content not found in storage.")
         except Exception as e:
+            count_error('download')
             return Response(
                 {"error": "Download failed", "details": str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -97,14 +358,106 @@ class FileViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         """Soft delete instead of hard delete."""
         file_obj = self.get_object()
-        file_obj.soft_delete()
+        with transaction.atomic():
+            file_obj.soft_delete()
+            forget_shared_links([file_obj.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def owned_files(self, ids):
+        """The caller's files among `ids`, deleted or not. Unknown ids are ignored."""
+        return File.objects.filter(user=self.request.user, id__in=ids)
+
+    def lock_files(self, ids, deleted):
+        """Lock the caller's files among `ids` in the given state. Returns (ids, total size)."""
+        rows = list(
+            self.owned_files(ids).filter(deleted_at__isnull=not deleted)
+            .select_for_update().values_list('id', 'size_bytes')
+        )
+        return [pk for pk, _ in rows], sum(size for _, size in rows)
+
+    @action(detail=False, methods=['POST'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Soft delete many files with a single UPDATE."""
+        serializer = BulkFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            ids, size = self.lock_files(serializer.validated_data['ids'], deleted=False)
+            File.objects.filter(id__in=ids).update(deleted_at=timezone.now())
+            if ids:
+                StorageUsage.objects.trash(request.user.id, size, len(ids))
+                forget_shared_links(ids)
+        return Response({'deleted': len(ids)})
+
+    @action(detail=False, methods=['POST'], url_path='bulk-restore')
+    def bulk_restore(self, request):
+        """Undo soft deletes with a single UPDATE, if they all fit the quota."""
+        serializer = BulkFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            with transaction.atomic():
+                ids, size = self.lock_files(serializer.validated_data['ids'], deleted=True)
+                File.objects.filter(id__in=ids).update(deleted_at=None)
+                if ids:
+                    StorageUsage.objects.restore(request.user.id, size, len(ids))
+                    File.leave_trashed_folders(ids)
+                    forget_shared_links(ids)
+        except StorageUsage.QuotaExceeded:
+            return quota_exceeded_response()
+        return Response({'restored': len(ids)})
+
+    @action(detail=False, methods=['POST'], url_path='bulk-move')
+    def bulk_move(self, request):
+        """Move many files into a folder (or to the top level) with a single UPDATE."""
+        serializer = BulkMoveSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        moved = self.owned_files(serializer.validated_data['ids']).filter(deleted_at__isnull=True).update(
+            folder=serializer.validated_data['folder'], updated_at=timezone.now()
+        )
+        return Response({'moved': moved})
+
+    @action(detail=False, methods=['POST'], url_path='bulk-share')
+    def bulk_share(self, request):
+        """Create one share link per file, all in one INSERT."""
+        serializer = BulkShareSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        expires_at = serializer.get_expiration_datetime()
+        files = self.owned_files(serializer.validated_data['ids']).filter(deleted_at__isnull=True)
+        links = SharedLink.objects.bulk_create(
+            SharedLink(file=file, expires_at=expires_at) for file in files
+        )
+
+        response_serializer = SharedLinkSerializer(links, many=True, context={'request': request})
+        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['POST'], url_path='download-zip')
+    def download_zip(self, request):
+        """Stream the selected files as one ZIP, reading each object chunk by chunk."""
+        serializer = BulkFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+
+        files = {
+            file.id: file
+            for file in self.owned_files(ids).filter(deleted_at__isnull=True)
+        }
+        if not files:
+            raise NotFound(detail="None of the requested files exist.")
+
+        service = get_storage_service()
+        archive = zip_stream(service, [files[pk] for pk in ids if pk in files])
+        response = StreamingHttpResponse(body_for(request, archive), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="files-{timezone.now():%Y%m%d-%H%M%S}.zip"'
+        return response
+
     @action(detail=True, methods=['GET'])
     def preview(self, request, pk=None):
         """Serve the 200x200 thumbnail."""
         file_obj = self.get_object()
-        service = StorageService()
+        service = get_storage_service()
 
         if not service.is_image(file_obj.mime_type):
             return Response(
@@ -112,75 +465,485 @@ class FileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        if file_obj.thumbnail_status == File.THUMBNAIL_PENDING:
+            response = Response(
+                {'status': 'pending', 'code': 'THUMBNAIL_PENDING'},
+                status=status.HTTP_202_ACCEPTED
+            )
+            response['Retry-After'] = '2'
+            return response
+
         thumb_key = service.get_thumbnail_key(file_obj.storage_key)
         
-        # If thumbnail exists, serve it. If not (old file?), serve original.
-        key_to_serve = thumb_key if service.thumbnail_exists(file_obj.storage_key) else file_obj.storage_key
+        if file_obj.thumbnail_status == File.THUMBNAIL_READY:
+            key_to_serve = thumb_key
+        elif file_obj.thumbnail_status == File.THUMBNAIL_FAILED:
+            key_to_serve = file_obj.storage_key
+        else:
+            # If thumbnail exists, serve it. If not (old file?), serve original.
+            key_to_serve = thumb_key if service.thumbnail_exists(file_obj.storage_key) else file_obj.storage_key
+
+        redirect = presigned_redirect(service, key_to_serve, file_obj.mime_type, 'inline')
+        if redirect:
+            return redirect
         
         try:
-            response = StreamingHttpResponse(
-                service.download_stream(key_to_serve),
-                content_type=file_obj.mime_type
+            return file_response(
+                request, service, key_to_serve,
+                content_type=file_obj.mime_type,
+                etag=f'{file_obj.etag}-thumb' if key_to_serve == thumb_key else file_obj.etag,
+                last_modified=int(file_obj.created_at.timestamp()),
+                # Cache thumbnails in browser for 1 hour to reduce server load
+                cache_control='private, max-age=3600'
             )
-            # Cache thumbnails in browser for 1 hour to reduce server load
-            response['Cache-Control'] = 'private, max-age=3600'
-            return response
         except FileNotFoundError:
              raise NotFound(detail="Preview not found")
 
+    @action(detail=True, methods=['GET'], url_path=r'rendition/(?P<name>[a-z]+)')
+    def rendition(self, request, pk=None, name=None):
+        """Serve a resized WebP copy, generating and recording it on first request."""
+        file_obj = self.get_object()
+        service = get_storage_service()
+
+        if not service.is_image(file_obj.mime_type):
+            return Response(
+                {'error': 'Renditions only available for images'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if name not in service.RENDITION_SIZES:
+            return Response(
+                {'error': 'Unknown rendition', 'code': 'UNKNOWN_RENDITION', 'available': list(service.RENDITION_SIZES)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # The table is the source of truth, so a hit costs no storage round-trip
+        rendition = Rendition.objects.filter(file=file_obj, name=name).first()
+        if rendition is None:
+            # A deduplicated twin may already have rendered the same bytes
+            shared = Rendition.objects.filter(
+                storage_key=service.get_rendition_key(file_obj.storage_key, name)
+            ).first()
+            if shared is not None:
+                rendition, _ = Rendition.objects.get_or_create(
+                    file=file_obj,
+                    name=name,
+                    defaults={
+                        'storage_key': shared.storage_key, 'width': shared.width,
+                        'height': shared.height, 'size_bytes': shared.size_bytes
+                    }
+                )
+        count_cache_lookup('rendition', rendition is not None)
+        if rendition is None:
+            try:
+                key, width, height, size = service.create_rendition(
+                    file_obj.storage_key, name, file_obj.content_encoding
+                )
+            except FileNotFoundError:
+                raise NotFound(detail="File content not found")
+            except Exception as e:
+                count_error('rendition')
+                return Response(
+                    {"error": "Rendition failed", "details": str(e)},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            # get_or_create absorbs the race with a concurrent request for the same rendition
+            rendition, _ = Rendition.objects.get_or_create(
+                file=file_obj,
+                name=name,
+                defaults={'storage_key': key, 'width': width, 'height': height, 'size_bytes': size}
+            )
+
+        redirect = presigned_redirect(service, rendition.storage_key, 'image/webp', 'inline')
+        if redirect:
+            return redirect
+
+        try:
+            return file_response(
+                request, service, rendition.storage_key,
+                content_type='image/webp',
+                size=rendition.size_bytes,
+                etag=f'{file_obj.etag}-{name}',
+                last_modified=int(rendition.created_at.timestamp()),
+                # Renditions never change for a given file
+                cache_control='private, max-age=86400'
+            )
+        except FileNotFoundError:
+            raise NotFound(detail="Rendition not found")
+
     @action(detail=True, methods=['GET'])
     def view(self, request, pk=None):
         """Serve the FULL SIZE image inline (for browser viewing)."""
         file_obj = self.get_object()
-        service = StorageService()
+        service = get_storage_service()
+
+        redirect = presigned_redirect(
+            service, file_obj.storage_key, file_obj.mime_type,
+            f'inline; filename="{file_obj.original_name}"',
+            request, file_obj.content_encoding
+        )
+        if redirect:
+            return redirect
 
         try:
-            response = StreamingHttpResponse(
-                service.download_stream(file_obj.storage_key),
-                content_type=file_obj.mime_type
+            return file_response(
+                request, service, file_obj.storage_key,
+                content_type=file_obj.mime_type,
+                size=file_obj.size_bytes,
+                etag=file_obj.etag,
+                last_modified=int(file_obj.created_at.timestamp()),
+                # 'inline' tells browser to display it, not download it
+                disposition=f'inline; filename="{file_obj.original_name}"',
+                content_encoding=file_obj.content_encoding,
+                stored_size=file_obj.stored_size
             )
-            # 'inline' tells browser to display it, not download it
-            response['Content-Disposition'] = f'inline; filename="{file_obj.original_name}"'
-            return response
         except FileNotFoundError:
             raise NotFound(detail="File content not found")
 
 
+class FolderViewSet(viewsets.ModelViewSet):
+    """Folders of the current user. `?parent=<id>` lists a folder's subfolders, the top level by default.
+
+    Every subtree operation (stats, move, delete, restore) is a fixed number
+    of queries on the path index, however deep or large the subtree is.
+    """
+    serializer_class = FolderSerializer
+    permission_classes = [IsAuthenticated, IsFileOwner]
+    # A folder's subfolders come back in one response, sorted by name
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = Folder.objects.filter(user=self.request.user)
+        if self.action == 'restore':
+            return queryset.filter(deleted_at__isnull=False)
+        queryset = queryset.alive()
+        if self.action == 'list':
+            queryset = queryset.filter(parent=self.request.query_params.get('parent') or None)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return FolderDetailSerializer
+        return FolderSerializer
+
+    def list(self, request, *args, **kwargs):
+        parent = request.query_params.get('parent')
+        if parent:
+            try:
+                uuid.UUID(parent)
+            except ValueError:
+                return Response(
+                    {'error': 'parent must be a folder id', 'code': 'INVALID_FOLDER'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        parent = serializer.validated_data.get('parent')
+        if parent is not None and parent.depth >= Folder.MAX_DEPTH:
+            raise ValidationError(
+                {'parent': f"Folders can't be nested more than {Folder.MAX_DEPTH} levels deep."}
+            )
+        serializer.save(user=self.request.user)
+
+    def update(self, request, *args, **kwargs):
+        """Rename and/or move; a move rewrites the whole subtree's paths in one UPDATE."""
+        partial = kwargs.pop('partial', False)
+        folder = self.get_object()
+        serializer = self.get_serializer(folder, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if 'parent' in data and data['parent'] != folder.parent:
+            try:
+                folder.move_to(data['parent'])
+            except Folder.MoveError as e:
+                return Response({'error': str(e), 'code': 'INVALID_MOVE'}, status=status.HTTP_400_BAD_REQUEST)
+        if 'name' in data and data['name'] != folder.name:
+            folder.name = data['name']
+            folder.save(update_fields=['name', 'updated_at'])
+        return Response(FolderSerializer(folder, context=self.get_serializer_context()).data)
+
+    def destroy(self, request, *args, **kwargs):
+        """Move the folder, its subfolders and their files to the trash."""
+        folder = self.get_object()
+        with transaction.atomic():
+            folder.trash()
+            forget_shared_links(folder.subtree_files().filter(deleted_at=folder.deleted_at).values('pk'))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['POST'])
+    def restore(self, request, pk=None):
+        """Bring back a deleted folder with everything that was deleted along with it."""
+        folder = self.get_object()
+        if folder.parent_id is not None and not Folder.objects.alive().filter(pk=folder.parent_id).exists():
+            return Response(
+                {'error': 'Restore the parent folder first', 'code': 'PARENT_DELETED'},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            with transaction.atomic():
+                forget_shared_links(folder.subtree_files().filter(deleted_at=folder.deleted_at).values('pk'))
+                restored = folder.restore()
+        except StorageUsage.QuotaExceeded:
+            return quota_exceeded_response()
+        return Response({'restored': restored})
+
+    @action(detail=True, methods=['GET'])
+    def stats(self, request, pk=None):
+        """Subfolder count, file count and total size of the whole subtree."""
+        folder = self.get_object()
+        totals = folder.subtree_files().filter(deleted_at__isnull=True).aggregate(
+            files=Count('pk'), size_bytes=Sum('size_bytes')
+        )
+        return Response({
+            'folders': Folder.objects.subtree(folder).alive().count() - 1,
+            'files': totals['files'],
+            'size_bytes': totals['size_bytes'] or 0,
+        })
+
+
+class UploadSessionViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Resumable chunked uploads: init, PUT part N, complete, abort."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, IsFileOwner]
+    READ_CHUNK_SIZE = 64 * 1024
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(
+            user=self.request.user, status=UploadSession.STATUS_ACTIVE
+        ).prefetch_related('parts')
+
+    def expired_response(self):
+        return Response(
+            {'error': 'Upload session has expired', 'code': 'UPLOAD_EXPIRED'},
+            status=status.HTTP_410_GONE
+        )
+
+    def create(self, request):
+        serializer = UploadSessionCreateSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        service = get_storage_service()
+        key = service.generate_storage_key(request.user.id, data['filename'])
+        upload_id = service.create_multipart_upload(key, data['mime_type'])
+
+        session = UploadSession.objects.create(
+            user=request.user,
+            original_name=data['filename'],
+            mime_type=data['mime_type'],
+            size_bytes=data['size_bytes'],
+            folder=data['folder'],
+            part_size=settings.CHUNKED_UPLOAD_PART_SIZE,
+            storage_key=key,
+            upload_id=upload_id
+        )
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['PUT'], url_path=r'parts/(?P<part_number>\d+)')
+    def upload_part(self, request, pk=None, part_number=None):
+        """Receive the raw bytes of one part. Retrying a part overwrites it."""
+        session = self.get_object()
+        if session.is_expired:
+            return self.expired_response()
+
+        part_number = int(part_number)
+        if not 1 <= part_number <= session.total_parts:
+            return Response(
+                {'error': f'Part number must be between 1 and {session.total_parts}', 'code': 'INVALID_PART_NUMBER'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        expected_size = session.expected_part_size(part_number)
+        if int(request.META.get('CONTENT_LENGTH') or 0) != expected_size:
+            return Response(
+                {'error': f'Part {part_number} must be exactly {expected_size} bytes', 'code': 'INVALID_PART_SIZE'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Read the body straight from the socket so only one chunk is held at a time
+        chunks = iter(lambda: request.read(self.READ_CHUNK_SIZE), b'')
+        if part_number == 1:
+            head = request.read(2048)
+            mime = magic.from_buffer(head, mime=True)
+            if mime not in FileUploadSerializer.ALLOWED_MIME_TYPES:
+                return Response(
+                    {'error': f'File content does not match allowed types. Detected: {mime}', 'code': 'INVALID_FILE_TYPE'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            chunks = chain([head], chunks)
+
+        received = 0
+        def counted(source):
+            nonlocal received
+            for chunk in source:
+                received += len(chunk)
+                yield chunk
+
+        service = get_storage_service()
+        etag = service.upload_part(session.storage_key, session.upload_id, part_number, counted(chunks))
+
+        if received != expected_size:
+            return Response(
+                {'error': f'Part {part_number} was truncated', 'code': 'INVALID_PART_SIZE'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        UploadPart.objects.update_or_create(
+            session=session,
+            part_number=part_number,
+            defaults={'etag': etag, 'size_bytes': received}
+        )
+        return Response({'part_number': part_number, 'etag': etag, 'size_bytes': received})
+
+    @action(detail=True, methods=['POST'])
+    def complete(self, request, pk=None):
+        """Assemble the parts and create the File."""
+        session = self.get_object()
+        if session.is_expired:
+            return self.expired_response()
+
+        parts = [(part.part_number, part.etag) for part in session.parts.all()]
+        missing = sorted(set(range(1, session.total_parts + 1)) - {number for number, _ in parts})
+        if missing:
+            return Response(
+                {'error': 'Upload is incomplete', 'code': 'UPLOAD_INCOMPLETE', 'missing_parts': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        service = get_storage_service()
+        try:
+            with transaction.atomic():
+                # Locked until the File exists, so concurrent completes can't both create one
+                session = UploadSession.objects.select_for_update().filter(
+                    pk=session.pk, status=UploadSession.STATUS_ACTIVE
+                ).first()
+                if session is None:
+                    return Response(
+                        {'error': 'Upload session is no longer active', 'code': 'UPLOAD_NOT_ACTIVE'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                service.complete_multipart_upload(session.storage_key, session.upload_id, parts)
+                StorageUsage.objects.charge(request.user.id, session.size_bytes)
+                with time_stage('db_insert'):
+                    file_instance = File.objects.create(
+                        user=request.user,
+                        original_name=session.original_name,
+                        storage_key=session.storage_key,
+                        folder_id=live_folder_id(request.user, session.folder_id),
+                        mime_type=session.mime_type,
+                        size_bytes=session.size_bytes
+                    )
+                session.status = UploadSession.STATUS_COMPLETED
+                session.save(update_fields=['status'])
+        except StorageUsage.QuotaExceeded:
+            service.delete(session.storage_key)
+            UploadSession.objects.filter(pk=session.pk, status=UploadSession.STATUS_ACTIVE).update(
+                status=UploadSession.STATUS_ABORTED
+            )
+            return quota_exceeded_response()
+        except Exception as e:
+            count_error('upload')
+            return Response(
+                {"error": "Upload failed", "details": str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        create_thumbnail_for(service, file_instance)
+
+        return Response(FileSerializer(file_instance).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        """Abort the upload and discard the stored parts."""
+        session = self.get_object()
+        get_storage_service().abort_multipart_upload(session.storage_key, session.upload_id)
+        session.status = UploadSession.STATUS_ABORTED
+        session.save(update_fields=['status'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class StorageStatsView(APIView):
+    """Connection pool statistics of the worker that serves the request (staff only)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_storage_service().pool_stats())
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, aggregated over every gunicorn worker.
+
+    Scrapers must send METRICS_TOKEN as a bearer token. Without a token
+    the endpoint is only open with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    body, content_type = render_metrics()
+    return HttpResponse(body, content_type=content_type)
+
+
 class SharedDownloadView(APIView):
     """Public endpoint - NO authentication required."""
     permission_classes = [AllowAny]
     authentication_classes = [] 
 
     def get(self, request, token):
-        try:
-            shared_link = SharedLink.objects.select_related('file').get(token=token)
-        except SharedLink.DoesNotExist:
+        # Cached snapshot of the link and its file; no query on a hit
+        shared_link = resolve_shared_link(token)
+        if shared_link is None:
             return Response(
                 {'error': 'Link not found', 'code': 'LINK_NOT_FOUND'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        if shared_link.is_expired:
+        if is_expired(shared_link):
             return Response(
                 {'error': 'This link has expired', 'code': 'LINK_EXPIRED'},
                 status=status.HTTP_410_GONE
             )
 
-        if shared_link.file.deleted_at is not None:
+        if shared_link['file_deleted']:
              return Response(
                 {'error': 'File no longer exists', 'code': 'FILE_DELETED'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        shared_link.increment_download_count()
+        service = get_storage_service()
+        disposition = f'attachment; filename="{shared_link["original_name"]}"'
 
-        file = shared_link.file
-        service = StorageService()
-        
-        response = StreamingHttpResponse(
-            service.download_stream(file.storage_key),
-            content_type=file.mime_type
+        # Snapshots cached before compression existed lack the encoding fields
+        content_encoding = shared_link.get('content_encoding', '')
+        redirect = presigned_redirect(
+            service, shared_link['storage_key'], shared_link['mime_type'], disposition,
+            request, content_encoding
         )
-        response['Content-Length'] = file.size_bytes
-        response['Content-Disposition'] = f'attachment; filename="{file.original_name}"'
+        if redirect:
+            download_counter.add(shared_link['id'])
+            return redirect
+
+        try:
+            response = file_response(
+                request, service, shared_link['storage_key'],
+                content_type=shared_link['mime_type'],
+                size=shared_link['size_bytes'],
+                etag=shared_link['etag'],
+                last_modified=shared_link['created_at'],
+                disposition=disposition,
+                content_encoding=content_encoding,
+                stored_size=shared_link.get('stored_size')
+            )
+        except FileNotFoundError:
+            # Purged since the snapshot was cached
+            return Response(
+                {'error': 'File no longer exists', 'code': 'FILE_DELETED'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        # Count downloads, not revalidations or resumed transfers; written in batches
+        if response.status_code == 200 or response.get('Content-Range', '').startswith('bytes 0-'):
+            download_counter.add(shared_link['id'])
         return response
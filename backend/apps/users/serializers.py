@@ -3,16 +3,30 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
+from apps.files.models import StorageUsage
 
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User retrieval (read-only)."""
+    storage = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ('id', 'email', 'date_joined')
+        fields = ('id', 'email', 'date_joined', 'storage')
         read_only_fields = ('id', 'date_joined')
 
+    def get_storage(self, obj):
+        # New users have no usage row until their first upload
+        usage = StorageUsage.objects.filter(user_id=obj.id).first() or StorageUsage(user_id=obj.id)
+        return {
+            'used_bytes': usage.used_bytes,
+            'file_count': usage.file_count,
+            'trash_bytes': usage.trash_bytes,
+            'trash_count': usage.trash_count,
+            'quota_bytes': usage.effective_quota,
+        }
+
 class RegisterSerializer(serializers.ModelSerializer):
     """Serializer for User registration."""
     email = serializers.EmailField(
@@ -0,0 +1,434 @@
+# benchmarks/api.py
+"""End-to-end benchmarks of the file API, comparable between commits.
+
+Requests go through the whole Django stack (routing, JWT authentication,
+DRF, the upload handler) via the test client, against SQLite and the local
+or memory storage backend, so a run needs no services. Every case reports
+per-request latency percentiles, throughput and the number of queries one
+request makes. Run from backend/:
+
+    python -m benchmarks.api
+    python -m benchmarks.api --backend memory --only upload,download
+    python -m benchmarks.api --json > before.json
+    python -m benchmarks.api --compare before.json   # exits 1 on a regression
+
+Compare runs from the same machine: the absolute numbers mean little
+elsewhere, the deltas and query counts are what catch regressions.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from io import BytesIO
+
+BENCHMARKS = ('upload', 'list', 'download', 'shared', 'thumbnail')
+
+# (type, bytes, iterations)
+UPLOADS = [
+    ('text', 4 * 1024, 100),
+    ('text', 1024 * 1024, 20),
+    ('text', 8 * 1024 * 1024, 5),
+    ('pdf', 1024 * 1024, 20),
+    ('png', 1024 * 1024, 10),
+]
+# (type, bytes, iterations), each downloaded as-is and, when compressed at rest, as gzip
+DOWNLOADS = [
+    ('pdf', 64 * 1024, 200),
+    ('pdf', 1024 * 1024, 50),
+    ('pdf', 8 * 1024 * 1024, 10),
+    ('text', 1024 * 1024, 50),
+]
+# Files in the account whose listing is measured
+LIST_SIZES = (1_000, 10_000, 100_000)
+LIST_ITERATIONS = 30
+SHARED_ITERATIONS = 500
+# (label, format, megapixels, iterations)
+THUMBNAILS = [
+    ('jpeg-2mp', 'JPEG', 2, 10),
+    ('jpeg-12mp', 'JPEG', 12, 3),
+    ('png-2mp', 'PNG', 2, 5),
+]
+# Below this change in p50 a case is noise, whatever the ratio
+MIN_DELTA_MS = 0.2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default='local', choices=('local', 'memory'),
+                        help="Storage backend to run against (default: local).")
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help=f"Comma-separated benchmarks to run (default: all of {','.join(BENCHMARKS)}).")
+    parser.add_argument('--list-sizes', default=','.join(map(str, LIST_SIZES)),
+                        help="Comma-separated account sizes for the listing benchmark.")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every iteration count.")
+    parser.add_argument('--json', action='store_true', help="Emit machine-readable results.")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="Compare with a previous --json run; exit 1 when a case regressed.")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Slowdown of p50 counted as a regression by --compare (default: 0.25).")
+    return parser.parse_args()
+
+
+# Chosen before Django reads the settings
+ARGS = parse_args() if __name__ == '__main__' else None
+if ARGS is not None:
+    os.environ['STORAGE_BACKEND'] = ARGS.backend
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.client import MULTIPART_CONTENT, BOUNDARY, encode_multipart  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from PIL import Image  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from apps.files.models import File, SharedLink  # noqa: E402
+from apps.files.services import get_storage_service  # noqa: E402
+from apps.users.models import User  # noqa: E402
+
+
+def make_payload(kind, size, seed):
+    """Deterministic content of roughly `size` bytes, different for every seed."""
+    rng = random.Random(seed)
+    if kind == 'text':
+        # Base64 lines: about as compressible as prose, so it is stored gzipped
+        return base64.encodebytes(rng.randbytes(size * 3 // 4))[:size]
+    if kind == 'pdf':
+        return b'%PDF-1.4\n' + rng.randbytes(size - 16) + b'\n%%EOF\n'
+    if kind == 'png':
+        # Noise doesn't compress, so the PNG is about width * height * 3 bytes
+        side = int((size / 3) ** 0.5)
+        buf = BytesIO()
+        Image.frombytes('RGB', (side, side), rng.randbytes(side * side * 3)).save(buf, format='PNG')
+        return buf.getvalue()
+    raise ValueError(kind)
+
+
+def make_image(fmt, megapixels):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    buf = BytesIO()
+    Image.linear_gradient('L').resize((width, height)).convert('RGB').save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def label_size(size):
+    return f"{size // (1024 * 1024)}MB" if size >= 1024 * 1024 else f"{size // 1024}KB"
+
+
+def drain(response):
+    """Read a response body to the end, as a client would. Returns its length."""
+    if not response.streaming:
+        return len(response.content)
+    try:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    finally:
+        response.close()
+
+
+def expect(response, *statuses):
+    if response.status_code not in statuses:
+        raise RuntimeError(f"{response.request['PATH_INFO']} returned {response.status_code}: {response.content[:200]!r}")
+    return response
+
+
+def iterations(count, scale):
+    return max(1, int(count * scale))
+
+
+def summarize(benchmark, case, samples, nbytes=None, queries=None, cpu_samples=None):
+    """One result row from per-operation wall times (and CPU times) in seconds."""
+    total = sum(samples)
+    result = {
+        'benchmark': benchmark,
+        'case': case,
+        'iterations': len(samples),
+        'p50_ms': statistics.median(samples) * 1000,
+        'p95_ms': (statistics.quantiles(samples, n=20)[18] if len(samples) > 1 else samples[0]) * 1000,
+        'mean_ms': total / len(samples) * 1000,
+        'ops_per_sec': len(samples) / total,
+    }
+    if nbytes is not None:
+        result['mb_per_sec'] = nbytes * len(samples) / (1024 * 1024) / total
+    if queries is not None:
+        result['queries'] = queries
+    if cpu_samples is not None:
+        result['cpu_p50_ms'] = statistics.median(cpu_samples) * 1000
+    return result
+
+
+def measure(func, count):
+    """Wall time of each of `count` calls of func(i), after one untimed warm-up call."""
+    func(-1)
+    samples = []
+    for i in range(count):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def count_queries(func):
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    return len(queries)
+
+
+def new_client():
+    user = User.objects.create_user(email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password=None)
+    client = Client(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+    return user, client
+
+
+def upload(client, body):
+    return expect(client.generic('POST', '/api/files/upload/', body, content_type=MULTIPART_CONTENT), 201)
+
+
+def multipart(kind, content, seed):
+    extension = {'text': 'txt', 'pdf': 'pdf', 'png': 'png'}[kind]
+    file = BytesIO(content)
+    file.name = f"bench-{seed}.{extension}"
+    return encode_multipart(BOUNDARY, {'file': file})
+
+
+def bench_upload(scale):
+    _, client = new_client()
+    results = []
+    for kind, size, count in UPLOADS:
+        count = iterations(count, scale)
+        # Encoded up front, and unique per request so deduplication never skips the PUT
+        bodies = [multipart(kind, make_payload(kind, size, seed), seed) for seed in range(count + 2)]
+        samples = measure(lambda i: upload(client, bodies[i + 1]), count)
+        queries = count_queries(lambda: upload(client, bodies[-1]))
+        results.append(summarize('upload', f"{kind}-{label_size(size)}", samples, nbytes=size, queries=queries))
+    return results
+
+
+def seed_files(user, count):
+    """Insert `count` File rows for `user` directly; listings never touch storage."""
+    mime_types = ('text/plain', 'application/pdf', 'image/png', 'image/jpeg')
+    batch = []
+    for i in range(count):
+        batch.append(File(
+            user=user,
+            original_name=f"file-{i:06d}.{('txt', 'pdf', 'png', 'jpg')[i % 4]}",
+            storage_key=f"files/bench/{uuid.uuid4().hex}",
+            mime_type=mime_types[i % 4],
+            size_bytes=1024 + i,
+        ))
+        if len(batch) == 5000:
+            File.objects.bulk_create(batch)
+            batch = []
+    File.objects.bulk_create(batch)
+
+
+def bench_list(scale, sizes):
+    results = []
+    for size in sizes:
+        user, client = new_client()
+        seed_files(user, size)
+
+        # Cursor of the 50th page (or the last, for small accounts)
+        url = '/api/files/'
+        for _ in range(min(49, size // 20 - 1)):
+            url = expect(client.get(url), 200).json()['next'] or url
+        cases = {
+            'first-page': '/api/files/',
+            'deep-page': url,
+            'page-number-middle': f"/api/files/?page={max(1, size // 40)}",
+            'search': '/api/files/?search=file-0004',
+            'category': '/api/files/?category=image',
+            'order-by-size': '/api/files/?ordering=-size',
+        }
+        for case, case_url in cases.items():
+            samples = measure(lambda i: drain(expect(client.get(case_url), 200)), iterations(LIST_ITERATIONS, scale))
+            queries = count_queries(lambda: client.get(case_url))
+            results.append(summarize('list', f"{case}-{size // 1000}k", samples, queries=queries))
+    return results
+
+
+def bench_download(scale):
+    _, client = new_client()
+    results = []
+    for seed, (kind, size, count) in enumerate(DOWNLOADS):
+        content = make_payload(kind, size, seed)
+        file_id = upload(client, multipart(kind, content, seed)).json()['id']
+        encodings = ['identity']
+        if File.objects.get(id=file_id).content_encoding:
+            encodings.append(File.objects.get(id=file_id).content_encoding)
+
+        url = f"/api/files/{file_id}/download/"
+        for encoding in encodings:
+            headers = {'HTTP_ACCEPT_ENCODING': encoding}
+            samples = measure(lambda i: drain(expect(client.get(url, **headers), 200)), iterations(count, scale))
+            queries = count_queries(lambda: drain(client.get(url, **headers)))
+            case = f"{kind}-{label_size(size)}" + ('' if encoding == 'identity' else f"-{encoding}")
+            results.append(summarize('download', case, samples, nbytes=size, queries=queries))
+    return results
+
+
+def bench_shared(scale):
+    _, client = new_client()
+    file_id = upload(client, multipart('pdf', make_payload('pdf', 4 * 1024, 0), 0)).json()['id']
+    token = expect(client.post(
+        f"/api/files/{file_id}/share/", {'expires_in': '24h'}, content_type='application/json'
+    ), 201).json()['token']
+
+    public = Client()
+    count = iterations(SHARED_ITERATIONS, scale)
+    results = []
+    for case, url in (('download-4KB', f"/api/shared/{token}/"), ('unknown-token', '/api/shared/no-such-token/')):
+        samples = measure(lambda i: drain(public.get(url)), count)
+        queries = count_queries(lambda: drain(public.get(url)))
+        results.append(summarize('shared', case, samples, queries=queries))
+
+    # Revalidation, as a browser does with its cached copy
+    etag = public.get(f"/api/shared/{token}/")['ETag']
+    samples = measure(lambda i: expect(public.get(f"/api/shared/{token}/", HTTP_IF_NONE_MATCH=etag), 304), count)
+    results.append(summarize('shared', 'not-modified', samples, queries=count_queries(
+        lambda: public.get(f"/api/shared/{token}/", HTTP_IF_NONE_MATCH=etag)
+    )))
+    SharedLink.objects.filter(token=token).delete()
+    return results
+
+
+def bench_thumbnail(scale):
+    """CPU and wall time of rendering a thumbnail (and reading metadata) from an in-memory image."""
+    service = get_storage_service()
+    results = []
+    for label, fmt, megapixels, count in THUMBNAILS:
+        data = make_image(fmt, megapixels)
+        mime_type = f"image/{fmt.lower()}"
+        cpu_samples = []
+
+        def render(i):
+            start = time.process_time()
+            thumbnail, _ = service.generate_thumbnail_and_metadata(BytesIO(data), mime_type)
+            if thumbnail is None:
+                raise RuntimeError(f"Could not render {label}")
+            if i >= 0:
+                cpu_samples.append(time.process_time() - start)
+
+        samples = measure(render, iterations(count, scale))
+        results.append(summarize('thumbnail', label, samples, nbytes=len(data), cpu_samples=cpu_samples))
+    return results
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, dirty
+
+
+def run(args):
+    call_command('migrate', verbosity=0, interactive=False)
+    selected = [name.strip() for name in args.only.split(',') if name.strip()]
+    sizes = [int(size) for size in args.list_sizes.split(',') if size.strip()]
+
+    results = []
+    for name in BENCHMARKS:
+        if name not in selected:
+            continue
+        if name == 'list':
+            results += bench_list(args.scale, sizes)
+        else:
+            results += globals()[f"bench_{name}"](args.scale)
+
+    revision, dirty = git_revision()
+    return {
+        'meta': {
+            'revision': revision,
+            'dirty': dirty,
+            'timestamp': int(time.time()),
+            'backend': args.backend,
+            'scale': args.scale,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Print each case against the baseline. Returns the cases that regressed."""
+    previous = {(r['benchmark'], r['case']): r for r in baseline['results']}
+    regressions = []
+    print(f"{'benchmark':<10} {'case':<26} {'p50 ms':>9} {'before':>9} {'change':>8} {'queries':>8}")
+    for r in report['results']:
+        old = previous.get((r['benchmark'], r['case']))
+        if old is None:
+            print(f"{r['benchmark']:<10} {r['case']:<26} {r['p50_ms']:>9.2f} {'-':>9} {'new':>8}")
+            continue
+        change = r['p50_ms'] / old['p50_ms'] - 1
+        queries = f"{old.get('queries', '-')}->{r.get('queries', '-')}"
+        slower = change > threshold and r['p50_ms'] - old['p50_ms'] > MIN_DELTA_MS
+        more_queries = r.get('queries', 0) > old.get('queries', r.get('queries', 0))
+        flag = '  REGRESSED' if slower or more_queries else ''
+        if flag:
+            regressions.append(r)
+        print(f"{r['benchmark']:<10} {r['case']:<26} {r['p50_ms']:>9.2f} {old['p50_ms']:>9.2f} "
+              f"{change:>+8.0%} {queries:>8}{flag}")
+    return regressions
+
+
+def print_table(report):
+    print(f"{'benchmark':<10} {'case':<26} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'MB/s':>8} {'queries':>8}")
+    for r in report['results']:
+        mb_per_sec = f"{r['mb_per_sec']:.1f}" if 'mb_per_sec' in r else '-'
+        print(f"{r['benchmark']:<10} {r['case']:<26} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+              f"{r['ops_per_sec']:>9.1f} {mb_per_sec:>8} {r.get('queries', '-'):>8}")
+
+
+def main():
+    try:
+        report = run(ARGS)
+    finally:
+        if settings.SCRATCH_DIR_OWNED:
+            shutil.rmtree(settings.SCRATCH_DIR, ignore_errors=True)
+
+    if ARGS.json:
+        print(json.dumps(report, indent=2))
+    elif not ARGS.compare:
+        print_table(report)
+
+    if ARGS.compare:
+        with open(ARGS.compare) as f:
+            baseline = json.load(f)
+        # With --json the comparison goes to stderr, keeping stdout parseable
+        stdout = sys.stdout
+        if ARGS.json:
+            sys.stdout = sys.stderr
+        try:
+            regressions = compare(report, baseline, ARGS.threshold)
+        finally:
+            sys.stdout = stdout
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/settings.py
+"""Django settings for running benchmarks without MySQL or MinIO.
+
+Fills in the required environment with throwaway values, then points the
+database at SQLite and media at a scratch directory (BENCHMARK_MEDIA_ROOT,
+e.g. a tmpfs mount, or a fresh temp dir). The scratch directory is
+BENCHMARK_SCRATCH_DIR; when unset the first process creates one and
+exports it, so worker processes it starts share its database and media.
+Set USE_MINIO=1 with the usual
+MINIO_* variables to include a real MinIO in storage benchmarks.
+"""
+import os
+import tempfile
+
+os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark-only-secret-key-not-for-production')
+os.environ.setdefault('MYSQL_DATABASE', 'benchmark')
+os.environ.setdefault('MYSQL_USER', 'benchmark')
+os.environ.setdefault('MYSQL_PASSWORD', 'benchmark')
+os.environ.setdefault('USE_MINIO', 'False')
+
+from config.settings import *  # noqa: E402,F401,F403
+
+# Only the process that created the directory removes it afterwards
+SCRATCH_DIR_OWNED = 'BENCHMARK_SCRATCH_DIR' not in os.environ
+if SCRATCH_DIR_OWNED:
+    os.environ['BENCHMARK_SCRATCH_DIR'] = tempfile.mkdtemp(prefix='file-manager-bench-')
+SCRATCH_DIR = os.environ['BENCHMARK_SCRATCH_DIR']
+os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(SCRATCH_DIR, 'db.sqlite3'),
+    }
+}
+
+MEDIA_ROOT = os.environ.get('BENCHMARK_MEDIA_ROOT') or os.path.join(SCRATCH_DIR, 'media')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHES['default']['BACKEND'],  # noqa: F405
+        'LOCATION': os.path.join(SCRATCH_DIR, 'cache'),
+    }
+}
+
+# benchmarks.api drives the views through Django's test client
+ALLOWED_HOSTS = ['testserver']
+
+DEBUG = False
@@ -0,0 +1,146 @@
+# benchmarks/storage_backends.py
+"""Upload, download and thumbnail throughput of each storage backend.
+
+Drives StorageService directly (no HTTP, no database), so the numbers are
+the storage path alone. The local and memory backends need no network;
+MinIO is measured too when USE_MINIO=1 and its settings are present.
+Run from backend/:
+
+    python -m benchmarks.storage_backends
+    python -m benchmarks.storage_backends --backends memory,local --json
+    BENCHMARK_MEDIA_ROOT=/dev/shm/bench python -m benchmarks.storage_backends
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from io import BytesIO
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from apps.files.backends import get_backend  # noqa: E402
+from apps.files.services import StorageService  # noqa: E402
+
+# (label, bytes, iterations)
+PAYLOADS = [
+    ('64KB', 64 * 1024, 200),
+    ('1MB', 1024 * 1024, 50),
+    ('16MB', 16 * 1024 * 1024, 5),
+]
+# (label, megapixels, iterations)
+IMAGES = [
+    ('jpeg-2mp', 2, 10),
+    ('jpeg-12mp', 12, 3),
+]
+
+
+def make_jpeg(megapixels):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    buf = BytesIO()
+    Image.linear_gradient('L').resize((width, height)).convert('RGB').save(buf, format='JPEG', quality=90)
+    return buf.getvalue()
+
+
+def timed(func, iterations):
+    """Best-of-three wall time for `iterations` calls of func(i)."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(i)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_payload(service, label, size, iterations):
+    payload = os.urandom(size)
+    prefix = f"files/bench/{uuid.uuid4().hex}"
+    keys = [f"{prefix}/{i}.bin" for i in range(iterations)]
+
+    upload = timed(lambda i: service.upload(BytesIO(payload), keys[i], 'application/octet-stream'), iterations)
+
+    def download(i):
+        for _ in service.download_stream(keys[i]):
+            pass
+    download_time = timed(download, iterations)
+
+    for key in keys:
+        service.delete(key)
+
+    mb = size * iterations / (1024 * 1024)
+    return [
+        {'operation': 'upload', 'case': label, 'seconds': upload,
+         'ops_per_sec': iterations / upload, 'mb_per_sec': mb / upload},
+        {'operation': 'download', 'case': label, 'seconds': download_time,
+         'ops_per_sec': iterations / download_time, 'mb_per_sec': mb / download_time},
+    ]
+
+
+def bench_thumbnail(service, label, megapixels, iterations):
+    key = f"files/bench/{uuid.uuid4().hex}.jpg"
+    data = make_jpeg(megapixels)
+    service.upload(BytesIO(data), key, 'image/jpeg')
+
+    elapsed = timed(lambda i: service.create_thumbnail(key, 'image/jpeg'), iterations)
+    service.delete(key)
+
+    return [{
+        'operation': 'thumbnail', 'case': label, 'seconds': elapsed,
+        'ops_per_sec': iterations / elapsed,
+        'mb_per_sec': len(data) * iterations / (1024 * 1024) / elapsed,
+    }]
+
+
+def run_backend(name, scale):
+    service = StorageService(backend=get_backend(name))
+    results = []
+    for label, size, iterations in PAYLOADS:
+        results += bench_payload(service, label, size, max(1, int(iterations * scale)))
+    for label, megapixels, iterations in IMAGES:
+        results += bench_thumbnail(service, label, megapixels, max(1, int(iterations * scale)))
+    for result in results:
+        result['backend'] = name
+    return results
+
+
+def main():
+    default_backends = 'memory,local,minio' if settings.USE_MINIO else 'memory,local'
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default=default_backends,
+                        help=f"Comma-separated backends to measure (default: {default_backends}).")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply every iteration count.")
+    parser.add_argument('--json', action='store_true', help="Emit machine-readable results.")
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for name in args.backends.split(','):
+            results += run_backend(name.strip(), args.scale)
+    finally:
+        if settings.SCRATCH_DIR_OWNED:
+            shutil.rmtree(settings.SCRATCH_DIR, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':<8} {'operation':<10} {'case':<10} {'ms/op':>9} {'ops/s':>9} {'MB/s':>9}")
+    for r in results:
+        ms_per_op = 1000 / r['ops_per_sec']
+        print(f"{r['backend']:<8} {r['operation']:<10} {r['case']:<10} {ms_per_op:>9.2f} "
+              f"{r['ops_per_sec']:>9.1f} {r['mb_per_sec']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/thumbnail_decode.py
+"""Compare the legacy full-decode thumbnail path with the draft/reduce fast path.
+
+Each measurement runs in a fresh subprocess so peak RSS is attributable to a
+single decode. Run from backend/:
+
+    python -m benchmarks.thumbnail_decode
+    python -m benchmarks.thumbnail_decode --json > thumbs.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image
+
+# (label, format, mode, megapixels)
+CASES = [
+    ('jpeg-rgb-12mp', 'JPEG', 'RGB', 12),
+    ('jpeg-rgb-48mp', 'JPEG', 'RGB', 48),
+    ('jpeg-cmyk-24mp', 'JPEG', 'CMYK', 24),
+    ('png-rgba-12mp', 'PNG', 'RGBA', 12),
+    ('png-palette-12mp', 'PNG', 'P', 12),
+]
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+PATHS = ('legacy', 'fast')
+
+
+def make_image(path, fmt, mode, megapixels):
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    # A gradient compresses realistically, unlike a flat colour
+    image = Image.linear_gradient('L').resize((width, height)).convert(mode)
+    image.save(path, format=fmt, quality=90)
+
+
+def legacy_thumbnail(f, mime_type):
+    """The pre-fast-path rendition pipeline: convert, then resize."""
+    image = Image.open(f)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    if image.mode == 'RGBA' and mime_type == 'image/jpeg':
+        image = image.convert('RGB')
+    image.thumbnail((200, 200), Image.Resampling.LANCZOS)
+    image.save(BytesIO(), format='PNG')
+
+
+def fast_thumbnail(f, mime_type):
+    from apps.files.services import StorageService
+
+    service = StorageService.__new__(StorageService)  # no storage needed
+    image = service.open_scaled_image(f, StorageService.THUMBNAIL_SIZE)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    image.thumbnail(StorageService.THUMBNAIL_SIZE, Image.Resampling.LANCZOS, reducing_gap=None)
+    image.save(BytesIO(), format='PNG')
+
+
+def reset_peak_rss():
+    """Linux keeps the parent's high-water mark across fork/exec; clear it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_worker(path_name, image_path, mime_type):
+    """Child process: one timed decode, report seconds and peak RSS."""
+    func = fast_thumbnail if path_name == 'fast' else legacy_thumbnail
+    # Import up front so module loading doesn't count towards the decode
+    import apps.files.services  # noqa: F401
+    reset_peak_rss()
+    baseline_kb = peak_rss_kb()
+    start = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        func(f, mime_type)
+    elapsed = time.perf_counter() - start
+    peak_kb = peak_rss_kb()
+    print(json.dumps({'seconds': elapsed, 'peak_rss_kb': peak_kb, 'delta_rss_kb': peak_kb - baseline_kb}))
+
+
+def measure(path_name, image_path, mime_type, repeat):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.thumbnail_decode', '--worker', path_name, image_path, mime_type],
+            check=True, capture_output=True, text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': min(run['seconds'] for run in runs),
+        'peak_rss_kb': min(run['peak_rss_kb'] for run in runs),
+        'delta_rss_kb': min(run['delta_rss_kb'] for run in runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per case; the best is reported.")
+    parser.add_argument('--json', action='store_true', help="Emit machine-readable results.")
+    parser.add_argument('--worker', nargs=3, metavar=('PATH', 'IMAGE', 'MIME'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, fmt, mode, megapixels in CASES:
+            image_path = os.path.join(tmp, f"{label}.{fmt.lower()}")
+            make_image(image_path, fmt, mode, megapixels)
+            for path_name in PATHS:
+                result = measure(path_name, image_path, MIME_TYPES[fmt], args.repeat)
+                result.update({
+                    'case': label,
+                    'path': path_name,
+                    'megapixels': megapixels,
+                    'ms_per_mp': result['seconds'] * 1000 / megapixels,
+                    'rss_kb_per_mp': result['delta_rss_kb'] / megapixels,
+                })
+                results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'case':<18} {'path':<7} {'ms':>9} {'ms/MP':>8} {'peak MB':>9} {'dRSS KB/MP':>11}")
+    for r in results:
+        print(f"{r['case']:<18} {r['path']:<7} {r['seconds'] * 1000:>9.1f} {r['ms_per_mp']:>8.2f} "
+              f"{r['peak_rss_kb'] / 1024:>9.1f} {r['rss_kb_per_mp']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -49,6 +49,8 @@ TEMPLATES = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it sees every query of the request
+    'apps.files.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # CORS Middleware must be placed high up
     'corsheaders.middleware.CorsMiddleware',
@@ -116,12 +118,68 @@ SIMPLE_JWT = {
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:5173', cast=Csv())
 CORS_ALLOW_CREDENTIALS = True
 
+# --- Cache ---
+# File based by default so every gunicorn worker on the host sees the same
+# entries (and invalidations); point it at Redis/Memcached when running several nodes.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default='/tmp/file-manager-cache'),
+    }
+}
+
+# Public share links: how long a token lookup is cached, and how often batched
+# download counts are written back
+SHARED_LINK_CACHE_SECONDS = config('SHARED_LINK_CACHE_SECONDS', default=60, cast=int)
+SHARE_COUNT_FLUSH_SECONDS = config('SHARE_COUNT_FLUSH_SECONDS', default=10, cast=int)
+
+# --- Query Budget ---
+# Requests over this many SQL queries (0 = no limit; views may set `query_budget`)
+# or this much database time (ms, 0 = no limit) are logged. See apps/files/querybudget.py
+QUERY_BUDGET = config('QUERY_BUDGET', default=20, cast=int)
+QUERY_BUDGET_DB_MS = config('QUERY_BUDGET_DB_MS', default=250, cast=int)
+
+# --- Metrics ---
+# Prometheus must send `Authorization: Bearer <METRICS_TOKEN>`; when empty
+# /metrics answers 403, unless DEBUG is on
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # --- File Uploads ---
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 
+# Chunked uploads (S3 requires every part except the last to be >= 5 MB)
+CHUNKED_UPLOAD_PART_SIZE = config('CHUNKED_UPLOAD_PART_SIZE', default=8388608, cast=int)  # 8 MB
+CHUNKED_UPLOAD_MAX_SIZE = config('CHUNKED_UPLOAD_MAX_SIZE', default=2147483648, cast=int)  # 2 GB
+CHUNKED_UPLOAD_EXPIRY_HOURS = config('CHUNKED_UPLOAD_EXPIRY_HOURS', default=24, cast=int)
+
+# Default per-user storage quota (active files only); 0 = unlimited. StorageUsage.quota_bytes overrides it
+STORAGE_QUOTA_BYTES = config('STORAGE_QUOTA_BYTES', default=10737418240, cast=int)  # 10 GB
+
+# At-rest compression, 'mime/type:codec,...' with gzip or zstd (empty disables). A file is
+# kept compressed only when that saves at least STORAGE_COMPRESSION_MIN_SAVING of its size
+STORAGE_COMPRESSION = config('STORAGE_COMPRESSION', default='text/plain:gzip,application/pdf:gzip')
+STORAGE_COMPRESSION_MIN_SAVING = config('STORAGE_COMPRESSION_MIN_SAVING', default=0.1, cast=float)
+
+# Most files a single bulk delete/restore/share/zip request may name
+BULK_MAX_FILES = config('BULK_MAX_FILES', default=1000, cast=int)
+
+# Soft-deleted files are removed for good by `manage.py purge_trash` after this long
+TRASH_RETENTION_DAYS = config('TRASH_RETENTION_DAYS', default=30, cast=int)
+
+# Thumbnails are rendered by `manage.py process_thumbnails` unless disabled
+THUMBNAIL_ASYNC = config('THUMBNAIL_ASYNC', default=True, cast=bool)
+
+# Threads per process rendering thumbnails next to the original's PUT when THUMBNAIL_ASYNC is off
+UPLOAD_THUMBNAIL_THREADS = config('UPLOAD_THUMBNAIL_THREADS', default=4, cast=int)
+
+# Presigned (direct-to-storage) URLs, MinIO only
+PRESIGNED_URL_EXPIRY_SECONDS = config('PRESIGNED_URL_EXPIRY_SECONDS', default=300, cast=int)
+
 # --- Storage (MinIO S3) ---
 USE_MINIO = config('USE_MINIO', default=True, cast=bool)
+# 'local', 'minio', 'memory' or a dotted path to an apps.files.backends.StorageBackend
+STORAGE_BACKEND = config('STORAGE_BACKEND', default='minio' if USE_MINIO else 'local')
 
 if USE_MINIO:
     AWS_ACCESS_KEY_ID = config('MINIO_ROOT_USER')
@@ -133,6 +191,24 @@ if USE_MINIO:
     AWS_DEFAULT_ACL = None # Must be None for MinIO
     AWS_S3_SIGNATURE_VERSION = 's3v4'
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    # Per-process connection pool (see MinioBackend._build_http_client)
+    MINIO_POOL_MAXSIZE = config('MINIO_POOL_MAXSIZE', default=10, cast=int)
+    MINIO_POOL_PREWARM = config('MINIO_POOL_PREWARM', default=2, cast=int)
+    MINIO_CONNECT_TIMEOUT = config('MINIO_CONNECT_TIMEOUT', default=5, cast=float)
+    MINIO_READ_TIMEOUT = config('MINIO_READ_TIMEOUT', default=300, cast=float)
+    # Browser-facing MinIO address used to sign direct upload/download URLs
+    MINIO_PUBLIC_ENDPOINT = config('MINIO_PUBLIC_ENDPOINT', default=AWS_S3_ENDPOINT_URL)
+    # Redirect download/view/preview/shared links to presigned URLs instead of proxying bytes
+    PRESIGNED_DOWNLOAD_REDIRECTS = config('PRESIGNED_DOWNLOAD_REDIRECTS', default=False, cast=bool)
 else:
     MEDIA_URL = '/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
+
+# How downloads from the local backend are sent once permissions are checked:
+# 'stream' (Python reads the file), 'sendfile' (FileResponse, zero-copy through
+# wsgi.file_wrapper) or 'accel' (X-Accel-Redirect, nginx reads the file)
+LOCAL_FILE_SERVING = config('LOCAL_FILE_SERVING', default='sendfile')
+# Internal nginx location aliased to MEDIA_ROOT (see frontend/nginx.conf)
+LOCAL_ACCEL_PREFIX = config('LOCAL_ACCEL_PREFIX', default='/protected-media/')
+# Threads per process for the blocking storage reads behind ASGI downloads
+STORAGE_IO_THREADS = config('STORAGE_IO_THREADS', default=32, cast=int)
@@ -2,7 +2,7 @@
 
 from django.contrib import admin
 from django.urls import path, include
-from apps.files.views import SharedDownloadView
+from apps.files.views import SharedDownloadView, StorageStatsView, metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -17,4 +17,6 @@ urlpatterns = [
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/files/', include('apps.files.urls')),
     path('api/shared/<str:token>/', SharedDownloadView.as_view(), name='shared-download'),
+    path('api/storage/stats/', StorageStatsView.as_view(), name='storage-stats'),
+    path('metrics', metrics_view, name='metrics'),
 ]
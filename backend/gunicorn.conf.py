@@ -0,0 +1,42 @@
+# backend/gunicorn.conf.py
+# Picked up automatically by `gunicorn` when started from this directory.
+import os
+import shutil
+
+# 'wsgi': sync workers, one request per worker at a time.
+# 'asgi': Uvicorn workers; downloads stream asynchronously, so slow clients
+# don't pin a worker (see apps/files/responses.py).
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Workers write their Prometheus samples here so /metrics can add them up
+# (see apps/files/metrics.py); inherited by every worker forked from this process.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-metrics')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+
+def on_starting(server):
+    """Start from an empty metrics directory; files of a previous run would be counted again."""
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+def post_worker_init(worker):
+    """Open storage connections once per worker, before it accepts requests."""
+    from apps.files.services import get_storage_service
+    get_storage_service().warm_up()
+
+def worker_exit(server, worker):
+    """Write share download counts still held in memory."""
+    from apps.files.sharing import download_counter
+    download_counter.flush()
+
+def child_exit(server, worker):
+    """Stop reporting live-only samples of a worker that has gone away."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,27 +2,48 @@
 import apiClient from "./client";
 import type {
   FileItem,
-  PaginatedResponse,
+  Folder,
+  CursorPage,
+  FileQuery,
   SharedLink,
   ExpiresIn,
 } from "../types";
 
+// Only what the file table renders; the server skips everything else
+const LIST_FIELDS = "id,original_name,mime_type,size_bytes,thumbnail_status,created_at";
+
 export async function getFiles(
-  page: number = 1,
-): Promise<PaginatedResponse<FileItem>> {
-  const response = await apiClient.get<PaginatedResponse<FileItem>>(
-    "/api/files/",
-    { params: { page } },
-  );
+  cursor: string | null = null,
+  query: FileQuery = {},
+): Promise<CursorPage<FileItem>> {
+  const response = await apiClient.get<CursorPage<FileItem>>("/api/files/", {
+    params: {
+      cursor: cursor ?? undefined,
+      fields: LIST_FIELDS,
+      folder: query.folder || undefined,
+      search: query.search || undefined,
+      category: query.category || undefined,
+      orientation: query.orientation || undefined,
+      ordering: query.ordering || undefined,
+    },
+  });
   return response.data;
 }
 
+// The opaque cursor carried by a `next`/`previous` link
+export function cursorFromLink(link: string | null): string | null {
+  if (!link) return null;
+  return new URL(link, window.location.origin).searchParams.get("cursor");
+}
+
 export async function uploadFile(
   file: File,
   onProgress?: (progress: number) => void,
+  folder: string | null = null,
 ): Promise<FileItem> {
   const formData = new FormData();
   formData.append("file", file);
+  if (folder) formData.append("folder", folder);
 
   const response = await apiClient.post<FileItem>(
     "/api/files/upload/",
@@ -65,6 +86,63 @@ export async function deleteFile(fileId: string): Promise<void> {
   await apiClient.delete(`/api/files/${fileId}/`);
 }
 
+export async function bulkDeleteFiles(
+  ids: string[],
+): Promise<{ deleted: number }> {
+  const response = await apiClient.post<{ deleted: number }>(
+    "/api/files/bulk-delete/",
+    { ids },
+  );
+  return response.data;
+}
+
+export async function bulkRestoreFiles(
+  ids: string[],
+): Promise<{ restored: number }> {
+  const response = await apiClient.post<{ restored: number }>(
+    "/api/files/bulk-restore/",
+    { ids },
+  );
+  return response.data;
+}
+
+export async function bulkMoveFiles(
+  ids: string[],
+  folder: string | null,
+): Promise<{ moved: number }> {
+  const response = await apiClient.post<{ moved: number }>(
+    "/api/files/bulk-move/",
+    { ids, folder },
+  );
+  return response.data;
+}
+
+export async function bulkShareFiles(
+  ids: string[],
+  expiresIn: ExpiresIn,
+): Promise<SharedLink[]> {
+  const response = await apiClient.post<SharedLink[]>(
+    "/api/files/bulk-share/",
+    { ids, expires_in: expiresIn },
+  );
+  return response.data;
+}
+
+export async function downloadZip(ids: string[]): Promise<void> {
+  const response = await apiClient.post("/api/files/download-zip/", { ids }, {
+    responseType: "blob",
+  });
+
+  const url = window.URL.createObjectURL(new Blob([response.data]));
+  const link = document.createElement("a");
+  link.href = url;
+  link.setAttribute("download", "files.zip");
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  window.URL.revokeObjectURL(url);
+}
+
 export async function shareFile(
   fileId: string,
   expiresIn: ExpiresIn,
@@ -77,3 +155,34 @@ export async function shareFile(
   );
   return response.data;
 }
+
+// --- Folders ---
+
+// Subfolders of `parent`, or the top level
+export async function getFolders(parent: string | null): Promise<Folder[]> {
+  const response = await apiClient.get<Folder[]>("/api/files/folders/", {
+    params: { parent: parent ?? undefined },
+  });
+  return response.data;
+}
+
+export async function getFolder(id: string): Promise<Folder> {
+  const response = await apiClient.get<Folder>(`/api/files/folders/${id}/`);
+  return response.data;
+}
+
+export async function createFolder(
+  name: string,
+  parent: string | null,
+): Promise<Folder> {
+  const response = await apiClient.post<Folder>("/api/files/folders/", {
+    name,
+    parent,
+  });
+  return response.data;
+}
+
+// Moves the folder and everything in it to the trash
+export async function deleteFolder(id: string): Promise<void> {
+  await apiClient.delete(`/api/files/folders/${id}/`);
+}
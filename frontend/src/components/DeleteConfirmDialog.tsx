@@ -12,6 +12,7 @@ import {
 interface DeleteConfirmDialogProps {
   open: boolean;
   fileName: string;
+  title?: string;
   onConfirm: () => void;
   onCancel: () => void;
   isDeleting: boolean;
@@ -20,13 +21,14 @@ interface DeleteConfirmDialogProps {
 export const DeleteConfirmDialog: React.FC<DeleteConfirmDialogProps> = ({
   open,
   fileName,
+  title = "Delete File",
   onConfirm,
   onCancel,
   isDeleting,
 }) => {
   return (
     <Dialog open={open} onClose={onCancel}>
-      <DialogTitle>Delete File</DialogTitle>
+      <DialogTitle>{title}</DialogTitle>
       <DialogContent>
         <DialogContentText>
           Are you sure you want to delete "{fileName}"? This action cannot be
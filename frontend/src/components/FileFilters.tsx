@@ -0,0 +1,105 @@
+// src/components/FileFilters.tsx
+import React, { useEffect, useState } from "react";
+import { Box, TextField, MenuItem } from "@mui/material";
+import type { FileQuery } from "../types";
+
+interface FileFiltersProps {
+  value: FileQuery;
+  onChange: (query: FileQuery) => void;
+}
+
+const CATEGORIES = [
+  { value: "", label: "All types" },
+  { value: "image", label: "Images" },
+  { value: "pdf", label: "PDFs" },
+  { value: "text", label: "Text" },
+];
+
+const ORIENTATIONS = [
+  { value: "", label: "Any shape" },
+  { value: "landscape", label: "Landscape" },
+  { value: "portrait", label: "Portrait" },
+  { value: "square", label: "Square" },
+];
+
+const ORDERINGS = [
+  { value: "-created_at", label: "Newest first" },
+  { value: "created_at", label: "Oldest first" },
+  { value: "name", label: "Name (A-Z)" },
+  { value: "-name", label: "Name (Z-A)" },
+  { value: "-size", label: "Largest first" },
+  { value: "size", label: "Smallest first" },
+];
+
+export const FileFilters: React.FC<FileFiltersProps> = ({
+  value,
+  onChange,
+}) => {
+  const [search, setSearch] = useState(value.search ?? "");
+
+  // Query the server once typing pauses, not on every keystroke
+  useEffect(() => {
+    if (search === (value.search ?? "")) return;
+    const timer = setTimeout(() => onChange({ ...value, search }), 300);
+    return () => clearTimeout(timer);
+  }, [search, value, onChange]);
+
+  return (
+    <Box display="flex" gap={2} mb={2} flexWrap="wrap">
+      <TextField
+        label="Search"
+        size="small"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        sx={{ flexGrow: 1, minWidth: 200 }}
+      />
+      <TextField
+        select
+        label="Type"
+        size="small"
+        value={value.category ?? ""}
+        onChange={(e) =>
+          // Orientation only applies to images
+          onChange({ ...value, category: e.target.value, orientation: "" })
+        }
+        sx={{ minWidth: 140 }}
+      >
+        {CATEGORIES.map((c) => (
+          <MenuItem key={c.value} value={c.value}>
+            {c.label}
+          </MenuItem>
+        ))}
+      </TextField>
+      {value.category === "image" && (
+        <TextField
+          select
+          label="Orientation"
+          size="small"
+          value={value.orientation ?? ""}
+          onChange={(e) => onChange({ ...value, orientation: e.target.value })}
+          sx={{ minWidth: 140 }}
+        >
+          {ORIENTATIONS.map((o) => (
+            <MenuItem key={o.value} value={o.value}>
+              {o.label}
+            </MenuItem>
+          ))}
+        </TextField>
+      )}
+      <TextField
+        select
+        label="Sort by"
+        size="small"
+        value={value.ordering ?? "-created_at"}
+        onChange={(e) => onChange({ ...value, ordering: e.target.value })}
+        sx={{ minWidth: 160 }}
+      >
+        {ORDERINGS.map((o) => (
+          <MenuItem key={o.value} value={o.value}>
+            {o.label}
+          </MenuItem>
+        ))}
+      </TextField>
+    </Box>
+  );
+};
@@ -12,7 +12,8 @@ import {
   Typography,
   Box,
   Chip,
-  Pagination,
+  Button,
+  Checkbox,
   Skeleton,
 } from "@mui/material";
 import DeleteIcon from "@mui/icons-material/Delete";
@@ -22,19 +23,21 @@ import InsertDriveFileIcon from "@mui/icons-material/InsertDriveFile";
 import ImageIcon from "@mui/icons-material/Image";
 import PictureAsPdfIcon from "@mui/icons-material/PictureAsPdf";
 import DescriptionIcon from "@mui/icons-material/Description";
-import type { FileItem, PaginatedResponse } from "../types";
+import type { FileItem, CursorPage } from "../types";
 import { formatFileSize, formatDate, getFileIconType } from "../utils/format";
 import apiClient from "../api/client";
 
 interface FileListProps {
-  data: PaginatedResponse<FileItem> | undefined;
+  data: CursorPage<FileItem> | undefined;
   isLoading: boolean;
   onDownload: (file: FileItem) => void;
   onDelete: (file: FileItem) => void;
   onShare: (file: FileItem) => void;
   onPreview?: (file: FileItem) => void;
-  page: number;
-  onPageChange: (event: React.ChangeEvent<unknown>, value: number) => void;
+  onNextPage: () => void;
+  onPreviousPage: () => void;
+  selected: string[];
+  onSelectionChange: (ids: string[]) => void;
 }
 
 const getIcon = (mimeType: string) => {
@@ -58,8 +61,10 @@ export const FileList: React.FC<FileListProps> = ({
   onDelete,
   onShare,
   onPreview,
-  page,
-  onPageChange,
+  onNextPage,
+  onPreviousPage,
+  selected,
+  onSelectionChange,
 }) => {
   const [thumbnails, setThumbnails] = useState<Record<string, string>>({});
 
@@ -83,6 +88,11 @@ export const FileList: React.FC<FileListProps> = ({
         const response = await apiClient.get(`/api/files/${file.id}/preview/`, {
           responseType: "blob",
         });
+        // 202: thumbnail still being generated, retry on the next refetch
+        if (response.status === 202) {
+          fetchedIds.current.delete(file.id);
+          return;
+        }
         const url = URL.createObjectURL(response.data);
         setThumbnails((prev) => ({ ...prev, [file.id]: url }));
       } catch (err) {
@@ -115,7 +125,22 @@ export const FileList: React.FC<FileListProps> = ({
     );
   }
 
-  const totalPages = Math.ceil(data.count / 10);
+  const pageIds = data.results.map((file) => file.id);
+  const selectedOnPage = pageIds.filter((id) => selected.includes(id));
+
+  const toggle = (id: string) =>
+    onSelectionChange(
+      selected.includes(id)
+        ? selected.filter((s) => s !== id)
+        : [...selected, id],
+    );
+
+  const toggleAll = () =>
+    onSelectionChange(
+      selectedOnPage.length === pageIds.length
+        ? selected.filter((id) => !pageIds.includes(id))
+        : [...new Set([...selected, ...pageIds])],
+    );
 
   return (
     <Box>
@@ -123,6 +148,16 @@ export const FileList: React.FC<FileListProps> = ({
         <Table>
           <TableHead>
             <TableRow>
+              <TableCell padding="checkbox">
+                <Checkbox
+                  checked={selectedOnPage.length === pageIds.length}
+                  indeterminate={
+                    selectedOnPage.length > 0 &&
+                    selectedOnPage.length < pageIds.length
+                  }
+                  onChange={toggleAll}
+                />
+              </TableCell>
               <TableCell>Name</TableCell>
               <TableCell>Size</TableCell>
               <TableCell>Type</TableCell>
@@ -132,7 +167,17 @@ export const FileList: React.FC<FileListProps> = ({
           </TableHead>
           <TableBody>
             {data.results.map((file) => (
-              <TableRow key={file.id} hover>
+              <TableRow
+                key={file.id}
+                hover
+                selected={selected.includes(file.id)}
+              >
+                <TableCell padding="checkbox">
+                  <Checkbox
+                    checked={selected.includes(file.id)}
+                    onChange={() => toggle(file.id)}
+                  />
+                </TableCell>
                 <TableCell>
                   <Box display="flex" alignItems="center" gap={2}>
                     {thumbnails[file.id] ? (
@@ -205,14 +250,14 @@ export const FileList: React.FC<FileListProps> = ({
         </Table>
       </TableContainer>
 
-      {totalPages > 1 && (
-        <Box display="flex" justifyContent="center" mt={2}>
-          <Pagination
-            count={totalPages}
-            page={page}
-            onChange={onPageChange}
-            color="primary"
-          />
+      {(data.next || data.previous) && (
+        <Box display="flex" justifyContent="center" gap={2} mt={2}>
+          <Button onClick={onPreviousPage} disabled={!data.previous}>
+            Previous
+          </Button>
+          <Button onClick={onNextPage} disabled={!data.next}>
+            Next
+          </Button>
         </Box>
       )}
     </Box>
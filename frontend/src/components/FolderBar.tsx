@@ -0,0 +1,132 @@
+// src/components/FolderBar.tsx
+import React, { useState } from "react";
+import {
+  Box,
+  Breadcrumbs,
+  Button,
+  Chip,
+  Dialog,
+  DialogActions,
+  DialogContent,
+  DialogTitle,
+  Link,
+  TextField,
+  Typography,
+} from "@mui/material";
+import FolderIcon from "@mui/icons-material/Folder";
+import CreateNewFolderIcon from "@mui/icons-material/CreateNewFolder";
+import type { Folder } from "../types";
+
+interface FolderBarProps {
+  // The open folder, undefined at the top level (or while loading)
+  folder?: Folder;
+  subfolders: Folder[];
+  onNavigate: (folderId: string | null) => void;
+  onCreate: (name: string) => Promise<void>;
+  onDelete: () => void;
+}
+
+export const FolderBar: React.FC<FolderBarProps> = ({
+  folder,
+  subfolders,
+  onNavigate,
+  onCreate,
+  onDelete,
+}) => {
+  const [creating, setCreating] = useState(false);
+  const [name, setName] = useState("");
+  const [error, setError] = useState<string | null>(null);
+
+  const handleCreate = async () => {
+    try {
+      await onCreate(name.trim());
+      setCreating(false);
+      setName("");
+      setError(null);
+    } catch {
+      setError("Could not create folder. Is the name already taken?");
+    }
+  };
+
+  return (
+    <Box mb={2}>
+      <Box display="flex" alignItems="center" gap={2} mb={1}>
+        <Breadcrumbs sx={{ flexGrow: 1 }}>
+          <Link
+            component="button"
+            underline="hover"
+            onClick={() => onNavigate(null)}
+          >
+            All files
+          </Link>
+          {folder?.ancestors?.map((ancestor) => (
+            <Link
+              key={ancestor.id}
+              component="button"
+              underline="hover"
+              onClick={() => onNavigate(ancestor.id)}
+            >
+              {ancestor.name}
+            </Link>
+          ))}
+          {folder && <Typography color="text.primary">{folder.name}</Typography>}
+        </Breadcrumbs>
+        <Button
+          size="small"
+          startIcon={<CreateNewFolderIcon />}
+          onClick={() => setCreating(true)}
+        >
+          New folder
+        </Button>
+        {folder && (
+          <Button size="small" color="error" onClick={onDelete}>
+            Delete folder
+          </Button>
+        )}
+      </Box>
+
+      {subfolders.length > 0 && (
+        <Box display="flex" gap={1} flexWrap="wrap">
+          {subfolders.map((sub) => (
+            <Chip
+              key={sub.id}
+              icon={<FolderIcon />}
+              label={sub.name}
+              onClick={() => onNavigate(sub.id)}
+              variant="outlined"
+            />
+          ))}
+        </Box>
+      )}
+
+      <Dialog open={creating} onClose={() => setCreating(false)}>
+        <DialogTitle>New folder</DialogTitle>
+        <DialogContent>
+          <TextField
+            autoFocus
+            fullWidth
+            margin="dense"
+            label="Name"
+            value={name}
+            onChange={(e) => setName(e.target.value)}
+            onKeyDown={(e) => {
+              if (e.key === "Enter" && name.trim()) handleCreate();
+            }}
+            error={!!error}
+            helperText={error}
+          />
+        </DialogContent>
+        <DialogActions>
+          <Button onClick={() => setCreating(false)}>Cancel</Button>
+          <Button
+            onClick={handleCreate}
+            variant="contained"
+            disabled={!name.trim()}
+          >
+            Create
+          </Button>
+        </DialogActions>
+      </Dialog>
+    </Box>
+  );
+};
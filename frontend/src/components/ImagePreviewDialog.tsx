@@ -36,8 +36,9 @@ export function ImagePreviewDialog({
       setLoading(true);
       setError(false);
 
+      // 1600px WebP rendition instead of the full-size original
       apiClient
-        .get(`/api/files/${file.id}/view/`, { responseType: "blob" })
+        .get(`/api/files/${file.id}/rendition/lg/`, { responseType: "blob" })
         .then((response) => {
           const url = URL.createObjectURL(response.data);
           setImageUrl(url);
@@ -10,6 +10,8 @@ import {
 } from "@mui/material";
 import LogoutIcon from "@mui/icons-material/Logout";
 import { useAuth } from "../hooks/useAuth";
+import { useStorageUsage } from "../hooks/useFiles";
+import { formatFileSize } from "../utils/format";
 import { useNavigate } from "react-router-dom";
 
 interface LayoutProps {
@@ -18,6 +20,7 @@ interface LayoutProps {
 
 export function Layout({ children }: LayoutProps) {
   const { user, logout } = useAuth();
+  const { data: usage } = useStorageUsage(!!user);
   const navigate = useNavigate();
 
   const handleLogout = () => {
@@ -34,6 +37,13 @@ export function Layout({ children }: LayoutProps) {
           </Typography>
           {user && (
             <Box display="flex" alignItems="center" gap={2}>
+              {usage && (
+                <Typography variant="body2" sx={{ opacity: 0.8 }}>
+                  {formatFileSize(usage.used_bytes)}
+                  {usage.quota_bytes !== null &&
+                    ` of ${formatFileSize(usage.quota_bytes)}`}
+                </Typography>
+              )}
               <Typography variant="body2">{user.email}</Typography>
               <IconButton color="inherit" onClick={handleLogout} title="Logout">
                 <LogoutIcon />
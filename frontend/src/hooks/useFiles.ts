@@ -1,16 +1,37 @@
 // src/hooks/useFiles.ts
 import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
-import { getFiles, uploadFile, deleteFile } from "../api/files";
+import {
+  getFiles,
+  uploadFile,
+  deleteFile,
+  bulkDeleteFiles,
+  bulkMoveFiles,
+  getFolders,
+  getFolder,
+  createFolder,
+  deleteFolder,
+} from "../api/files";
+import { getCurrentUser } from "../api/auth";
+import type { FileQuery } from "../types";
 
-export function useFiles(page: number = 1) {
+export function useFiles(cursor: string | null = null, query: FileQuery = {}) {
   return useQuery({
-    queryKey: ["files", page],
-    queryFn: () => getFiles(page),
+    queryKey: ["files", cursor, query],
+    queryFn: () => getFiles(cursor, query),
     // Keep previous data while fetching new page for smooth transition
     placeholderData: (previousData) => previousData,
   });
 }
 
+// Keyed under "files" so every upload or delete invalidation refreshes it too
+export function useStorageUsage(enabled = true) {
+  return useQuery({
+    queryKey: ["files", "usage"],
+    queryFn: async () => (await getCurrentUser()).storage,
+    enabled,
+  });
+}
+
 export function useUploadFile() {
   const queryClient = useQueryClient();
 
@@ -18,10 +39,12 @@ export function useUploadFile() {
     mutationFn: ({
       file,
       onProgress,
+      folder,
     }: {
       file: File;
       onProgress?: (p: number) => void;
-    }) => uploadFile(file, onProgress),
+      folder?: string | null;
+    }) => uploadFile(file, onProgress, folder),
     onSuccess: () => {
       // Invalidate files query to refetch list
       queryClient.invalidateQueries({ queryKey: ["files"] });
@@ -39,3 +62,65 @@ export function useDeleteFile() {
     },
   });
 }
+
+export function useBulkDeleteFiles() {
+  const queryClient = useQueryClient();
+
+  return useMutation({
+    mutationFn: bulkDeleteFiles,
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ["files"] });
+    },
+  });
+}
+
+export function useBulkMoveFiles() {
+  const queryClient = useQueryClient();
+
+  return useMutation({
+    mutationFn: ({ ids, folder }: { ids: string[]; folder: string | null }) =>
+      bulkMoveFiles(ids, folder),
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ["files"] });
+    },
+  });
+}
+
+// Folders are keyed under "files" too: deleting one also removes its files
+export function useFolders(parent: string | null) {
+  return useQuery({
+    queryKey: ["files", "folders", parent],
+    queryFn: () => getFolders(parent),
+  });
+}
+
+export function useFolder(id: string | null) {
+  return useQuery({
+    queryKey: ["files", "folder", id],
+    queryFn: () => getFolder(id as string),
+    enabled: !!id,
+  });
+}
+
+export function useCreateFolder() {
+  const queryClient = useQueryClient();
+
+  return useMutation({
+    mutationFn: ({ name, parent }: { name: string; parent: string | null }) =>
+      createFolder(name, parent),
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ["files", "folders"] });
+    },
+  });
+}
+
+export function useDeleteFolder() {
+  const queryClient = useQueryClient();
+
+  return useMutation({
+    mutationFn: deleteFolder,
+    onSuccess: () => {
+      queryClient.invalidateQueries({ queryKey: ["files"] });
+    },
+  });
+}
@@ -1,19 +1,45 @@
 // src/pages/FilesPage.tsx
-import { useState } from "react";
-import { Box, Typography, Snackbar, Alert } from "@mui/material";
+import { useCallback, useState } from "react";
+import {
+  Box,
+  Button,
+  Typography,
+  Snackbar,
+  Alert,
+  Menu,
+  MenuItem,
+} from "@mui/material";
 import { Layout } from "../components/Layout";
 import { FileUpload } from "../components/FileUpload";
 import { FileList } from "../components/FileList";
+import { FileFilters } from "../components/FileFilters";
+import { FolderBar } from "../components/FolderBar";
 import { DeleteConfirmDialog } from "../components/DeleteConfirmDialog";
 import { ShareDialog } from "../components/ShareDialog";
 import { ImagePreviewDialog } from "../components/ImagePreviewDialog";
 
-import { useFiles, useUploadFile, useDeleteFile } from "../hooks/useFiles";
-import { downloadFile } from "../api/files";
-import type { FileItem } from "../types";
+import {
+  useFiles,
+  useUploadFile,
+  useDeleteFile,
+  useBulkDeleteFiles,
+  useBulkMoveFiles,
+  useFolder,
+  useFolders,
+  useCreateFolder,
+  useDeleteFolder,
+} from "../hooks/useFiles";
+import { downloadFile, downloadZip, cursorFromLink } from "../api/files";
+import type { FileItem, FileQuery } from "../types";
 
 export const Files = () => {
-  const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState<string | null>(null);
+  const [query, setQuery] = useState<FileQuery>({});
+  // The open folder; null is the top level
+  const [folderId, setFolderId] = useState<string | null>(null);
+  const [selected, setSelected] = useState<string[]>([]);
+  const [moveAnchor, setMoveAnchor] = useState<HTMLElement | null>(null);
+  const [deleteFolderOpen, setDeleteFolderOpen] = useState(false);
   const [deleteTarget, setDeleteTarget] = useState<FileItem | null>(null);
   const [shareTarget, setShareTarget] = useState<FileItem | null>(null);
   const [previewFile, setPreviewFile] = useState<FileItem | null>(null);
@@ -23,13 +49,72 @@ export const Files = () => {
     severity: "success" | "error";
   } | null>(null);
 
-  const { data, isLoading } = useFiles(page);
+  const { data, isLoading } = useFiles(cursor, {
+    ...query,
+    folder: folderId ?? "root",
+  });
+  const { data: folder } = useFolder(folderId);
+  const { data: subfolders = [] } = useFolders(folderId);
+
+  // A new search or sort starts again from the first page
+  const handleQueryChange = useCallback((next: FileQuery) => {
+    setQuery(next);
+    setCursor(null);
+  }, []);
   const uploadMutation = useUploadFile();
   const deleteMutation = useDeleteFile();
+  const bulkDeleteMutation = useBulkDeleteFiles();
+  const bulkMoveMutation = useBulkMoveFiles();
+  const createFolderMutation = useCreateFolder();
+  const deleteFolderMutation = useDeleteFolder();
+
+  const openFolder = (id: string | null) => {
+    setFolderId(id);
+    setCursor(null);
+    setSelected([]);
+  };
+
+  // Where the selection can be moved: up the breadcrumb trail or down one level
+  const moveTargets = [
+    ...(folderId ? [{ id: null, name: "All files" }] : []),
+    ...(folder?.ancestors ?? []),
+    ...subfolders,
+  ];
+
+  const handleMoveSelected = (target: string | null) => {
+    setMoveAnchor(null);
+    bulkMoveMutation.mutate(
+      { ids: selected, folder: target },
+      {
+        onSuccess: ({ moved }) => {
+          setToast({ msg: `${moved} file(s) moved`, severity: "success" });
+          setSelected([]);
+        },
+        onError: () => setToast({ msg: "Move failed", severity: "error" }),
+      },
+    );
+  };
+
+  const handleCreateFolder = async (name: string) => {
+    await createFolderMutation.mutateAsync({ name, parent: folderId });
+  };
+
+  const confirmDeleteFolder = () => {
+    if (!folder) return;
+
+    deleteFolderMutation.mutate(folder.id, {
+      onSuccess: () => {
+        setToast({ msg: "Folder deleted", severity: "success" });
+        setDeleteFolderOpen(false);
+        openFolder(folder.parent);
+      },
+      onError: () => setToast({ msg: "Delete failed", severity: "error" }),
+    });
+  };
 
   const handleUpload = async (file: File) => {
     uploadMutation.mutate(
-      { file },
+      { file, folder: folderId },
       {
         onSuccess: () =>
           setToast({ msg: "File uploaded successfully", severity: "success" }),
@@ -46,6 +131,24 @@ export const Files = () => {
     }
   };
 
+  const handleDownloadSelected = async () => {
+    try {
+      await downloadZip(selected);
+    } catch {
+      setToast({ msg: "Download failed", severity: "error" });
+    }
+  };
+
+  const handleDeleteSelected = () => {
+    bulkDeleteMutation.mutate(selected, {
+      onSuccess: ({ deleted }) => {
+        setToast({ msg: `${deleted} file(s) deleted`, severity: "success" });
+        setSelected([]);
+      },
+      onError: () => setToast({ msg: "Delete failed", severity: "error" }),
+    });
+  };
+
   const handleDeleteRequest = (file: FileItem) => {
     setDeleteTarget(file);
   };
@@ -74,6 +177,57 @@ export const Files = () => {
         />
       </Box>
 
+      <FolderBar
+        folder={folder}
+        subfolders={subfolders}
+        onNavigate={openFolder}
+        onCreate={handleCreateFolder}
+        onDelete={() => setDeleteFolderOpen(true)}
+      />
+
+      <FileFilters value={query} onChange={handleQueryChange} />
+
+      {selected.length > 0 && (
+        <Box display="flex" alignItems="center" gap={2} mb={2}>
+          <Typography variant="body2">{selected.length} selected</Typography>
+          <Button size="small" onClick={handleDownloadSelected}>
+            Download ZIP
+          </Button>
+          <Button
+            size="small"
+            onClick={(e) => setMoveAnchor(e.currentTarget)}
+            disabled={moveTargets.length === 0 || bulkMoveMutation.isPending}
+          >
+            Move to
+          </Button>
+          <Menu
+            anchorEl={moveAnchor}
+            open={!!moveAnchor}
+            onClose={() => setMoveAnchor(null)}
+          >
+            {moveTargets.map((target) => (
+              <MenuItem
+                key={target.id ?? "root"}
+                onClick={() => handleMoveSelected(target.id)}
+              >
+                {target.name}
+              </MenuItem>
+            ))}
+          </Menu>
+          <Button
+            size="small"
+            color="error"
+            onClick={handleDeleteSelected}
+            disabled={bulkDeleteMutation.isPending}
+          >
+            Delete
+          </Button>
+          <Button size="small" onClick={() => setSelected([])}>
+            Clear
+          </Button>
+        </Box>
+      )}
+
       <FileList
         data={data}
         isLoading={isLoading}
@@ -81,8 +235,10 @@ export const Files = () => {
         onDelete={handleDeleteRequest}
         onShare={(file) => setShareTarget(file)}
         onPreview={(file) => setPreviewFile(file)}
-        page={page}
-        onPageChange={(_, p) => setPage(p)}
+        onNextPage={() => setCursor(cursorFromLink(data?.next ?? null))}
+        onPreviousPage={() => setCursor(cursorFromLink(data?.previous ?? null))}
+        selected={selected}
+        onSelectionChange={setSelected}
       />
 
       {/* DIALOGS */}
@@ -94,6 +250,15 @@ export const Files = () => {
         isDeleting={deleteMutation.isPending}
       />
 
+      <DeleteConfirmDialog
+        open={deleteFolderOpen}
+        title="Delete Folder"
+        fileName={folder?.name || ""}
+        onCancel={() => setDeleteFolderOpen(false)}
+        onConfirm={confirmDeleteFolder}
+        isDeleting={deleteFolderMutation.isPending}
+      />
+
       <ShareDialog
         open={!!shareTarget}
         fileId={shareTarget?.id || ""}
@@ -1,20 +1,49 @@
 // src/types/index.ts
 
 // --- Data Models ---
+export interface StorageUsage {
+  used_bytes: number;
+  file_count: number;
+  trash_bytes: number;
+  trash_count: number;
+  quota_bytes: number | null;
+}
+
 export interface User {
   id: number;
   email: string;
   date_joined: string;
+  storage: StorageUsage;
 }
 
 export interface FileItem {
   id: string;
   original_name: string;
+  folder?: string | null;
   mime_type: string;
   size_bytes: number;
   human_readable_size?: string;
+  thumbnail_status?: "none" | "pending" | "ready" | "failed";
   created_at: string;
   storage_key?: string;
+  image?: ImageMetadata | null;
+}
+
+export interface Folder {
+  id: string;
+  name: string;
+  parent: string | null;
+  created_at: string;
+  // Top level first; only on the detail endpoint
+  ancestors?: { id: string; name: string }[];
+}
+
+export interface ImageMetadata {
+  width: number;
+  height: number;
+  format: string;
+  orientation: number;
+  taken_at: string | null;
 }
 
 export interface AuthTokens {
@@ -29,6 +58,23 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+// Search, filter and sort parameters for the file list
+export interface FileQuery {
+  // A folder id or "root" for the top level
+  folder?: string;
+  search?: string;
+  category?: string;
+  orientation?: string;
+  ordering?: string;
+}
+
+// Keyset pages: follow `next`/`previous`, there is no total count
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
 export interface ApiError {
   error: string;
   code?: string;